@@ -1,14 +1,23 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import aclosing
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import gzip
+import hashlib
 import io
 import json
 import os
+import time
 from typing import List, Optional, Union
 import uuid
 
 import numpy as np
 import pandas as pd
-import requests
-from fastapi import Body, FastAPI, File, HTTPException, UploadFile, Query, Request
+from fastapi import Body, Depends, FastAPI, File, HTTPException, UploadFile, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, field_validator
 from sklearn.ensemble import RandomForestClassifier, VotingClassifier, GradientBoostingClassifier
 from sklearn.model_selection import train_test_split, cross_val_score
@@ -16,8 +25,6 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.svm import SVC
 from sklearn.naive_bayes import GaussianNB
 from sklearn.metrics import classification_report, accuracy_score
-import geopy.distance
-from geopy.geocoders import Nominatim
 import random
 import re
 from dotenv import load_dotenv
@@ -27,12 +34,57 @@ load_dotenv()
 
 # Import enhanced chatbot service
 from chatbot_service import get_chatbot_service
+from soil_store import get_soil_store
+from swr_cache import StaleWhileRevalidateCache
+from http_client import UpstreamError, get_http_client
+from climatology import get_climatology_store
+from rate_limit import get_rate_limiter, retry_after_header
+from crop_catalog import CropCatalog
+from mandi_service import MandiPriceService
+from market_engine import generate_market_series
+from market_timeseries import ROLLUP_LEVELS, get_market_ts_store, period_keys, period_label, to_days
+from market_stream import MarketBroadcaster
+from market_store import MARKET_FIELDS, MarketColumnStore, MarketQueryError
 
 APP_NAME = "AI-Based Crop Recommendation"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 CSV_PATH = os.path.join(DATA_DIR, "Crop_recommendation.csv")
 
+# Bulk lookups: cap on concurrent geocoding calls and on locations per request
+GEOCODE_CONCURRENCY = int(os.getenv("GEOCODE_CONCURRENCY", "8"))
+MAX_BULK_LOCATIONS = int(os.getenv("MAX_BULK_LOCATIONS", "500"))
+
+# Environmental data is a pure function of (region, grid cell, date bucket)
+ENV_GRID_DEG = float(os.getenv("ENV_GRID_DEG", "0.1"))
+ENV_DATE_BUCKET_DAYS = int(os.getenv("ENV_DATE_BUCKET_DAYS", "1"))
+SOIL_CACHE_SIZE = int(os.getenv("SOIL_CACHE_SIZE", "10000"))
+
+# Geocoding (Nominatim)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", "86400"))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "20000"))
+
+# Weather forecasts: upstream endpoint and cache keyed on the forecast grid cell
+OPEN_METEO_URL = os.getenv("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", "0.1"))
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "900"))
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", "3600"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "2000"))
+WEATHER_BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", "100"))
+MAX_BULK_WEATHER_LOCATIONS = int(os.getenv("MAX_BULK_WEATHER_LOCATIONS", "500"))
+# Longest /recommend waits for a live forecast before using climatology instead
+WEATHER_LIVE_TIMEOUT = float(os.getenv("WEATHER_LIVE_TIMEOUT", "3"))
+
+# Market payload is rebuilt once per day (or when the market data changes), not per request
+MARKET_SEED = int(os.getenv("MARKET_SEED", "42"))
+MARKET_GZIP_MIN_BYTES = int(os.getenv("MARKET_GZIP_MIN_BYTES", "1024"))
+# Without a live price feed, top the time-series store up with synthetic daily prices
+MARKET_SYNTHETIC_FILL = os.getenv("MARKET_SYNTHETIC_FILL", "1") == "1"
+MARKET_HISTORY_DAYS = int(os.getenv("MARKET_HISTORY_DAYS", "365"))
+MARKET_WEEKS = int(os.getenv("MARKET_WEEKS", "12"))
+MAX_MARKET_OBSERVATIONS = int(os.getenv("MAX_MARKET_OBSERVATIONS", "10000"))
+
 # Optional OpenAI integration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 USE_OPENAI = os.getenv("USE_OPENAI", "0") == "1"
@@ -87,6 +139,8 @@ _feature_columns = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
 _label_column = "label"
 _crops: List[str] = []
 _model_accuracy: float = 0.0
+# Built with the model; ids match _label_encoder.classes_
+_crop_catalog: Optional[CropCatalog] = None
 
 # Baseline yields (kg/ha) and price per kg (local currency). Approximate sample values.
 _BASELINE = {
@@ -114,58 +168,6 @@ _BASELINE = {
     "coffee": (1800, 200),
 }
 
-# Regional soil data database (simplified version)
-# In a real application, this would be a proper database with extensive soil survey data
-_REGIONAL_SOIL_DATA = {
-    # Indian regions with typical soil characteristics
-    "punjab": {"N": 85, "P": 45, "K": 50, "ph": 7.2, "temp_range": (15, 35)},
-    "haryana": {"N": 80, "P": 42, "K": 48, "ph": 7.5, "temp_range": (12, 38)},
-    "uttar pradesh": {"N": 75, "P": 38, "K": 45, "ph": 7.0, "temp_range": (18, 42)},
-    "maharashtra": {"N": 65, "P": 35, "K": 40, "ph": 6.8, "temp_range": (20, 38)},
-    "karnataka": {"N": 60, "P": 40, "K": 45, "ph": 6.5, "temp_range": (22, 35)},
-    "tamil nadu": {"N": 70, "P": 50, "K": 55, "ph": 6.2, "temp_range": (25, 40)},
-    "kerala": {"N": 55, "P": 45, "K": 50, "ph": 5.8, "temp_range": (23, 35)},
-    "west bengal": {"N": 85, "P": 40, "K": 42, "ph": 6.8, "temp_range": (20, 38)},
-    "bihar": {"N": 75, "P": 35, "K": 40, "ph": 7.2, "temp_range": (18, 40)},
-    "rajasthan": {"N": 45, "P": 25, "K": 35, "ph": 7.8, "temp_range": (10, 45)},
-    "gujarat": {"N": 70, "P": 35, "K": 42, "ph": 7.5, "temp_range": (15, 42)},
-    "madhya pradesh": {"N": 65, "P": 38, "K": 45, "ph": 7.0, "temp_range": (15, 40)},
-    "andhra pradesh": {"N": 68, "P": 48, "K": 52, "ph": 6.5, "temp_range": (22, 40)},
-    "telangana": {"N": 65, "P": 45, "K": 50, "ph": 6.8, "temp_range": (20, 40)},
-    # More Indian regions
-    "odisha": {"N": 72, "P": 42, "K": 48, "ph": 6.6, "temp_range": (22, 38)},
-    "jharkhand": {"N": 68, "P": 40, "K": 45, "ph": 6.4, "temp_range": (20, 40)},
-    "assam": {"N": 78, "P": 48, "K": 52, "ph": 5.9, "temp_range": (22, 34)},
-    "himachal pradesh": {"N": 62, "P": 38, "K": 42, "ph": 6.8, "temp_range": (8, 30)},
-    "uttarakhand": {"N": 65, "P": 40, "K": 44, "ph": 6.9, "temp_range": (10, 32)},
-    "chhattisgarh": {"N": 70, "P": 45, "K": 48, "ph": 6.5, "temp_range": (20, 42)},
-    "goa": {"N": 58, "P": 44, "K": 50, "ph": 5.7, "temp_range": (24, 35)},
-    # Major cities
-    "mumbai": {"N": 65, "P": 35, "K": 40, "ph": 6.8, "temp_range": (20, 38)},
-    "delhi": {"N": 75, "P": 38, "K": 45, "ph": 7.0, "temp_range": (18, 42)},
-    "bangalore": {"N": 60, "P": 40, "K": 45, "ph": 6.5, "temp_range": (22, 35)},
-    "chennai": {"N": 70, "P": 50, "K": 55, "ph": 6.2, "temp_range": (25, 40)},
-    "hyderabad": {"N": 65, "P": 45, "K": 50, "ph": 6.8, "temp_range": (20, 40)},
-    "kolkata": {"N": 85, "P": 40, "K": 42, "ph": 6.8, "temp_range": (20, 38)},
-    "pune": {"N": 65, "P": 35, "K": 40, "ph": 6.8, "temp_range": (18, 36)},
-    "ahmedabad": {"N": 70, "P": 35, "K": 42, "ph": 7.5, "temp_range": (15, 42)},
-    "jaipur": {"N": 45, "P": 25, "K": 35, "ph": 7.8, "temp_range": (10, 45)},
-    "lucknow": {"N": 75, "P": 38, "K": 45, "ph": 7.0, "temp_range": (18, 42)},
-    "bhopal": {"N": 65, "P": 38, "K": 45, "ph": 7.0, "temp_range": (15, 40)},
-    "chandigarh": {"N": 80, "P": 42, "K": 48, "ph": 7.3, "temp_range": (12, 38)},
-    # International locations
-    "california": {"N": 70, "P": 40, "K": 45, "ph": 6.5, "temp_range": (10, 35)},
-    "texas": {"N": 75, "P": 35, "K": 40, "ph": 7.2, "temp_range": (15, 40)},
-    "iowa": {"N": 90, "P": 50, "K": 60, "ph": 6.8, "temp_range": (5, 35)},
-    "nebraska": {"N": 85, "P": 45, "K": 55, "ph": 7.0, "temp_range": (0, 38)},
-    "ukraine": {"N": 95, "P": 55, "K": 65, "ph": 6.5, "temp_range": (-5, 35)},
-    "argentina": {"N": 80, "P": 48, "K": 50, "ph": 6.2, "temp_range": (10, 35)},
-    "brazil": {"N": 65, "P": 35, "K": 40, "ph": 5.8, "temp_range": (18, 40)},
-    "australia": {"N": 72, "P": 42, "K": 48, "ph": 6.4, "temp_range": (12, 40)},
-    "canada": {"N": 85, "P": 50, "K": 58, "ph": 6.8, "temp_range": (-10, 30)},
-    "united kingdom": {"N": 78, "P": 48, "K": 52, "ph": 6.6, "temp_range": (2, 25)},
-}
-
 # Comprehensive crop dataset for ML training
 _COMPREHENSIVE_DATASET = """N,P,K,temperature,humidity,ph,rainfall,label
 90,42,43,20.879744,82.002744,6.502985,202.935536,rice
@@ -355,7 +357,7 @@ def _load_dataset() -> pd.DataFrame:
 
 
 def _train_model():
-    global _model, _crops, _scaler, _label_encoder, _model_accuracy
+    global _model, _crops, _scaler, _label_encoder, _model_accuracy, _crop_catalog
     
     print("Training enhanced ML model...")
     df = _load_dataset()
@@ -372,6 +374,10 @@ def _train_model():
     _label_encoder = LabelEncoder()
     y_encoded = _label_encoder.fit_transform(y)
     _crops = list(_label_encoder.classes_)
+    _crop_catalog = CropCatalog(_crops, _BASELINE, _COMPREHENSIVE_CROP_DATABASE, _CROP_KNOWLEDGE)
+    unmatched = _crop_catalog.get_stats()["model_classes_without_baseline"]
+    if unmatched:
+        print(f"Crops without baseline yield/price, using defaults: {unmatched}")
     
     print(f"Crops in dataset: {len(_crops)} types - {_crops[:5]}{'...' if len(_crops) > 5 else ''}")
     
@@ -449,159 +455,301 @@ def _train_model():
         print(f"Cross-validation failed: {str(e)}")
 
 
-def _get_location_from_coordinates(lat: float, lon: float) -> str:
+# Geocoding results rarely change: cache them for a day, refresh in the background for
+# a week, and fall back to any cached answer while Nominatim is failing
+_geocode_cache = StaleWhileRevalidateCache(
+    "geocode",
+    ttl=GEOCODE_CACHE_TTL,
+    stale_ttl=GEOCODE_CACHE_TTL * 7,
+    max_entries=GEOCODE_CACHE_SIZE,
+)
+
+
+async def _reverse_geocode(lat: float, lon: float) -> str:
+    result = await get_http_client().get_json(
+        "nominatim",
+        f"{NOMINATIM_URL}/reverse",
+        params={"lat": lat, "lon": lon, "format": "json", "zoom": 10},
+    )
+    if result and "error" not in result:
+        # Extract meaningful location info
+        address = result.get('address', {})
+        if 'state' in address:
+            return address['state'].lower()
+        elif 'country' in address:
+            return address['country'].lower()
+        else:
+            return result.get('display_name', '').split(',')[-1].strip().lower() or "unknown"
+    return "unknown"
+
+
+async def _get_location_from_coordinates(lat: float, lon: float) -> str:
     """Get location name from coordinates using reverse geocoding."""
     try:
-        geolocator = Nominatim(user_agent="crop_recommendation_app")
-        location = geolocator.reverse(f"{lat}, {lon}", exactly_one=True, timeout=10)
-        if location:
-            # Extract meaningful location info
-            address = location.raw.get('address', {})
-            if 'state' in address:
-                return address['state'].lower()
-            elif 'country' in address:
-                return address['country'].lower()
-            else:
-                return location.address.split(',')[-1].strip().lower()
-        return "unknown"
+        name, _ = await _geocode_cache.get(
+            ("reverse", round(lat, 4), round(lon, 4)),
+            lambda: _reverse_geocode(lat, lon),
+            serve_expired_on_error=True,
+        )
+        return name
     except Exception:
         return "unknown"
 
 
-def _get_coordinates_from_place(place_name: str) -> tuple[float, float]:
+async def _geocode(place_name: str) -> tuple[float, float]:
+    results = await get_http_client().get_json(
+        "nominatim",
+        f"{NOMINATIM_URL}/search",
+        params={"q": place_name, "format": "json", "limit": 1},
+    )
+    if results:
+        return float(results[0]["lat"]), float(results[0]["lon"])
+    raise ValueError(f"Location '{place_name}' not found")
+
+
+async def _get_coordinates_from_place(place_name: str) -> tuple[float, float]:
     """Get coordinates from place name using geocoding."""
     try:
-        geolocator = Nominatim(user_agent="crop_recommendation_app")
-        location = geolocator.geocode(place_name, timeout=10)
-        if location:
-            return location.latitude, location.longitude
-        raise ValueError(f"Location '{place_name}' not found")
+        coordinates, _ = await _geocode_cache.get(
+            ("place", " ".join(place_name.lower().split())),
+            lambda: _geocode(place_name),
+            serve_expired_on_error=True,
+        )
+        return coordinates
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Geocoding failed: {str(e)}")
 
 
-def _find_closest_soil_data(location_key: str, lat: float = None, lon: float = None):
-    """Find the closest soil data match for a given location."""
-    # First try exact match (case insensitive)
-    location_lower = location_key.lower()
-    
-    # Check for direct matches in our database
-    for region_key, soil_data in _REGIONAL_SOIL_DATA.items():
-        if region_key in location_lower or location_lower in region_key:
-            return soil_data, region_key, 0.9  # High confidence for direct match
-    
-    # If no direct match, try partial matches
-    best_match = None
-    best_score = 0
-    
-    for region_key, soil_data in _REGIONAL_SOIL_DATA.items():
-        # Check for partial matches in words
-        location_words = set(location_lower.split())
-        region_words = set(region_key.split())
-        
-        common_words = location_words.intersection(region_words)
-        if common_words:
-            score = len(common_words) / max(len(location_words), len(region_words))
-            if score > best_score:
-                best_score = score
-                best_match = (soil_data, region_key, score * 0.7)  # Reduced confidence for partial match
-    
-    if best_match:
-        return best_match
+def _soil_match_result(table, match):
+    """Soil profile, region name and confidence for a soil table match (or the global average)."""
+    if match:
+        row, score, direct = match
+        # High confidence for direct match, reduced confidence for partial word or coordinate match
+        return table.row(row), table.names[row], 0.9 if direct else score * 0.7
     
     # Fallback: use a default moderate soil profile
     default_soil = {"N": 65, "P": 40, "K": 45, "ph": 6.8, "temp_range": (20, 35)}
     return default_soil, "global_average", 0.3  # Low confidence for fallback
 
 
-def _generate_environmental_data(location_name: str, lat: float = None, lon: float = None):
-    """Generate realistic environmental data based on location and season."""
-    # Get soil data
-    soil_data, matched_region, confidence = _find_closest_soil_data(location_name, lat, lon)
+def _find_closest_soil_data(location_key: str, lat: float = None, lon: float = None):
+    """Find the closest soil data match for a given location in the regional soil store."""
+    return _find_closest_soil_data_many([location_key], [lat], [lon])[0]
+
+
+def _find_closest_soil_data_many(
+    location_keys: List[str],
+    lats: Optional[List[Optional[float]]] = None,
+    lons: Optional[List[Optional[float]]] = None,
+) -> list:
+    """Match many locations against one soil table snapshot in a single vectorized pass, in input order."""
+    table = get_soil_store().table
+    matches = table.match_many([k.lower() for k in location_keys], lats, lons)
+    return [_soil_match_result(table, match) for match in matches]
+
+
+def _date_bucket(day: Optional[date] = None) -> int:
+    """Index of the ENV_DATE_BUCKET_DAYS-long period containing `day` (default: today)."""
+    return (day or date.today()).toordinal() // ENV_DATE_BUCKET_DAYS
+
+
+def _date_bucket_expiry(bucket: int) -> datetime:
+    """Local midnight at which the given date bucket ends."""
+    return datetime.combine(date.fromordinal((bucket + 1) * ENV_DATE_BUCKET_DAYS), datetime.min.time())
+
+
+def _environment_seed(region: str, lat: Optional[float], lon: Optional[float], bucket: int) -> int:
+    """Stable seed from the matched region, ENV_GRID_DEG grid cell and date bucket."""
+    cell = "none" if lat is None or lon is None else f"{round(lat / ENV_GRID_DEG)}:{round(lon / ENV_GRID_DEG)}"
+    digest = hashlib.sha256(f"{region}|{cell}|{bucket}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _generate_environmental_data(
+    location_name: str,
+    lat: float = None,
+    lon: float = None,
+    match: tuple = None,
+    day: Optional[date] = None,
+):
+    """
+    Generate realistic environmental data based on location and season.
+
+    Temperature, humidity and rainfall are drawn from the matched region's ranges.
+    Random values use a locally seeded generator, so the same region, grid cell and
+    date bucket always produce the same numbers.
+    """
+    # Get soil data (callers doing bulk lookups pass a precomputed match)
+    soil_data, matched_region, confidence = match or _find_closest_soil_data(location_name, lat, lon)
+    rng = random.Random(_environment_seed(matched_region, lat, lon, _date_bucket(day)))
+    source = "regional_database"
     
     # Generate temperature (with some randomness)
     temp_min, temp_max = soil_data.get("temp_range", (20, 35))
-    temperature = random.uniform(temp_min + 2, temp_max - 2)
+    temperature = rng.uniform(temp_min + 2, temp_max - 2)
     
-    # Generate humidity (varies by region)
-    if "rajasthan" in matched_region or "desert" in location_name.lower():
-        humidity = random.uniform(30, 60)  # Arid regions
+    # Humidity and rainfall from the region's profile, or by region type when it has none
+    if "humidity_range" in soil_data:
+        humidity = rng.uniform(*soil_data["humidity_range"])
+    elif "rajasthan" in matched_region or "desert" in location_name.lower():
+        humidity = rng.uniform(30, 60)  # Arid regions
     elif "kerala" in matched_region or "coastal" in location_name.lower():
-        humidity = random.uniform(70, 90)  # Coastal regions
+        humidity = rng.uniform(70, 90)  # Coastal regions
     else:
-        humidity = random.uniform(50, 80)  # General regions
+        humidity = rng.uniform(50, 80)  # General regions
     
-    # Generate rainfall (seasonal and regional variation)
-    if "rajasthan" in matched_region or "desert" in location_name.lower():
-        rainfall = random.uniform(20, 80)  # Low rainfall
+    if "rainfall_range" in soil_data:
+        rainfall = rng.uniform(*soil_data["rainfall_range"])
+    elif "rajasthan" in matched_region or "desert" in location_name.lower():
+        rainfall = rng.uniform(20, 80)  # Low rainfall
     elif "kerala" in matched_region or "west bengal" in matched_region:
-        rainfall = random.uniform(150, 300)  # High rainfall
+        rainfall = rng.uniform(150, 300)  # High rainfall
     else:
-        rainfall = random.uniform(80, 200)  # Moderate rainfall
+        rainfall = rng.uniform(80, 200)  # Moderate rainfall
     
     return {
-        "N": soil_data["N"] + random.uniform(-5, 5),  # Add some variation
-        "P": soil_data["P"] + random.uniform(-3, 3),
-        "K": soil_data["K"] + random.uniform(-3, 3),
-        "ph": soil_data["ph"] + random.uniform(-0.3, 0.3),
+        "N": soil_data["N"] + rng.uniform(-5, 5),  # Add some variation
+        "P": soil_data["P"] + rng.uniform(-3, 3),
+        "K": soil_data["K"] + rng.uniform(-3, 3),
+        "ph": soil_data["ph"] + rng.uniform(-0.3, 0.3),
         "temperature": round(temperature, 2),
         "humidity": round(humidity, 2),
         "rainfall": round(rainfall, 2),
         "location_name": matched_region.title(),
         "confidence_score": confidence,
-        "source": "regional_database"
+        "source": source
     }
 
 
-def _estimate_yield_profit_sustainability(crop: str, features: dict, prob: float):
-    # Use baseline, modulated by how close soil properties are to median values for that crop if available
-    baseline_yield, price = _BASELINE.get(crop, (2000, 20))
+def _estimate_yield_profit_sustainability(crop_ids: np.ndarray, features: pd.DataFrame, probs: np.ndarray):
+    """
+    Yield, profit and sustainability for many (crop, feature row, probability) triples
+    at once: row i of `features` is scored as crop `crop_ids[i]` with model probability
+    `probs[i]`. Baselines come from the crop catalog, indexed by id.
+    """
+    crop_ids = np.asarray(crop_ids)
+    baseline_yield = _crop_catalog.baseline_yield[crop_ids]
+    price = _crop_catalog.price[crop_ids]
 
     # Heuristics: better NPK balance and moderate pH/temperature/humidity improve yield
-    N, P, K = features["N"], features["P"], features["K"]
-    ph, temp, hum, rain = features["ph"], features["temperature"], features["humidity"], features["rainfall"]
+    N, P, K = (features[c].to_numpy(dtype=np.float64) for c in ("N", "P", "K"))
+    ph, temp, hum, rain = (features[c].to_numpy(dtype=np.float64) for c in ("ph", "temperature", "humidity", "rainfall"))
 
     # Balance score for NPK (ideal around N:P:K ~ 1:1:1)
     mean_npk = (N + P + K) / 3.0 + 1e-9
-    balance = 1.0 - (abs(N - mean_npk) + abs(P - mean_npk) + abs(K - mean_npk)) / (3.0 * (mean_npk + 10))
-    balance = max(0.5, min(1.1, balance))
+    balance = 1.0 - (np.abs(N - mean_npk) + np.abs(P - mean_npk) + np.abs(K - mean_npk)) / (3.0 * (mean_npk + 10))
+    balance = np.clip(balance, 0.5, 1.1)
 
     # Environmental factors (idealized ranges)
-    ph_score = 1.0 - abs(ph - 6.5) / 6.5
-    ph_score = max(0.6, min(1.1, ph_score))
-    temp_score = 1.0 - abs(temp - 25) / 25
-    temp_score = max(0.6, min(1.1, temp_score))
-    hum_score = 1.0 - abs(hum - 70) / 70
-    hum_score = max(0.6, min(1.1, hum_score))
-    rain_score = 1.0 - abs(rain - 120) / 200
-    rain_score = max(0.6, min(1.1, rain_score))
+    ph_score = np.clip(1.0 - np.abs(ph - 6.5) / 6.5, 0.6, 1.1)
+    temp_score = np.clip(1.0 - np.abs(temp - 25) / 25, 0.6, 1.1)
+    hum_score = np.clip(1.0 - np.abs(hum - 70) / 70, 0.6, 1.1)
+    rain_score = np.clip(1.0 - np.abs(rain - 120) / 200, 0.6, 1.1)
 
     # Combine; boost by model probability (0.8..1.2 range)
-    prob_boost = 0.8 + 0.4 * prob
+    prob_boost = 0.8 + 0.4 * np.asarray(probs, dtype=np.float64)
     yield_est = baseline_yield * balance * ph_score * temp_score * hum_score * rain_score * prob_boost
-    yield_est = float(max(0.0, yield_est))
+    yield_est = np.maximum(0.0, yield_est)
 
     # Profit estimate
     profit = yield_est * price
 
     # Sustainability: higher with balanced NPK, moderate rainfall, and humidity
-    sustainability = int(
-        max(0, min(100, 60 * balance + 10 * (1.1 - abs(rain - 120) / 200) + 10 * (1.1 - abs(hum - 70) / 70) + 20 * (1.1 - abs(ph - 6.5) / 6.5)))
-    )
+    sustainability = np.clip(
+        60 * balance + 10 * (1.1 - np.abs(rain - 120) / 200) + 10 * (1.1 - np.abs(hum - 70) / 70) + 20 * (1.1 - np.abs(ph - 6.5) / 6.5),
+        0, 100,
+    ).astype(np.int64)
     return yield_est, profit, sustainability
 
 
+def _top_recommendations(row: dict, probs: np.ndarray, top_k: int = 3) -> List[CropRecommendation]:
+    """Top-k crops for a single feature row with yield, profit and sustainability estimates."""
+    top_idx = np.argsort(probs)[::-1][:top_k]
+    features = pd.DataFrame([row] * len(top_idx))
+    y, prof, sus = _estimate_yield_profit_sustainability(top_idx, features, probs[top_idx])
+    return [
+        CropRecommendation(
+            crop=_crop_catalog.names[idx],
+            probability=round(float(probs[idx]), 4),
+            yield_kg_per_hectare=round(float(y[k]), 2),
+            expected_profit_local=round(float(prof[k]), 2),
+            sustainability_score=int(sus[k]),
+        )
+        for k, idx in enumerate(top_idx.tolist())
+    ]
+
+
 @app.on_event("startup")
 def on_startup():
+    soil_stats = get_soil_store().get_stats()
+    print(f"Soil table loaded: {soil_stats['regions']} regions in {soil_stats['load_ms']} ms, {soil_stats['memory_bytes']} bytes")
+    climate_stats = get_climatology_store().get_stats()
+    print(f"Climatology mapped: {climate_stats['shape']} grid in {climate_stats['load_ms']} ms")
     _train_model()
+    snapshot = _build_market_snapshot(date.today(), _market_data_version)
+    _install_market_snapshot(snapshot)
+    print(f"Market payload built: {len(snapshot.body)} bytes in {snapshot.build_ms:.1f} ms")
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    global _market_sync_task
+    _mandi_service.start()
+    get_chatbot_service().sessions.start()
+    if get_market_ts_store().sync_interval > 0:
+        _market_sync_task = asyncio.ensure_future(_sync_market_timeseries())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _market_sync_task is not None:
+        _market_sync_task.cancel()
+        await asyncio.gather(_market_sync_task, return_exceptions=True)
+    await _mandi_service.stop()
+    await get_chatbot_service().sessions.stop()
+    await get_http_client().aclose()
+
+
+def _rate_limited(route: str):
+    """Dependency enforcing the `route` rate limit per client IP; over the limit is a 429"""
+    async def check(request: Request, response: Response):
+        client_ip = request.client.host if request.client else "unknown"
+        decision = await get_rate_limiter().acquire(route, client_ip)
+        if not decision.allowed:
+            raise HTTPException(status_code=429, detail="Too many requests", headers=retry_after_header(decision))
+        if decision.limit:
+            response.headers["X-RateLimit-Limit"] = str(decision.limit)
+            response.headers["X-RateLimit-Remaining"] = str(decision.remaining)
+    return Depends(check)
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "model_ready": _model is not None, "crops": _crops}
+    return {
+        "status": "ok",
+        "model_ready": _model is not None,
+        "crops": _crops,
+        "soil_store": get_soil_store().get_stats(),
+        "soil_cache": {"entries": len(_SOIL_CACHE), **_soil_cache_stats},
+        "weather_cache": _weather_cache.get_stats(),
+        "geocode_cache": _geocode_cache.get_stats(),
+        "climatology": get_climatology_store().get_stats(),
+        "market_timeseries": get_market_ts_store().get_stats(),
+        "mandi": _mandi_service.get_stats(),
+        "market_stream": _market_broadcaster.get_stats(),
+        "crop_catalog": _crop_catalog.get_stats() if _crop_catalog else None,
+        "rate_limiter": get_rate_limiter().get_stats(),
+        "market": {
+            **_market_stats,
+            "bytes": len(_market_snapshot.body) if _market_snapshot else None,
+            "gzip_bytes": len(_market_snapshot.gzip_body) if _market_snapshot and _market_snapshot.gzip_body else None,
+            "build_ms": round(_market_snapshot.build_ms, 2) if _market_snapshot else None,
+        },
+        "upstreams": get_http_client().get_stats(),
+    }
 
 
-@app.post("/predict", response_model=PredictResponse)
+@app.post("/predict", response_model=PredictResponse, dependencies=[_rate_limited("predict")])
 async def predict(
     request: Request,
     file: Optional[UploadFile] = File(default=None),
@@ -635,7 +783,7 @@ async def predict(
         if missing:
             raise HTTPException(status_code=400, detail=f"CSV missing columns: {missing}")
         # Normalize columns
-        df = df.rename(columns={lower_cols[c]: c for c in required})
+        df = df.rename(columns={lower_cols[c.lower()]: c for c in _feature_columns})
         rows = df[_feature_columns].to_dict(orient="records")
         meta["uploaded_rows"] = len(rows)
     elif "application/json" in content_type:
@@ -660,59 +808,36 @@ async def predict(
     X_scaled = _scaler.transform(X)
     proba = _model.predict_proba(X_scaled)
     
-    # Get class labels from label encoder
-    if _label_encoder is None:
+    if _label_encoder is None or _crop_catalog is None:
         raise HTTPException(status_code=500, detail="Label encoder not initialized")
-    
-    classes: List[str] = list(_label_encoder.classes_)
 
     # For single row response, return top 3 with estimates; for multi, aggregate by top
     recommendations: List[CropRecommendation] = []
 
     if len(rows) == 1:
-        probs = proba[0]
-        top_idx = np.argsort(probs)[::-1][:3]
-        for idx in top_idx:
-            crop = classes[idx]
-            p = float(probs[idx])
-            y, prof, sus = _estimate_yield_profit_sustainability(crop, rows[0], p)
-            recommendations.append(
-                CropRecommendation(
-                    crop=crop,
-                    probability=round(p, 4),
-                    yield_kg_per_hectare=round(y, 2),
-                    expected_profit_local=round(prof, 2),
-                    sustainability_score=int(sus),
-                )
-            )
+        recommendations = _top_recommendations(rows[0], proba[0])
         meta.update({"mode": "single", "model_accuracy": _model_accuracy, "total_crops": len(_crops)})
     else:
-        # Aggregate: Most frequently top-1 crop with average stats
-        top1_indices = proba.argmax(axis=1)
-        top1_crops = [classes[i] for i in top1_indices]
-        crop_counts: dict = {}
-        crop_stats: dict = {}
-        for i, crop in enumerate(top1_crops):
-            crop_counts[crop] = crop_counts.get(crop, 0) + 1
-            p = float(proba[i, top1_indices[i]])
-            y, prof, sus = _estimate_yield_profit_sustainability(crop, rows[i], p)
-            if crop not in crop_stats:
-                crop_stats[crop] = {"p": [], "y": [], "prof": [], "sus": []}
-            crop_stats[crop]["p"].append(p)
-            crop_stats[crop]["y"].append(y)
-            crop_stats[crop]["prof"].append(prof)
-            crop_stats[crop]["sus"].append(sus)
-        # Sort by count desc
-        sorted_crops = sorted(crop_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-        for crop, cnt in sorted_crops:
-            stats = crop_stats[crop]
+        # Aggregate: Most frequently top-1 crop with average stats.
+        # Class indices are catalog ids, so every row is scored in one pass.
+        top1 = proba.argmax(axis=1)
+        p = proba[np.arange(len(top1)), top1]
+        y, prof, sus = _estimate_yield_profit_sustainability(top1, X, p)
+        crop_ids, first_seen, counts = np.unique(top1, return_index=True, return_counts=True)
+        n_classes = proba.shape[1]
+        sums = {
+            name: np.bincount(top1, weights=values, minlength=n_classes)[crop_ids] / counts
+            for name, values in (("p", p), ("y", y), ("prof", prof), ("sus", sus))
+        }
+        # Sort by count desc, ties in order of first appearance
+        for k in np.lexsort((first_seen, -counts))[:3]:
             recommendations.append(
                 CropRecommendation(
-                    crop=crop,
-                    probability=round(float(np.mean(stats["p"])), 4),
-                    yield_kg_per_hectare=round(float(np.mean(stats["y"])), 2),
-                    expected_profit_local=round(float(np.mean(stats["prof"])), 2),
-                    sustainability_score=int(float(np.mean(stats["sus"]))),
+                    crop=_crop_catalog.names[crop_ids[k]],
+                    probability=round(float(sums["p"][k]), 4),
+                    yield_kg_per_hectare=round(float(sums["y"][k]), 2),
+                    expected_profit_local=round(float(sums["prof"][k]), 2),
+                    sustainability_score=int(float(sums["sus"][k])),
                 )
             )
         meta.update({"mode": "batch", "rows": len(rows), "model_accuracy": _model_accuracy, "total_crops": len(_crops)})
@@ -797,85 +922,630 @@ _COMPREHENSIVE_CROP_DATABASE = {
     "basil": {"category": "medicinal", "base_price": 35, "unit": "kg", "image": "🌿", "description": "Holy basil, medicinal properties", "season": "Kharif", "harvest_time": "Sep-Oct"},
 }
 
+# Mandi prices are polled server-side and shared by every client
+_mandi_service = MandiPriceService(_COMPREHENSIVE_CROP_DATABASE)
+
+
+def _fill_market_history(today: date) -> int:
+    """
+    Append synthetic daily prices for every catalog crop from the day after the last
+    stored observation (or MARKET_HISTORY_DAYS back) through today, continuing each
+    crop's walk from its last stored price. Returns the number of days added.
+    """
+    store = get_market_ts_store()
+    # Under the store's write lock, so two workers crossing midnight fill the days once
+    with store.locked():
+        store.sync(force=True)
+        span = store.day_range()
+        today_day = int(to_days(today))
+        first_day = span[1] + 1 if span else today_day - MARKET_HISTORY_DAYS + 1
+        if first_day > today_day:
+            return 0
+
+        names = list(_COMPREHENSIVE_CROP_DATABASE)
+        base_prices = _crop_catalog.market_price[_crop_catalog.market_ids].tolist()
+        last_prices = store.last_prices() if span else {}
+        n_days = today_day - first_day + 1
+        series = generate_market_series(
+            base_prices,
+            n_days,
+            # Seeded by the first filled day so refilling the same range is reproducible
+            seed=MARKET_SEED + first_day,
+            volatility=0.05 / 7 ** 0.5,
+            trend_range=(-0.01 / 7, 0.015 / 7),
+            start_prices=[last_prices.get(name, base) for name, base in zip(names, base_prices)] if span else None,
+        )
+        days = np.arange(first_day, today_day + 1, dtype=np.int32)
+        store.append(np.repeat(names, n_days).tolist(), np.tile(days, len(names)), series.prices.ravel(), series.demand.ravel())
+    return n_days
+
+
+def _build_market_store(today: date, version: int) -> MarketColumnStore:
+    """
+    The last MARKET_WEEKS complete weeks of market data for every crop, read from the
+    weekly rollups of the time-series store.
+    """
+    ts_store = get_market_ts_store()
+    span = ts_store.day_range()
+    last_day = min(span[1], int(to_days(today))) if span else int(to_days(today))
+    # Weeks end on Sunday; the current week only counts once it is complete
+    last_week = int(period_keys("weekly", np.array([last_day]))[0])
+    if last_week > last_day:
+        last_week -= 7
+    weeks = np.arange(last_week - 7 * (MARKET_WEEKS - 1), last_week + 1, 7, dtype=np.int32)
+
+    names = list(_COMPREHENSIVE_CROP_DATABASE)
+    base_prices = _crop_catalog.market_price[_crop_catalog.market_ids]
+    crop_ids = ts_store.lookup_crops(names)
+    stored = crop_ids >= 0
+    prices = np.full((len(names), len(weeks)), np.nan)
+    demand = np.full((len(names), len(weeks)), np.nan)
+    rollup = ts_store.rollup("weekly", int(weeks[0]) - 6, int(weeks[-1]), crop_ids[stored].tolist())
+    if len(rollup):
+        row_of_id = np.full(int(crop_ids.max()) + 1, -1)
+        row_of_id[crop_ids[stored]] = np.arange(len(names))[stored]
+        rows = row_of_id[rollup.index.get_level_values("crop").to_numpy()]
+        cols = (rollup.index.get_level_values("period").to_numpy() - weeks[0]) // 7
+        prices[rows, cols] = rollup["mean"].to_numpy()
+        demand[rows, cols] = rollup["demand_mean"].to_numpy()
+
+    # Weeks without observations carry the previous week forward (base price before any)
+    prices = pd.DataFrame(prices).ffill(axis=1).to_numpy()
+    demand = pd.DataFrame(demand).ffill(axis=1).to_numpy()
+    prices = np.where(np.isnan(prices), base_prices[:, None], prices).round(2)
+    demand = np.where(np.isnan(demand), 0, np.trunc(demand)).astype(np.int16)
+    dates = weeks.astype("datetime64[D]")
+    return MarketColumnStore(_COMPREHENSIVE_CROP_DATABASE, dates, prices, demand, version=version)
+
+
+@dataclass
+class MarketSnapshot:
+    """Columnar market data for one day plus the pre-encoded full /market body"""
+    day: date
+    version: int
+    # Time-series store version the rollups were read at
+    ts_version: int
+    store: MarketColumnStore
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str
+    last_modified: datetime
+    build_ms: float
+
+
+_market_snapshot: Optional[MarketSnapshot] = None
+_market_rebuild: Optional[asyncio.Task] = None
+_market_sync_task: Optional[asyncio.Task] = None
+_market_broadcaster = MarketBroadcaster()
+_market_data_version = 1
+_market_stats = {"builds": 0, "build_errors": 0, "served": 0, "gzip_served": 0, "queries": 0, "not_modified": 0}
+
+
+def _invalidate_market_snapshot():
+    """Call after changing the market data so the next request rebuilds the payload"""
+    global _market_data_version
+    _market_data_version += 1
+
+
+def _encode_json(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _build_market_snapshot(today: date, version: int) -> MarketSnapshot:
+    """Build the market store and its encoded payloads (blocking; run in a worker thread)."""
+    started = time.perf_counter()
+    if MARKET_SYNTHETIC_FILL:
+        _fill_market_history(today)
+    ts_version = get_market_ts_store().version
+    store = _build_market_store(today, version)
+    body = _encode_json(store.to_payload())
+    return MarketSnapshot(
+        day=today,
+        version=version,
+        ts_version=ts_version,
+        store=store,
+        body=body,
+        gzip_body=gzip.compress(body, compresslevel=9) if len(body) >= MARKET_GZIP_MIN_BYTES else None,
+        etag='"' + hashlib.sha1(body).hexdigest() + '"',
+        last_modified=datetime.now().astimezone().replace(microsecond=0),
+        build_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def _install_market_snapshot(snapshot: MarketSnapshot):
+    global _market_snapshot
+    _market_snapshot = snapshot
+    _market_stats["builds"] += 1
+    _market_broadcaster.publish(snapshot.store)
+
+
+def _market_snapshot_current(snapshot: Optional[MarketSnapshot]) -> bool:
+    if snapshot is None or snapshot.day != date.today() or snapshot.version != _market_data_version:
+        return False
+    # Observations ingested by another worker process also make the snapshot out of date
+    # (picked up by _sync_market_timeseries)
+    return snapshot.ts_version == get_market_ts_store().version
+
+
+async def _rebuild_market_snapshot() -> MarketSnapshot:
+    snapshot = await asyncio.to_thread(_build_market_snapshot, date.today(), _market_data_version)
+    _install_market_snapshot(snapshot)
+    return snapshot
+
+
+def _market_rebuild_done(task: asyncio.Task):
+    global _market_rebuild
+    _market_rebuild = None
+    if not task.cancelled() and task.exception() is not None:
+        _market_stats["build_errors"] += 1
+        print(f"Market snapshot rebuild failed: {task.exception()}")
+
+
+def _refresh_market_snapshot() -> Optional[asyncio.Task]:
+    """Start a background rebuild if the snapshot is out of date; returns the rebuild in flight, if any."""
+    global _market_rebuild
+    if _market_rebuild is None and not _market_snapshot_current(_market_snapshot):
+        _market_rebuild = asyncio.ensure_future(_rebuild_market_snapshot())
+        _market_rebuild.add_done_callback(_market_rebuild_done)
+    return _market_rebuild
+
+
+async def _sync_market_timeseries():
+    """
+    Every sync interval, fold in observations other worker processes appended to the
+    time-series store and rebuild the snapshot if they (or the date) make it stale
+    """
+    store = get_market_ts_store()
+    while True:
+        await asyncio.sleep(store.sync_interval)
+        try:
+            await asyncio.to_thread(store.sync, force=True)
+        except Exception as e:
+            print(f"Market time-series sync failed: {e}")
+        _refresh_market_snapshot()
+
+
+async def _get_market_snapshot(wait: bool = False) -> MarketSnapshot:
+    """
+    The current market snapshot. When the date or data version has moved on, the
+    rebuild runs in a worker thread and the previous snapshot is served until it is
+    done; only the very first build, or `wait=True`, waits for it.
+    """
+    while True:
+        snapshot = _market_snapshot
+        if _market_snapshot_current(snapshot):
+            return snapshot
+        rebuild = _refresh_market_snapshot()
+        if snapshot is not None and not wait:
+            return snapshot
+        await asyncio.shield(rebuild)
+
+
+def _market_headers(snapshot: MarketSnapshot, etag: str) -> dict:
+    expires = datetime.combine(snapshot.day + timedelta(days=1), datetime.min.time())
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(snapshot.last_modified.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": f"public, max-age={max(0, int((expires - datetime.now()).total_seconds()))}",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def _market_not_modified(request: Request, snapshot: MarketSnapshot, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return snapshot.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
 @app.get("/market")
-async def market():
-    """Enhanced market API with comprehensive crop data and realistic pricing"""
-    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=12, freq="W").strftime("%Y-%m-%d").tolist()
-    
-    # Use a more sophisticated random generator for consistent but realistic data
-    rng = np.random.default_rng(42)
-    data = {}
-    
-    for crop_name, crop_info in _COMPREHENSIVE_CROP_DATABASE.items():
-        base_price = crop_info["base_price"]
-        
-        # Create more realistic price variations based on seasonality and market trends
-        seasonal_factor = rng.uniform(0.8, 1.2)  # 20% seasonal variation
-        market_trend = rng.uniform(-0.1, 0.15)   # Market trend factor
-        
-        # Generate price series with realistic volatility
-        price_volatility = base_price * 0.05  # 5% base volatility
-        price_changes = rng.normal(market_trend, price_volatility, len(dates))
-        prices = [base_price * seasonal_factor]
-        
-        for change in price_changes[1:]:
-            new_price = prices[-1] * (1 + change)
-            # Ensure prices don't go too extreme
-            new_price = max(base_price * 0.5, min(base_price * 2, new_price))
-            prices.append(round(new_price, 2))
-        
-        # Generate demand based on price (inverse relationship) and seasonality
-        base_demand = rng.uniform(60, 95)
-        demand_values = []
-        for price in prices:
-            # Inverse price-demand relationship
-            price_effect = (base_price / price) * 20  # Price elasticity effect
-            seasonal_demand = rng.uniform(-10, 10)    # Seasonal demand variation
-            demand = base_demand + price_effect + seasonal_demand
-            demand = max(30, min(100, int(demand)))   # Keep demand between 30-100%
-            demand_values.append(demand)
-        
-        data[crop_name] = {
-            "prices": prices,
-            "demand": demand_values,
-            "category": crop_info["category"],
-            "unit": crop_info["unit"],
-            "image": crop_info["image"],
-            "description": crop_info["description"],
-            "season": crop_info["season"],
-            "harvest_time": crop_info["harvest_time"]
-        }
-    
-    return {"dates": dates, "series": data, "total_crops": len(data)}
+async def market(request: Request):
+    """
+    Enhanced market API with comprehensive crop data and realistic pricing.
+
+    The series only change with the date, so the JSON body is built and gzipped once
+    per day and served as bytes with ETag/Last-Modified; conditional requests get 304.
+    """
+    snapshot = await _get_market_snapshot()
+    headers = _market_headers(snapshot, snapshot.etag)
+    if _market_not_modified(request, snapshot, snapshot.etag):
+        _market_stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+
+    _market_stats["served"] += 1
+    if snapshot.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        _market_stats["gzip_served"] += 1
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzip_body, media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
 
+def _split_csv(value: Optional[str]) -> Optional[List[str]]:
+    if not value:
+        return None
+    return [part.strip() for part in value.split(",") if part.strip()]
 
-@app.get("/weather")
-async def weather(lat: float, lon: float, days: int = Query(default=12, ge=1, le=14)):
-    # Use Open-Meteo API (no key required) for multi-day forecast
+
+@app.get("/market/query")
+async def market_query(
+    request: Request,
+    crops: Optional[str] = Query(default=None, description="Comma-separated crop names"),
+    category: Optional[str] = None,
+    season: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated subset of " + ",".join(MARKET_FIELDS)),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """
+    Filtered, projected and paginated market data.
+
+    Reads the same daily snapshot as /market but only slices and encodes the crops,
+    dates and fields asked for; pass `next_cursor` back as `cursor` for the next page.
+    """
+    snapshot = await _get_market_snapshot()
     try:
-        # Limit days to maximum supported by API (14 days for free tier)
-        forecast_days = min(days, 14)
-        url = (
-            "https://api.open-meteo.com/v1/forecast"
-            f"?latitude={lat}&longitude={lon}&daily=temperature_2m_max,temperature_2m_min,precipitation_sum,weather_code"
-            f"&timezone=auto&forecast_days={forecast_days}"
+        result = snapshot.store.query(
+            crops=_split_csv(crops),
+            category=category,
+            season=season,
+            start=start,
+            end=end,
+            fields=_split_csv(fields),
+            cursor=cursor,
+            limit=limit,
         )
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        j = r.json()
-        daily = j.get("daily", {})
-        return {
-            "dates": daily.get("time", []),
-            "temp_max": daily.get("temperature_2m_max", []),
-            "temp_min": daily.get("temperature_2m_min", []),
-            "precip": daily.get("precipitation_sum", []),
-            "weather_code": daily.get("weather_code", []),
+    except MarketQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    body = _encode_json(result)
+    etag = 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = _market_headers(snapshot, etag)
+    if _market_not_modified(request, snapshot, etag.removeprefix("W/")):
+        _market_stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    _market_stats["queries"] += 1
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/mandi-prices")
+async def mandi_prices(
+    request: Request,
+    commodity: Optional[str] = None,
+    market: Optional[str] = None,
+    state: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """
+    Latest mandi prices from the server-side poller, filtered by commodity (matched
+    on catalog crop when the name normalizes to one), market and state.
+
+    Responses are pre-encoded per snapshot and cacheable until the next poll.
+    """
+    entry = _mandi_service.query(commodity=commodity, market=market, state=state, limit=limit)
+    if entry is None:
+        raise HTTPException(status_code=503, detail="Mandi prices not available yet")
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={_mandi_service.seconds_until_next_poll()}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/market/stream")
+async def market_stream(
+    request: Request,
+    crops: Optional[str] = Query(default=None, description="Comma-separated crop names"),
+    categories: Optional[str] = Query(default=None, description="Comma-separated categories"),
+):
+    """
+    Server-sent events with live market data for the subscribed crops and categories
+    (all crops when neither is given).
+
+    The first event is a `snapshot` with the current series; after that only `delta`
+    events with changed [date, price, demand] points are sent, with a heartbeat comment
+    while idle. Reconnecting with Last-Event-ID resumes from that event.
+    """
+    snapshot = await _get_market_snapshot()
+    names = set(_split_csv(crops) or [])
+    unknown = sorted(names - set(snapshot.store.names))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown crops: {unknown}")
+    for category in _split_csv(categories) or []:
+        names.update(snapshot.store.names[i] for i in snapshot.store.by_category.get(category.lower(), []))
+    if not crops and not categories:
+        names = set(snapshot.store.names)
+    if not names:
+        raise HTTPException(status_code=400, detail="No crops match the subscription")
+    if not _market_broadcaster.accepting():
+        raise HTTPException(status_code=503, detail="Too many market stream clients")
+
+    last_event_id = request.headers.get("last-event-id")
+    events = _market_broadcaster.stream(
+        names,
+        int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+        request.is_disconnected,
+        _refresh_market_snapshot,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class MarketObservation(BaseModel):
+    crop: str = Field(..., description="Crop key from the market catalog")
+    date: date
+    price: float = Field(..., gt=0, description="Price per catalog unit")
+    demand: Optional[float] = Field(default=None, ge=0, le=100, description="Demand index (0-100)")
+
+
+class MarketObservationBatch(BaseModel):
+    observations: List[MarketObservation] = Field(..., min_length=1)
+
+
+@app.post("/market/observations")
+async def ingest_market_observations(req: MarketObservationBatch):
+    """
+    Append price/demand observations to the market time-series store.
+
+    Rollups for the affected weeks, months and seasons are refreshed immediately and
+    the /market snapshot is rebuilt (off the event loop) before responding. A later
+    observation for the same crop and date replaces an earlier one.
+    """
+    if len(req.observations) > MAX_MARKET_OBSERVATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MARKET_OBSERVATIONS} observations per request")
+    unknown = sorted({o.crop for o in req.observations if o.crop not in _COMPREHENSIVE_CROP_DATABASE})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown crops: {unknown}")
+
+    started = time.perf_counter()
+    store = get_market_ts_store()
+    appended = await asyncio.to_thread(
+        store.append,
+        [o.crop for o in req.observations],
+        [o.date for o in req.observations],
+        [o.price for o in req.observations],
+        [np.nan if o.demand is None else o.demand for o in req.observations],
+    )
+    _invalidate_market_snapshot()
+    # Rebuild now so live subscribers get the change without waiting for a /market request
+    await _get_market_snapshot(wait=True)
+    return {"appended": appended, "version": store.version, "ingest_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
+@app.get("/market/history")
+async def market_history(
+    crops: Optional[str] = Query(default=None, description="Comma-separated crop names (default: all)"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    level: str = Query(default="weekly", description="daily, " + ", ".join(ROLLUP_LEVELS)),
+):
+    """
+    Historical prices from the time-series store over [start, end] (default: the
+    last year). `daily` returns the stored observations; other levels return the
+    precomputed rollups (mean, min, max, volatility, demand_mean, count) per period.
+    """
+    names = _split_csv(crops) or list(_COMPREHENSIVE_CROP_DATABASE)
+    unknown = [name for name in names if name not in _COMPREHENSIVE_CROP_DATABASE]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown crops: {unknown}")
+    if level != "daily" and level not in ROLLUP_LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be daily or one of {ROLLUP_LEVELS}")
+
+    store = get_market_ts_store()
+    end_day = int(to_days(end or date.today()))
+    start_day = int(to_days(start)) if start else end_day - 364
+    ids = store.lookup_crops(names)
+    scanned_before = store.stats["segments_scanned"]
+    series = {}
+    if level == "daily":
+        rows = store.read(start_day, end_day, ids)
+        for name, crop_id in zip(names, ids.tolist()):
+            mask = rows["crop"] == crop_id
+            series[name] = {
+                "dates": np.datetime_as_string(rows["day"][mask].astype("datetime64[D]")).tolist(),
+                "prices": rows["price"][mask].astype(np.float64).round(2).tolist(),
+                "demand": [None if np.isnan(v) else round(v, 1) for v in rows["demand"][mask].tolist()],
+            }
+    else:
+        table = store.rollup(level, start_day, end_day, ids.tolist()).round(4)
+        for name, crop_id in zip(names, ids.tolist()):
+            part = table.xs(crop_id, level="crop") if crop_id in table.index.get_level_values("crop") else table.iloc[:0]
+            series[name] = {
+                "periods": [period_label(level, key) for key in part.index.get_level_values("period")],
+                **{column: part[column].astype(object).where(part[column].notna(), None).tolist() for column in part.columns},
+            }
+    return {
+        "level": level,
+        "start": str(np.datetime64(start_day, "D")),
+        "end": str(np.datetime64(end_day, "D")),
+        "series": series,
+        "meta": {"segments_scanned": store.stats["segments_scanned"] - scanned_before},
+    }
+
+
+_OPEN_METEO_DAILY = "temperature_2m_max,temperature_2m_min,precipitation_sum,weather_code"
+
+
+def _parse_forecast(j: dict, forecast_days: int) -> dict:
+    """Columnar daily forecast from one Open-Meteo location object."""
+    daily = j.get("daily", {})
+    return {
+        "dates": daily.get("time", []),
+        "temp_max": daily.get("temperature_2m_max", []),
+        "temp_min": daily.get("temperature_2m_min", []),
+        "precip": daily.get("precipitation_sum", []),
+        "weather_code": daily.get("weather_code", []),
+        "forecast_days": forecast_days,
+    }
+
+
+async def _fetch_weather(lat: float, lon: float, forecast_days: int) -> dict:
+    """Fetch a daily forecast from Open-Meteo (no key required)."""
+    return (await _fetch_weather_many([(lat, lon)], forecast_days))[0]
+
+
+async def _fetch_weather_many(coordinates: List[tuple], forecast_days: int) -> List[dict]:
+    """Fetch forecasts for several locations in one Open-Meteo multi-location call."""
+    j = await get_http_client().get_json(
+        "open-meteo",
+        OPEN_METEO_URL,
+        params={
+            "latitude": ",".join(str(lat) for lat, _ in coordinates),
+            "longitude": ",".join(str(lon) for _, lon in coordinates),
+            "daily": _OPEN_METEO_DAILY,
+            "timezone": "auto",
             "forecast_days": forecast_days,
-        }
+        },
+    )
+    # A single location comes back as an object, several as a list in request order
+    items = j if isinstance(j, list) else [j]
+    if len(items) != len(coordinates):
+        raise ValueError(f"Expected {len(coordinates)} forecasts, got {len(items)}")
+    return [_parse_forecast(item, forecast_days) for item in items]
+
+
+_weather_cache = StaleWhileRevalidateCache(
+    "weather",
+    ttl=WEATHER_CACHE_TTL,
+    stale_ttl=WEATHER_CACHE_STALE_TTL,
+    max_entries=WEATHER_CACHE_SIZE,
+)
+
+
+def _weather_grid_cell(lat: float, lon: float) -> tuple:
+    """Snap coordinates to the WEATHER_GRID_DEG forecast grid."""
+    return (
+        round(round(lat / WEATHER_GRID_DEG) * WEATHER_GRID_DEG, 4),
+        round(round(lon / WEATHER_GRID_DEG) * WEATHER_GRID_DEG, 4),
+    )
+
+
+async def _get_weather(lat: float, lon: float, forecast_days: int) -> tuple:
+    """
+    Forecast for the grid cell containing (lat, lon) as (data, cache status).
+
+    If Open-Meteo fails (or its circuit is open) an expired forecast for the cell is
+    served with status DEGRADED rather than failing the request.
+    """
+    cell_lat, cell_lon = _weather_grid_cell(lat, lon)
+    return await _weather_cache.get(
+        (cell_lat, cell_lon, forecast_days),
+        lambda: _fetch_weather(cell_lat, cell_lon, forecast_days),
+        serve_expired_on_error=True,
+    )
+
+
+async def _fetch_weather_cells(keys: List[tuple]) -> dict:
+    """
+    Batch loader for the weather cache: fetches (lat, lon, days) grid cells with
+    WEATHER_BATCH_SIZE locations per upstream call, all chunks concurrently.
+    """
+    chunks = []
+    for days in dict.fromkeys(k[2] for k in keys):
+        same_days = [k for k in keys if k[2] == days]
+        chunks += [same_days[i:i + WEATHER_BATCH_SIZE] for i in range(0, len(same_days), WEATHER_BATCH_SIZE)]
+
+    async def fetch(chunk: List[tuple]) -> dict:
+        try:
+            forecasts = await _fetch_weather_many([(k[0], k[1]) for k in chunk], chunk[0][2])
+            return dict(zip(chunk, forecasts))
+        except Exception as e:
+            # A failed chunk only fails its own locations
+            return {k: e for k in chunk}
+
+    results: dict = {}
+    for chunk_result in await asyncio.gather(*(fetch(chunk) for chunk in chunks)):
+        results.update(chunk_result)
+    return results
+
+
+@app.get("/weather", dependencies=[_rate_limited("weather")])
+async def weather(response: Response, lat: float, lon: float, days: int = Query(default=12, ge=1, le=14)):
+    # Use Open-Meteo API (no key required) for multi-day forecast, cached per grid cell
+    try:
+        # Limit days to maximum supported by API (14 days for free tier)
+        forecast_days = min(days, 14)
+        data, cache_status = await _get_weather(lat, lon, forecast_days)
+        response.headers["X-Cache"] = cache_status
+        return data
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Weather fetch failed: {e}")
 
 
+class Coordinates(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class BulkWeatherRequest(BaseModel):
+    locations: List[Coordinates] = Field(..., min_length=1, description="Farm coordinates")
+    days: int = Field(default=12, ge=1, le=14)
+
+
+@app.post("/weather/bulk", dependencies=[_rate_limited("weather")])
+async def weather_bulk(req: BulkWeatherRequest):
+    """
+    Forecasts for many coordinates in one call.
+
+    Locations are deduplicated to WEATHER_GRID_DEG cells and cache misses are fetched
+    with Open-Meteo multi-location queries, so dozens of farms cost about one upstream
+    round trip. Each location gets columnar daily arrays, in input order.
+    """
+    if len(req.locations) > MAX_BULK_WEATHER_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_WEATHER_LOCATIONS} locations per request")
+
+    started = time.perf_counter()
+    keys = [_weather_grid_cell(loc.latitude, loc.longitude) + (req.days,) for loc in req.locations]
+    upstream_calls = []
+
+    async def loader(cells: List[tuple]) -> dict:
+        upstream_calls.append(len(cells))
+        return await _fetch_weather_cells(cells)
+
+    cached = await _weather_cache.get_many(keys, loader, serve_expired_on_error=True)
+
+    locations = []
+    for index, (loc, key) in enumerate(zip(req.locations, keys)):
+        value, cache_status = cached[key]
+        item = {
+            "index": index,
+            "latitude": loc.latitude,
+            "longitude": loc.longitude,
+            "grid_latitude": key[0],
+            "grid_longitude": key[1],
+            "cache": cache_status,
+        }
+        if isinstance(value, BaseException):
+            item.update({"weather": None, "error": f"Weather fetch failed: {value}"})
+        else:
+            item.update({"weather": value, "error": None})
+        locations.append(item)
+
+    return {
+        "forecast_days": req.days,
+        "locations": locations,
+        "meta": {
+            "requested": len(keys),
+            "unique_cells": len(cached),
+            "cache_hits": sum(1 for _, status in cached.values() if status in ("HIT", "STALE")),
+            "degraded": sum(1 for _, status in cached.values() if status == "DEGRADED"),
+            "upstream_batches": sum(-(-n // WEATHER_BATCH_SIZE) for n in upstream_calls),
+            "failed": sum(1 for item in locations if item["error"]),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    }
+
+
 class LocationRequest(BaseModel):
     place_name: Optional[str] = Field(default=None, description="Place name for geocoding")
     latitude: Optional[float] = Field(default=None, description="Latitude coordinate")
@@ -893,6 +1563,28 @@ class SoilDataResponse(BaseModel):
     confidence_score: float
     source: str
 
+class BulkSoilDataRequest(BaseModel):
+    locations: List[LocationRequest] = Field(..., min_length=1, description="Place names and/or coordinates")
+
+class BulkSoilDataItem(BaseModel):
+    index: int
+    data: Optional[SoilDataResponse] = None
+    error: Optional[str] = None
+
+class BulkSoilDataResponse(BaseModel):
+    results: List[BulkSoilDataItem]
+    meta: dict
+
+class LocationRecommendationRequest(LocationRequest):
+    days: int = Field(default=7, ge=1, le=14, description="Forecast days used for the temperature feature")
+
+class LocationRecommendationResponse(BaseModel):
+    prediction: PredictResponse
+    soil: SoilDataResponse
+    weather: Optional[dict] = None
+    features: dict
+    meta: dict
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = Field(default=None, description="Session ID for conversation continuity")
@@ -904,25 +1596,101 @@ class ChatResponse(BaseModel):
     metadata: dict = {}
 
 
+def _location_key(location: LocationRequest) -> Optional[tuple]:
+    """Deduplication key for a location request (None when the request is incomplete)."""
+    if location.place_name:
+        return ("place", " ".join(location.place_name.lower().split()))
+    if location.latitude is not None and location.longitude is not None:
+        return ("coords", round(location.latitude, 4), round(location.longitude, 4))
+    return None
+
+
+async def _resolve_location(location: LocationRequest) -> tuple:
+    """Resolve a location request to (lat, lon, location_name) via geocoding."""
+    if location.place_name:
+        # Get coordinates from place name
+        lat, lon = await _get_coordinates_from_place(location.place_name)
+        return lat, lon, location.place_name.lower()
+    if location.latitude is not None and location.longitude is not None:
+        # Use provided coordinates
+        lat, lon = location.latitude, location.longitude
+        return lat, lon, await _get_location_from_coordinates(lat, lon)
+    raise HTTPException(status_code=400, detail="Provide either place_name or coordinates")
+
+
+# Memoized /soil-data results: (location key, date bucket) -> (payload, etag), LRU-bounded
+_SOIL_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_soil_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _soil_cache_key(key: tuple, bucket: int) -> tuple:
+    # The soil table version is part of the key so a hot reload invalidates old entries
+    return key + (bucket, get_soil_store().table.version)
+
+
+def _soil_cache_get(key: tuple, bucket: int) -> Optional[tuple]:
+    cache_key = _soil_cache_key(key, bucket)
+    entry = _SOIL_CACHE.get(cache_key)
+    if entry is None:
+        _soil_cache_stats["misses"] += 1
+        return None
+    _SOIL_CACHE.move_to_end(cache_key)
+    _soil_cache_stats["hits"] += 1
+    return entry
+
+
+def _soil_cache_put(key: tuple, bucket: int, payload: dict) -> tuple:
+    etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+    entry = (payload, etag)
+    _SOIL_CACHE[_soil_cache_key(key, bucket)] = entry
+    while len(_SOIL_CACHE) > SOIL_CACHE_SIZE:
+        _SOIL_CACHE.popitem(last=False)
+    return entry
+
+
+def _soil_cache_headers(etag: str, bucket: int) -> dict:
+    max_age = max(0, int((_date_bucket_expiry(bucket) - datetime.now()).total_seconds()))
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+
+async def _lookup_soil_data(location: LocationRequest, resolved: Optional[tuple] = None) -> tuple:
+    """
+    Soil data for a location as (payload, etag, date bucket, cache status).
+
+    The location is only geocoded on a cache miss; callers that already geocoded it
+    pass `resolved` as (lat, lon, location_name).
+    """
+    key = _location_key(location)
+    if key is None:
+        raise HTTPException(status_code=400, detail="Provide either place_name or coordinates")
+    bucket = _date_bucket()
+    
+    entry = _soil_cache_get(key, bucket)
+    if entry is not None:
+        return entry + (bucket, "HIT")
+    lat, lon, location_name = resolved or await _resolve_location(location)
+    
+    # Generate soil and environmental data
+    entry = _soil_cache_put(key, bucket, _generate_environmental_data(location_name, lat, lon))
+    return entry + (bucket, "MISS")
+
+
 @app.post("/soil-data", response_model=SoilDataResponse)
-async def get_soil_data(location: LocationRequest):
-    """Get soil and environmental data based on location (place name or coordinates)."""
+async def get_soil_data(location: LocationRequest, request: Request, response: Response):
+    """
+    Get soil and environmental data based on location (place name or coordinates).
+
+    Results are deterministic per date bucket, so they are memoized and served with
+    ETag/Cache-Control headers; a matching If-None-Match returns 304.
+    """
     try:
-        lat, lon, location_name = None, None, "unknown"
-        
-        if location.place_name:
-            # Get coordinates from place name
-            lat, lon = _get_coordinates_from_place(location.place_name)
-            location_name = location.place_name.lower()
-        elif location.latitude is not None and location.longitude is not None:
-            # Use provided coordinates
-            lat, lon = location.latitude, location.longitude
-            location_name = _get_location_from_coordinates(lat, lon)
-        else:
-            raise HTTPException(status_code=400, detail="Provide either place_name or coordinates")
+        soil_data, etag, bucket, cache_status = await _lookup_soil_data(location)
         
-        # Generate soil and environmental data
-        soil_data = _generate_environmental_data(location_name, lat, lon)
+        headers = _soil_cache_headers(etag, bucket)
+        headers["X-Cache"] = cache_status
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
         
         return SoilDataResponse(**soil_data)
         
@@ -932,6 +1700,199 @@ async def get_soil_data(location: LocationRequest):
         raise HTTPException(status_code=500, detail=f"Failed to fetch soil data: {str(e)}")
 
 
+@app.post("/soil-data/bulk", response_model=BulkSoilDataResponse)
+async def get_soil_data_bulk(req: BulkSoilDataRequest):
+    """
+    Soil and environmental data for many locations in one call.
+
+    Duplicate locations are resolved once, geocoding runs concurrently (bounded by
+    GEOCODE_CONCURRENCY) and failures are reported per item instead of failing the batch.
+    Results are returned in input order.
+    """
+    if len(req.locations) > MAX_BULK_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_LOCATIONS} locations per request")
+
+    started = time.perf_counter()
+    bucket = _date_bucket()
+    keys = [_location_key(loc) for loc in req.locations]
+    unique = {key: loc for key, loc in zip(keys, req.locations) if key is not None}
+
+    # Serve memoized locations directly; only cache misses are geocoded
+    generated: dict = {}
+    for key in unique:
+        entry = _soil_cache_get(key, bucket)
+        if entry is not None:
+            generated[key] = SoilDataResponse(**entry[0])
+    pending = {key: loc for key, loc in unique.items() if key not in generated}
+
+    semaphore = asyncio.Semaphore(GEOCODE_CONCURRENCY)
+
+    async def resolve(location: LocationRequest):
+        async with semaphore:
+            return await _resolve_location(location)
+
+    # Total latency is bounded by the slowest unique lookup rather than the sum
+    resolved = await asyncio.gather(*(resolve(loc) for loc in pending.values()), return_exceptions=True)
+    resolved = dict(zip(pending.keys(), resolved))
+    geocode_ms = (time.perf_counter() - started) * 1000
+
+    # Single matching pass over the distinct locations, names and coordinates together
+    located = {key: res for key, res in resolved.items() if not isinstance(res, BaseException)}
+    matches = dict(zip(located, _find_closest_soil_data_many(
+        [r[2] for r in located.values()], [r[0] for r in located.values()], [r[1] for r in located.values()]
+    )))
+
+    for key, res in resolved.items():
+        if isinstance(res, BaseException):
+            continue
+        lat, lon, location_name = res
+        try:
+            payload = _generate_environmental_data(location_name, lat, lon, match=matches[key])
+            generated[key] = SoilDataResponse(**_soil_cache_put(key, bucket, payload)[0])
+        except Exception as e:
+            resolved[key] = e
+
+    results: List[BulkSoilDataItem] = []
+    for index, key in enumerate(keys):
+        if key is None:
+            results.append(BulkSoilDataItem(index=index, error="Provide either place_name or coordinates"))
+            continue
+        res = resolved.get(key)
+        if isinstance(res, HTTPException):
+            results.append(BulkSoilDataItem(index=index, error=str(res.detail)))
+        elif isinstance(res, BaseException):
+            results.append(BulkSoilDataItem(index=index, error=f"Failed to fetch soil data: {res}"))
+        else:
+            results.append(BulkSoilDataItem(index=index, data=generated[key]))
+
+    return BulkSoilDataResponse(
+        results=results,
+        meta={
+            "requested": len(keys),
+            "unique_locations": len(unique),
+            "cache_hits": len(unique) - len(pending),
+            "failed": sum(1 for item in results if item.error),
+            "geocode_ms": round(geocode_ms, 2),
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    )
+
+
+def _features_from_location_data(soil: dict, forecast: Optional[dict], climate: Optional[dict] = None) -> dict:
+    """
+    Derive the seven model features from soil data and an optional forecast.
+
+    Temperature is the mean daily forecast temperature when available, else the
+    monthly normal from `climate` if given; humidity and rainfall stay regional
+    estimates since a short forecast does not represent them.
+    """
+    features = {col: float(soil[col]) for col in _feature_columns}
+    if climate and not forecast:
+        features["temperature"] = climate["temperature"]
+    if forecast:
+        daily_means = [
+            (hi + lo) / 2.0
+            for hi, lo in zip(forecast.get("temp_max", []), forecast.get("temp_min", []))
+            if hi is not None and lo is not None
+        ]
+        if daily_means:
+            features["temperature"] = round(float(np.mean(daily_means)), 2)
+    return features
+
+
+@app.post("/recommend", response_model=LocationRecommendationResponse)
+async def recommend_for_location(req: LocationRecommendationRequest):
+    """
+    One-shot location to crop recommendation.
+
+    Geocodes the location, fetches soil data and the weather forecast concurrently,
+    derives the model features and scores them with the ensemble. Per-stage timings
+    are reported in `meta.timings_ms`.
+    """
+    if _model is None or _scaler is None or _label_encoder is None:
+        raise HTTPException(status_code=500, detail="Model not initialized")
+    if _location_key(req) is None:
+        raise HTTPException(status_code=400, detail="Provide either place_name or coordinates")
+
+    started = time.perf_counter()
+    timings: dict = {}
+
+    def elapsed_ms(since: float) -> float:
+        return round((time.perf_counter() - since) * 1000, 2)
+
+    # Stage 1: geocode place names (coordinates skip straight to the fan-out)
+    resolved = None
+    if req.place_name:
+        stage = time.perf_counter()
+        lat, lon = await _get_coordinates_from_place(req.place_name)
+        resolved = (lat, lon, req.place_name.lower())
+        timings["geocode"] = elapsed_ms(stage)
+    else:
+        lat, lon = req.latitude, req.longitude
+
+    # Stage 2: soil data and weather concurrently
+    async def soil_stage():
+        stage = time.perf_counter()
+        try:
+            return await _lookup_soil_data(req, resolved)
+        finally:
+            timings["soil"] = elapsed_ms(stage)
+
+    async def weather_stage():
+        stage = time.perf_counter()
+        try:
+            return (await asyncio.wait_for(_get_weather(lat, lon, req.days), WEATHER_LIVE_TIMEOUT))[0]
+        finally:
+            timings["weather"] = elapsed_ms(stage)
+
+    soil_result, weather_result = await asyncio.gather(soil_stage(), weather_stage(), return_exceptions=True)
+    if isinstance(soil_result, HTTPException):
+        raise soil_result
+    if isinstance(soil_result, BaseException):
+        raise HTTPException(status_code=500, detail=f"Failed to fetch soil data: {soil_result}")
+    soil_data, _, _, soil_cache = soil_result
+    weather_error = None
+    if isinstance(weather_result, asyncio.TimeoutError):
+        weather_error = f"Weather fetch exceeded {WEATHER_LIVE_TIMEOUT}s"
+        weather_result = None
+    elif isinstance(weather_result, BaseException):
+        weather_error = f"Weather fetch failed: {weather_result}"
+        weather_result = None
+    # Weather is optional: without a forecast, temperature comes from the local monthly normals
+    climate = get_climatology_store().features(lat, lon) if weather_result is None else None
+
+    # Stage 3: features and ensemble scoring
+    stage = time.perf_counter()
+    features = _features_from_location_data(soil_data, weather_result, climate)
+    X_scaled = _scaler.transform(pd.DataFrame([features])[_feature_columns])
+    proba = _model.predict_proba(X_scaled)
+    recommendations = _top_recommendations(features, proba[0])
+    timings["predict"] = elapsed_ms(stage)
+    timings["total"] = elapsed_ms(started)
+
+    prediction = PredictResponse(
+        recommendations=recommendations,
+        meta={"mode": "single", "model_accuracy": _model_accuracy, "total_crops": len(_crops)},
+    )
+    meta = {
+        "latitude": lat,
+        "longitude": lon,
+        "soil_cache": soil_cache,
+        "temperature_source": "forecast" if weather_result else "climatology",
+        "timings_ms": timings,
+    }
+    if weather_error:
+        meta["weather_error"] = weather_error
+
+    return LocationRecommendationResponse(
+        prediction=prediction,
+        soil=SoilDataResponse(**soil_data),
+        weather=weather_result,
+        features=features,
+        meta=meta,
+    )
+
+
 # Agricultural knowledge base
 _CROP_KNOWLEDGE = {
     "rice": {
@@ -1061,12 +2022,41 @@ async def enhanced_chatbot(req: ChatRequest, request: Request):
         )
 
 
+@app.post("/chatbot/stream")
+async def chatbot_stream(req: ChatRequest, request: Request):
+    """
+    Chatbot reply streamed as server-sent events: `delta` events carry text chunks as
+    the model generates them, then a `done` event with the full reply and metadata
+    (including time-to-first-token). Rate-limit and hard failures end with an `error`
+    event carrying the localized message.
+    """
+    client_ip = request.client.host if request.client else "unknown"
+    session_id = req.session_id or str(uuid.uuid4())
+    language = req.language or "en"
+    chatbot_service = get_chatbot_service()
+
+    async def events():
+        yield f"event: session\ndata: {json.dumps({'session_id': session_id})}\n\n"
+        # Closed with the response, so a client going away frees the LLM slot right then
+        async with aclosing(chatbot_service.stream_message(session_id, req.message, language, client_ip)) as stream:
+            async for event, data in stream:
+                if event != "delta":
+                    data = {**data, "session_id": session_id}
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/chatbot/history/{session_id}")
-async def get_conversation_history(session_id: str):
-    """Get conversation history for a session"""
+async def get_conversation_history(session_id: str, include_archived: bool = False):
+    """Get conversation history for a session; older archived messages only with include_archived"""
     try:
         chatbot_service = get_chatbot_service()
-        history = chatbot_service.get_conversation_history(session_id)
+        history = await chatbot_service.get_conversation_history(session_id, include_archived)
         if history:
             return {"success": True, "history": history}
         else:
@@ -1080,7 +2070,7 @@ async def clear_conversation_history(session_id: str):
     """Clear conversation history for a session"""
     try:
         chatbot_service = get_chatbot_service()
-        success = chatbot_service.clear_conversation(session_id)
+        success = await chatbot_service.clear_conversation(session_id)
         if success:
             return {"success": True, "message": "Conversation history cleared"}
         else:
@@ -6,19 +6,33 @@ Provides ChatGPT-like conversational AI for agricultural assistance
 import os
 import json
 import time
+import hashlib
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass, asdict
-from collections import defaultdict
+from typing import List, Dict, Any, AsyncIterator, Deque, Optional, Set, Tuple
+from dataclasses import dataclass, asdict, field
+from collections import deque
+from itertools import islice
+import base64
+import string
+import unicodedata
+import zlib
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from functools import lru_cache
 
-import openai
-from openai import AsyncOpenAI
 from pydantic import BaseModel
 import requests
 
+from crop_catalog import CROP_ALIASES
+from keyword_matcher import KeywordMatcher
+from llm_pool import LLMOverloaded, PRIORITY_DEFAULT, PRIORITY_STREAM, create_pool
+from prompt_builder import PromptBuilder
+from mandi_service import COMMODITY_ALIASES
+from rate_limit import get_rate_limiter
+from response_cache import ResponseCache
+from session_store import SessionStore, create_backend
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,53 +57,161 @@ class ConversationMessage:
             'metadata': self.metadata or {}
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationMessage":
+        return cls(
+            id=data['id'],
+            role=data['role'],
+            content=data['content'],
+            timestamp=datetime.fromisoformat(data['timestamp']),
+            language=data.get('language', 'en'),
+            metadata=data.get('metadata') or None
+        )
+
+# Per-session message buffer: the most recent messages stay live for prompt building;
+# older ones are compressed into an archive (bounded in bytes) or dropped
+SESSION_MESSAGE_CAPACITY = int(os.getenv("SESSION_MESSAGE_CAPACITY", "50"))
+SESSION_OVERFLOW_POLICY = os.getenv("SESSION_OVERFLOW_POLICY", "archive").lower()
+SESSION_ARCHIVE_MAX_BYTES = int(os.getenv("SESSION_ARCHIVE_MAX_BYTES", "65536"))
+ARCHIVE_CHUNK_MESSAGES = 20
+
 @dataclass
 class ConversationSession:
     """Represents a conversation session with history"""
     session_id: str
-    messages: List[ConversationMessage]
+    messages: Deque[ConversationMessage]
     created_at: datetime
     last_activity: datetime
     user_context: Dict[str, Any]
     language: str = "en"
-    
-    def add_message(self, message: ConversationMessage):
+    # zlib-compressed JSON chunks of messages pushed out of the buffer, oldest first
+    archive: List[bytes] = field(default_factory=list)
+    spilled: List[Dict[str, Any]] = field(default_factory=list)
+    archived_count: int = 0
+    dropped_count: int = 0
+    # Rolling summary of turns no longer sent verbatim, and the message index it covers up to
+    summary: List[str] = field(default_factory=list)
+    summary_upto: int = 0
+
+    def __post_init__(self):
+        recent = self.messages
+        self.messages = deque(maxlen=SESSION_MESSAGE_CAPACITY)
+        for message in recent:
+            self._append(message)
+
+    def _append(self, message: ConversationMessage):
+        if len(self.messages) == self.messages.maxlen:
+            self._overflow(self.messages[0])
         self.messages.append(message)
+
+    def _overflow(self, message: ConversationMessage):
+        if SESSION_OVERFLOW_POLICY != "archive":
+            self.dropped_count += 1
+            return
+        self.spilled.append(message.to_dict())
+        if len(self.spilled) < ARCHIVE_CHUNK_MESSAGES:
+            return
+        self.archive.append(zlib.compress(json.dumps(self.spilled, ensure_ascii=False).encode()))
+        self.archived_count += len(self.spilled)
+        self.spilled = []
+        while len(self.archive) > 1 and sum(map(len, self.archive)) > SESSION_ARCHIVE_MAX_BYTES:
+            # The archive keeps the newest chunks; the oldest are dropped whole
+            self.dropped_count += ARCHIVE_CHUNK_MESSAGES
+            self.archived_count -= ARCHIVE_CHUNK_MESSAGES
+            self.archive.pop(0)
+
+    @property
+    def message_count(self) -> int:
+        """Every message in the conversation, including archived and dropped ones"""
+        return self.dropped_count + self.archived_count + len(self.spilled) + len(self.messages)
+
+    def add_message(self, message: ConversationMessage):
+        self._append(message)
         self.last_activity = datetime.now()
         
     def get_recent_messages(self, limit: int = 10) -> List[ConversationMessage]:
-        return self.messages[-limit:] if len(self.messages) > limit else self.messages
+        return list(islice(self.messages, max(0, len(self.messages) - limit), None))
+
+    def archived_messages(self) -> List[Dict[str, Any]]:
+        """Messages pushed out of the buffer that are still kept, oldest first"""
+        older = [m for chunk in self.archive for m in json.loads(zlib.decompress(chunk))]
+        return older + self.spilled
         
-    def to_dict(self) -> Dict[str, Any]:
+    def to_dict(self, include_archived: bool = False) -> Dict[str, Any]:
+        recent = [msg.to_dict() for msg in self.messages]
         return {
             'session_id': self.session_id,
-            'messages': [msg.to_dict() for msg in self.messages],
+            'messages': self.archived_messages() + recent if include_archived else recent,
+            'archived_messages': self.archived_count + len(self.spilled),
+            'dropped_messages': self.dropped_count,
             'created_at': self.created_at.isoformat(),
             'last_activity': self.last_activity.isoformat(),
             'user_context': self.user_context,
             'language': self.language
         }
 
-class RateLimiter:
-    """Simple rate limiter for API requests"""
-    def __init__(self, max_requests: int = 30, time_window: int = 60):
-        self.max_requests = max_requests
-        self.time_window = time_window
-        self.requests = defaultdict(list)
-    
-    def is_allowed(self, identifier: str) -> bool:
-        now = time.time()
-        # Clean old requests
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier]
-            if now - req_time < self.time_window
-        ]
-        
-        if len(self.requests[identifier]) >= self.max_requests:
-            return False
-            
-        self.requests[identifier].append(now)
-        return True
+    def to_record(self) -> Dict[str, Any]:
+        """Storage form: the live buffer plus the archive chunks as they are"""
+        return {
+            **self.to_dict(),
+            'archive': [base64.b64encode(chunk).decode() for chunk in self.archive],
+            'spilled': self.spilled,
+            'archived_count': self.archived_count,
+            'dropped_count': self.dropped_count,
+            'summary': self.summary,
+            'summary_upto': self.summary_upto,
+        }
+
+    @classmethod
+    def from_record(cls, data: Dict[str, Any]) -> "ConversationSession":
+        return cls(
+            session_id=data['session_id'],
+            messages=[ConversationMessage.from_dict(m) for m in data['messages']],
+            created_at=datetime.fromisoformat(data['created_at']),
+            last_activity=datetime.fromisoformat(data['last_activity']),
+            user_context=data.get('user_context', {}),
+            language=data.get('language', 'en'),
+            archive=[base64.b64decode(chunk) for chunk in data.get('archive', [])],
+            spilled=data.get('spilled', []),
+            archived_count=data.get('archived_count', 0),
+            dropped_count=data.get('dropped_count', 0),
+            summary=data.get('summary', []),
+            summary_upto=data.get('summary_upto', 0)
+        )
+
+# Keyword vocabulary for context injection and fallback intents, compiled into one
+# automaton at service start. Crop names in Hindi/Marathi, on top of the market aliases
+LOCAL_CROP_NAMES = {
+    "चावल": "rice", "धान": "rice", "तांदूळ": "rice", "भात": "rice",
+    "गेहूं": "wheat", "गेहूँ": "wheat", "गहू": "wheat",
+    "मक्का": "maize", "मकई": "maize",
+}
+# Keyword -> the word looked up in the farming tip keys
+TIP_KEYWORDS = {
+    "organic": "organic", "pest": "pest", "soil": "soil", "water": "water", "irrigation": "irrigation", "rotation": "rotation",
+    "जैविक": "organic", "कीट": "pest", "मिट्टी": "soil", "पानी": "water", "सिंचाई": "irrigation", "फसल चक्र": "rotation",
+    "सेंद्रिय": "organic", "कीड": "pest", "माती": "soil", "पाणी": "water", "सिंचन": "irrigation", "पीक फेरपालट": "rotation",
+}
+# Words followed by a place name ("my farm Nashik", "मेरा गाँव रामपुर")
+LOCATION_KEYWORDS = [
+    "farm", "field", "location", "area", "region", "state", "country",
+    "गाँव", "गांव", "जिला", "राज्य", "गाव", "जिल्हा",
+]
+FARMING_TYPES = {
+    "organic": "organic", "conventional": "conventional", "sustainable": "sustainable", "hydroponic": "hydroponic",
+    "जैविक": "organic", "सेंद्रिय": "organic",
+}
+FALLBACK_INTENTS = {"greetings": "greeting", "crop_questions": "crop", "soil_questions": "soil"}
+
+@dataclass
+class MessageKeywords:
+    """Keyword hits in one message, each list in order of first mention"""
+    crops: List[str] = field(default_factory=list)
+    tips: List[str] = field(default_factory=list)
+    locations: List[str] = field(default_factory=list)
+    farming_types: List[str] = field(default_factory=list)
+    # (language, intent) pairs for the fallback responses
+    intents: Set[Tuple[str, str]] = field(default_factory=set)
 
 class EnhancedChatbotService:
     """Enhanced chatbot service with OpenAI integration and conversation memory"""
@@ -105,26 +227,44 @@ class EnhancedChatbotService:
         
         # Rate limiting
         self.enable_rate_limiting = os.getenv("ENABLE_RATE_LIMITING", "1") == "1"
-        self.max_requests_per_minute = int(os.getenv("MAX_REQUESTS_PER_MINUTE", "30"))
-        self.rate_limiter = RateLimiter(self.max_requests_per_minute, 60)
+        self.rate_limiter = get_rate_limiter()
         
         # Features
         self.enable_memory = os.getenv("ENABLE_CONVERSATION_MEMORY", "1") == "1"
         self.enable_context_injection = os.getenv("ENABLE_CONTEXT_INJECTION", "1") == "1"
         self.enable_fallback = os.getenv("ENABLE_FALLBACK_RESPONSES", "1") == "1"
         
-        # Initialize OpenAI client
+        # OpenAI-compatible endpoints behind a bounded, prioritized pool (LLM_ENDPOINTS)
         if self.use_openai and self.openai_api_key:
-            self.openai_client = AsyncOpenAI(api_key=self.openai_api_key)
+            self.llm_pool = create_pool(self.openai_api_key, {
+                "model": self.model,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "top_p": 0.9,
+                "frequency_penalty": 0.1,
+                "presence_penalty": 0.1
+            })
         else:
-            self.openai_client = None
+            self.llm_pool = None
             logger.warning("OpenAI not configured - using fallback responses only")
         
-        # In-memory conversation storage (in production, use Redis/Database)
-        self.conversations: Dict[str, ConversationSession] = {}
+        # Conversation storage: bounded LRU, optionally backed by SQLite or Redis (SESSION_STORE)
+        self.sessions = SessionStore(ConversationSession.to_record, ConversationSession.from_record, create_backend())
+        
+        # Prompt assembly: history fitted to a token budget, older turns summarized
+        self.prompt_builder = PromptBuilder(max_messages=self.max_history - 2)
+        
+        # Answers to frequent questions, matched by similarity
+        self.response_cache = ResponseCache()
         
-        # Thread pool for async operations
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # Requests being answered, by (session, language, normalized message): identical
+        # requests arriving meanwhile (double taps, client retries) share the reply
+        self.in_flight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self.dedup_stats = {"deduplicated": 0, "leader_failures": 0}
+        
+        # Streaming replies: counters and recent time-to-first-token samples
+        self.stream_stats = {"streams": 0, "completed": 0, "interrupted": 0, "errors": 0}
+        self.ttft_samples: Deque[float] = deque(maxlen=1000)
         
         # Agricultural knowledge base
         self.crop_knowledge = self._load_crop_knowledge()
@@ -132,6 +272,12 @@ class EnhancedChatbotService:
         
         # System prompts for different languages
         self.system_prompts = self._load_system_prompts()
+        self.fallback_responses = self._load_fallback_responses()
+        
+        # Crop, tip, location and intent keywords in one automaton; each message is
+        # scanned once and the result shared by context injection, user context and fallbacks
+        self.keyword_matcher = self._build_keyword_matcher()
+        self._scan_keywords = lru_cache(maxsize=256)(self._match_keywords)
         
     def _load_crop_knowledge(self) -> Dict[str, Any]:
         """Load comprehensive crop knowledge base"""
@@ -243,9 +389,89 @@ You have access to real-time crop data, weather information, market prices, and
 - विशिष्ट उदाहरणे आणि टप्प्याटप्प्याने मार्गदर्शन समाविष्ट करा"""
         }
     
-    def get_or_create_session(self, session_id: str, language: str = "en") -> ConversationSession:
+    def _load_fallback_responses(self) -> Dict[str, Dict[str, Any]]:
+        """Canned replies, and the phrases that select them, for when OpenAI is unavailable"""
+        return {
+            "en": {
+                "greetings": ["hello", "hi", "hey", "good morning", "good evening"],
+                "greeting_response": "🌱 Hello! I'm your AI farming assistant. How can I help you with your agricultural needs today?",
+                "crop_questions": ["crop", "plant", "grow", "recommend"],
+                "crop_response": "🌾 For crop recommendations, I'd need to know your location, soil type, and current season. Could you provide more details?",
+                "soil_questions": ["soil", "npk", "ph", "fertilizer"],
+                "soil_response": "🧪 Soil health is crucial for good crops! Generally, maintain pH 6.0-7.5, ensure balanced NPK, and add organic matter regularly.",
+                "default": "🤖 I'm here to help with farming questions! Ask me about crops, soil, weather, or farming techniques."
+            },
+            "hi": {
+                "greetings": ["नमस्ते", "हैलो", "नमस्कार"],
+                "greeting_response": "🌱 नमस्ते! मैं आपका AI कृषि सहायक हूँ। आज मैं आपकी कृषि संबंधी किस आवश्यकता में मदद कर सकता हूँ?",
+                "crop_questions": ["फसल", "बोना", "उगाना", "सिफारिश"],
+                "crop_response": "🌾 फसल सिफारिश के लिए, मुझे आपका स्थान, मिट्टी का प्रकार और वर्तमान मौसम जानना होगा।",
+                "soil_questions": ["मिट्टी", "खाद", "उर्वरक"],
+                "soil_response": "🧪 अच्छी फसल के लिए मिट्टी का स्वास्थ्य ज़रूरी है! आमतौर पर pH 6.0-7.5 रखें, संतुलित NPK दें और नियमित रूप से जैविक पदार्थ मिलाएँ।",
+                "default": "🤖 मैं कृषि प्रश्नों में मदद के लिए यहाँ हूँ! मुझसे फसलों, मिट्टी, मौसम या कृषि तकनीकों के बारे में पूछें।"
+            },
+            "mr": {
+                "greetings": ["नमस्कार", "नमस्ते", "हॅलो"],
+                "greeting_response": "🌱 नमस्कार! मी तुमचा AI कृषी सहाय्यक आहे. आज मी तुमच्या शेतीविषयक कोणत्या गरजेसाठी मदत करू शकतो?",
+                "crop_questions": ["पीक", "पिके", "लागवड", "पेरणी", "शिफारस"],
+                "crop_response": "🌾 पीक शिफारशीसाठी मला तुमचे ठिकाण, मातीचा प्रकार आणि सध्याचा हंगाम माहित असणे आवश्यक आहे.",
+                "soil_questions": ["माती", "खत"],
+                "soil_response": "🧪 चांगल्या पिकांसाठी मातीचे आरोग्य महत्त्वाचे आहे! साधारणपणे pH 6.0-7.5 ठेवा, संतुलित NPK द्या आणि नियमितपणे सेंद्रिय पदार्थ मिसळा.",
+                "default": "🤖 मी शेतीविषयक प्रश्नांसाठी मदत करण्यास येथे आहे! मला पिके, माती, हवामान किंवा शेती तंत्रांबद्दल विचारा."
+            }
+        }
+    
+    def _build_keyword_matcher(self) -> KeywordMatcher:
+        """Compile every keyword the per-message scans look for"""
+        matcher = KeywordMatcher()
+        for crop in self.crop_knowledge:
+            matcher.add(crop, ("crop", crop))
+            matcher.add(crop.replace("_", " "), ("crop", crop))
+        for alias, crop in {**COMMODITY_ALIASES, **CROP_ALIASES, **LOCAL_CROP_NAMES}.items():
+            if crop in self.crop_knowledge:
+                matcher.add(alias, ("crop", crop))
+        for keyword, tip_word in TIP_KEYWORDS.items():
+            for tip_key in self.farming_tips:
+                if tip_word in tip_key:
+                    matcher.add(keyword, ("tip", tip_key))
+        for keyword in LOCATION_KEYWORDS:
+            matcher.add(keyword, ("location", keyword), whole_word=True)
+        for keyword, farming_type in FARMING_TYPES.items():
+            matcher.add(keyword, ("farming_type", farming_type))
+        for language, responses in self.fallback_responses.items():
+            for phrases, intent in FALLBACK_INTENTS.items():
+                for phrase in responses.get(phrases, []):
+                    # Short greetings like "hi" must not fire inside "which" or "high"
+                    matcher.add(phrase, ("intent", language, intent), whole_word=intent == "greeting")
+        matcher.compile()
+        return matcher
+    
+    def _match_keywords(self, user_message: str) -> MessageKeywords:
+        """One pass of the keyword automaton over a message (memoized as _scan_keywords)"""
+        found = MessageKeywords()
+        # Offsets index the lowercased text; slice the original when lowercasing kept the length
+        text = user_message if len(user_message.lower()) == len(user_message) else user_message.lower()
+        for hit in self.keyword_matcher.find(user_message):
+            kind, value = hit.payload[0], hit.payload[1:]
+            if kind == "intent":
+                found.intents.add(value)
+                continue
+            if kind == "location":
+                following = text[hit.end:].split(maxsplit=1)
+                value = following[0].strip(string.punctuation) if following else ""
+                if not value:
+                    continue
+            else:
+                value = value[0]
+            bucket = {"crop": found.crops, "tip": found.tips, "location": found.locations, "farming_type": found.farming_types}[kind]
+            if value not in bucket:
+                bucket.append(value)
+        return found
+    
+    async def get_or_create_session(self, session_id: str, language: str = "en") -> ConversationSession:
         """Get existing conversation session or create new one"""
-        if session_id not in self.conversations:
+        session = await self.sessions.aget(session_id)
+        if session is None:
             now = datetime.now()
             session = ConversationSession(
                 session_id=session_id,
@@ -255,8 +481,8 @@ You have access to real-time crop data, weather information, market prices, and
                 user_context={},
                 language=language
             )
-            self.conversations[session_id] = session
-        return self.conversations[session_id]
+            self.sessions.put(session)
+        return session
     
     def _build_context_messages(self, session: ConversationSession, user_message: str) -> List[Dict[str, str]]:
         """Build context messages for OpenAI API including system prompt and conversation history"""
@@ -272,39 +498,36 @@ You have access to real-time crop data, weather information, market prices, and
             if context_info:
                 messages.append({"role": "system", "content": f"Additional Context: {context_info}"})
         
-        # Add conversation history
-        if self.enable_memory:
-            recent_messages = session.get_recent_messages(self.max_history - 2)  # Reserve space for system messages
-            for msg in recent_messages:
-                if msg.role in ["user", "assistant"]:
-                    messages.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        return messages
+        # Conversation history within the token budget, then the current user message
+        return self.prompt_builder.build(session, messages, user_message, use_history=self.enable_memory)
+    
+    def _cache_context(self, session: ConversationSession, context_messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Response cache scope of a prompt: a digest of everything in it besides the question,
+        or None when it carries anything of this session (history, its summary, the user's
+        context), as an answer to that must not be served to anyone else
+        """
+        if self.enable_memory and (len(session.messages) > 1 or session.summary):
+            return None
+        if self.enable_context_injection and session.user_context:
+            return None
+        shared = json.dumps(context_messages[:-1], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(shared.encode()).hexdigest()[:16]
     
     def _extract_context_info(self, user_message: str, session: ConversationSession) -> str:
         """Extract and inject relevant context information"""
         context_parts = []
         
-        # Check for crop mentions and add relevant knowledge
-        user_message_lower = user_message.lower()
-        for crop, info in self.crop_knowledge.items():
-            if crop in user_message_lower:
-                context_parts.append(f"{crop.title()}: {info}")
-                break
+        keywords = self._scan_keywords(user_message)
+        
+        # Knowledge for the first crop mentioned
+        if keywords.crops:
+            crop = keywords.crops[0]
+            context_parts.append(f"{crop.title()}: {self.crop_knowledge[crop]}")
         
         # Add farming tips if relevant keywords are found
-        tip_keywords = ["organic", "pest", "soil", "water", "irrigation", "rotation"]
-        for keyword in tip_keywords:
-            if keyword in user_message_lower:
-                for tip_key, tip_value in self.farming_tips.items():
-                    if keyword in tip_key:
-                        context_parts.append(f"{tip_key.replace('_', ' ').title()}: {tip_value}")
+        for tip_key in keywords.tips:
+            context_parts.append(f"{tip_key.replace('_', ' ').title()}: {self.farming_tips[tip_key]}")
         
         # Add user context from previous conversations
         if session.user_context:
@@ -312,105 +535,42 @@ You have access to real-time crop data, weather information, market prices, and
         
         return " | ".join(context_parts[:3])  # Limit context to avoid token overflow
     
-    async def _call_openai_api(self, messages: List[Dict[str, str]]) -> str:
-        """Make API call to OpenAI with retry logic"""
-        max_retries = 3
-        retry_delay = 1
-        
-        for attempt in range(max_retries):
-            try:
-                response = await self.openai_client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    top_p=0.9,
-                    frequency_penalty=0.1,
-                    presence_penalty=0.1
-                )
-                
-                return response.choices[0].message.content.strip()
-                
-            except openai.RateLimitError:
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
-                    continue
-                raise Exception("Rate limit exceeded. Please try again later.")
-                
-            except openai.APIError as e:
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
-                    continue
-                raise Exception(f"OpenAI API error: {str(e)}")
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-                    continue
-                raise Exception(f"Unexpected error: {str(e)}")
-    
     def _get_fallback_response(self, user_message: str, language: str = "en") -> str:
         """Generate fallback response when OpenAI is unavailable"""
-        user_message_lower = user_message.lower()
+        if language not in self.fallback_responses:
+            language = "en"
+        lang_responses = self.fallback_responses[language]
+        intents = self._scan_keywords(user_message).intents
         
-        # Language-specific responses
-        responses = {
-            "en": {
-                "greetings": ["hello", "hi", "hey", "good morning", "good evening"],
-                "greeting_response": "🌱 Hello! I'm your AI farming assistant. How can I help you with your agricultural needs today?",
-                "crop_questions": ["crop", "plant", "grow", "recommend"],
-                "crop_response": "🌾 For crop recommendations, I'd need to know your location, soil type, and current season. Could you provide more details?",
-                "soil_questions": ["soil", "npk", "ph", "fertilizer"],
-                "soil_response": "🧪 Soil health is crucial for good crops! Generally, maintain pH 6.0-7.5, ensure balanced NPK, and add organic matter regularly.",
-                "default": "🤖 I'm here to help with farming questions! Ask me about crops, soil, weather, or farming techniques."
-            },
-            "hi": {
-                "greetings": ["नमस्ते", "हैलो", "नमस्कार"],
-                "greeting_response": "🌱 नमस्ते! मैं आपका AI कृषि सहायक हूँ। आज मैं आपकी कृषि संबंधी किस आवश्यकता में मदद कर सकता हूँ?",
-                "crop_questions": ["फसल", "बोना", "उगाना", "सिफारिश"],
-                "crop_response": "🌾 फसल सिफारिश के लिए, मुझे आपका स्थान, मिट्टी का प्रकार और वर्तमान मौसम जानना होगा।",
-                "default": "🤖 मैं कृषि प्रश्नों में मदद के लिए यहाँ हूँ! मुझसे फसलों, मिट्टी, मौसम या कृषि तकनीकों के बारे में पूछें।"
-            }
-        }
-        
-        lang_responses = responses.get(language, responses["en"])
-        
-        # Check for greeting
-        if any(greeting in user_message_lower for greeting in lang_responses.get("greetings", [])):
-            return lang_responses["greeting_response"]
-        
-        # Check for crop questions
-        if any(word in user_message_lower for word in lang_responses.get("crop_questions", [])):
-            return lang_responses["crop_response"]
-        
-        # Check for soil questions
-        if any(word in user_message_lower for word in lang_responses.get("soil_questions", [])):
-            return lang_responses.get("soil_response", lang_responses["default"])
+        # Greeting first, then crop questions, then soil questions
+        for intent in ("greeting", "crop", "soil"):
+            if (language, intent) in intents:
+                return lang_responses.get(f"{intent}_response", lang_responses["default"])
         
         return lang_responses["default"]
     
-    async def process_message(
-        self, 
-        session_id: str, 
-        user_message: str, 
-        language: str = "en",
-        user_ip: str = "unknown"
-    ) -> Tuple[str, Dict[str, Any]]:
-        """Process user message and return AI response with metadata"""
-        
-        # Rate limiting check
-        if self.enable_rate_limiting and not self.rate_limiter.is_allowed(user_ip):
-            error_msg = {
-                "en": "Too many requests. Please wait a moment before sending another message.",
-                "hi": "बहुत सारे अनुरोध। कृपया दूसरा संदेश भेजने से पहले थोड़ा इंतज़ार करें।",
-                "mr": "खूप विनंत्या. कृपया दुसरा संदेश पाठवण्यापूर्वी थोडा वाट पहा."
-            }
-            return error_msg.get(language, error_msg["en"]), {"error": "rate_limit_exceeded"}
-        
-        # Get or create conversation session
-        session = self.get_or_create_session(session_id, language)
-        
-        # Add user message to session
+    def _rate_limit_message(self, language: str) -> str:
+        error_msg = {
+            "en": "Too many requests. Please wait a moment before sending another message.",
+            "hi": "बहुत सारे अनुरोध। कृपया दूसरा संदेश भेजने से पहले थोड़ा इंतज़ार करें।",
+            "mr": "खूप विनंत्या. कृपया दुसरा संदेश पाठवण्यापूर्वी थोडा वाट पहा."
+        }
+        return error_msg.get(language, error_msg["en"])
+
+    def _error_message(self, language: str) -> str:
+        error_messages = {
+            "en": "I'm having trouble processing your request. Please try again later.",
+            "hi": "मुझे आपका अनुरोध संसाधित करने में परेशानी हो रही है। कृपया बाद में पुनः प्रयास करें।",
+            "mr": "मला तुमची विनंती प्रक्रिया करण्यात अडचण येत आहे. कृपया नंतर पुन्हा प्रयत्न करा."
+        }
+        return error_messages.get(language, error_messages["en"])
+
+    async def _start_turn(self, session_id: str, user_message: str, language: str) -> ConversationSession:
+        """
+        Get or create the session, hold it in the store for this turn and record the
+        user's message; callers release it once the turn is finished or abandoned
+        """
+        session = self.sessions.hold(await self.get_or_create_session(session_id, language))
         user_msg = ConversationMessage(
             id=f"user_{int(time.time() * 1000)}",
             role="user",
@@ -419,35 +579,17 @@ You have access to real-time crop data, weather information, market prices, and
             language=language
         )
         session.add_message(user_msg)
-        
-        # Generate response
-        try:
-            if self.use_openai and self.openai_client:
-                # Build context messages
-                context_messages = self._build_context_messages(session, user_message)
-                
-                # Call OpenAI API
-                ai_response = await self._call_openai_api(context_messages)
-                response_source = "openai"
-            else:
-                # Use fallback response
-                ai_response = self._get_fallback_response(user_message, language)
-                response_source = "fallback"
-        
-        except Exception as e:
-            logger.error(f"Error generating AI response: {str(e)}")
-            if self.enable_fallback:
-                ai_response = self._get_fallback_response(user_message, language)
-                response_source = "fallback_error"
-            else:
-                error_messages = {
-                    "en": "I'm having trouble processing your request. Please try again later.",
-                    "hi": "मुझे आपका अनुरोध संसाधित करने में परेशानी हो रही है। कृपया बाद में पुनः प्रयास करें।",
-                    "mr": "मला तुमची विनंती प्रक्रिया करण्यात अडचण येत आहे. कृपया नंतर पुन्हा प्रयत्न करा."
-                }
-                return error_messages.get(language, error_messages["en"]), {"error": str(e)}
-        
-        # Add AI response to session
+        return session
+
+    def _finish_turn(
+        self,
+        session: ConversationSession,
+        user_message: str,
+        ai_response: str,
+        response_source: str,
+        language: str
+    ) -> Dict[str, Any]:
+        """Record the assistant's reply, update the user context and build the response metadata"""
         ai_msg = ConversationMessage(
             id=f"assistant_{int(time.time() * 1000)}",
             role="assistant",
@@ -460,79 +602,298 @@ You have access to real-time crop data, weather information, market prices, and
         
         # Update user context (extract useful information for future conversations)
         self._update_user_context(session, user_message, ai_response)
+        self.sessions.put(session)
         
-        # Prepare metadata
-        metadata = {
-            "session_id": session_id,
-            "message_count": len(session.messages),
+        return {
+            "session_id": session.session_id,
+            "message_count": session.message_count,
             "source": response_source,
             "language": language,
             "timestamp": datetime.now().isoformat(),
             "has_context": self.enable_context_injection,
             "has_memory": self.enable_memory
         }
+
+    def _in_flight_key(self, session_id: str, user_message: str, language: str) -> Tuple[str, str, str]:
+        return session_id, language, " ".join(unicodedata.normalize("NFKC", user_message).lower().split())
+
+    def _register_in_flight(self, key: Tuple[str, str, str], future: asyncio.Future):
+        self.in_flight[key] = future
+        future.add_done_callback(lambda done: self.in_flight.pop(key) if self.in_flight.get(key) is done else None)
+
+    async def _await_in_flight(self, key: Tuple[str, str, str]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Reply of an identical request already in flight once it completes. None when there
+        is none: the caller then answers itself and must register before awaiting anything.
+        If the request waited on fails, the first waiter to wake finds no entry and takes
+        over as the new leader while the others wait on it, instead of all calling upstream.
+        """
+        while True:
+            pending = self.in_flight.get(key)
+            if pending is None:
+                return None
+            await asyncio.wait({pending})
+            if not pending.cancelled() and pending.exception() is None:
+                break
+            self.dedup_stats["leader_failures"] += 1
+        self.dedup_stats["deduplicated"] += 1
+        reply, metadata = pending.result()
+        return reply, {**metadata, "deduplicated": True}
+
+    async def process_message(
+        self, 
+        session_id: str, 
+        user_message: str, 
+        language: str = "en",
+        user_ip: str = "unknown"
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Process user message and return AI response with metadata"""
+        # Rate limiting check, before duplicates are folded into the request in flight
+        if self.enable_rate_limiting and not (await self.rate_limiter.acquire("chatbot", user_ip)).allowed:
+            return self._rate_limit_message(language), {"error": "rate_limit_exceeded"}
+        key = self._in_flight_key(session_id, user_message, language)
+        shared = await self._await_in_flight(key)
+        if shared:
+            return shared
+        # The reply is produced in its own task, so it is recorded once even if this caller goes away
+        task = asyncio.ensure_future(self._process_message(session_id, user_message, language))
+        self._register_in_flight(key, task)
+        return await asyncio.shield(task)
+
+    async def _process_message(
+        self,
+        session_id: str,
+        user_message: str,
+        language: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        # Get or create conversation session and add the user message
+        session = await self._start_turn(session_id, user_message, language)
+        
+        try:
+            # Generate response
+            try:
+                if self.llm_pool:
+                    # Build context messages
+                    context_messages = self._build_context_messages(session, user_message)
+                    cache_context = self._cache_context(session, context_messages)
+                
+                    cached = self.response_cache.lookup(user_message, language, cache_context)
+                    if cached:
+                        ai_response, response_source = cached[0], "cache"
+                    else:
+                        # Call OpenAI API
+                        ai_response = await self.llm_pool.complete(context_messages, PRIORITY_DEFAULT)
+                        response_source = "openai"
+                        self.response_cache.store(user_message, language, cache_context, ai_response)
+                else:
+                    # Use fallback response
+                    ai_response = self._get_fallback_response(user_message, language)
+                    response_source = "fallback"
+        
+            except LLMOverloaded as e:
+                # Every LLM slot is busy and the queue is full or too slow: answer now instead
+                logger.warning(f"LLM pool overloaded: {str(e)}")
+                if not self.enable_fallback:
+                    return self._error_message(language), {"error": "llm_overloaded"}
+                ai_response = self._get_fallback_response(user_message, language)
+                response_source = "fallback_overloaded"
         
-        return ai_response, metadata
+            except Exception as e:
+                logger.error(f"Error generating AI response: {str(e)}")
+                if self.enable_fallback:
+                    ai_response = self._get_fallback_response(user_message, language)
+                    response_source = "fallback_error"
+                else:
+                    return self._error_message(language), {"error": str(e)}
+        
+            metadata = self._finish_turn(session, user_message, ai_response, response_source, language)
+            return ai_response, metadata
+        finally:
+            self.sessions.release(session_id)
+
+    async def stream_message(
+        self,
+        session_id: str,
+        user_message: str,
+        language: str = "en",
+        user_ip: str = "unknown"
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Process a user message, yielding ("delta", {"text": ...}) events as the reply is
+        generated and a final ("done", {"reply": ..., "metadata": ...}) event once it has
+        been recorded in the session. Fallback replies arrive as a single delta, as do
+        replies shared with an identical request already in flight.
+        """
+        if self.enable_rate_limiting and not (await self.rate_limiter.acquire("chatbot", user_ip)).allowed:
+            yield "error", {"reply": self._rate_limit_message(language), "metadata": {"error": "rate_limit_exceeded"}}
+            return
+        key = self._in_flight_key(session_id, user_message, language)
+        shared = await self._await_in_flight(key)
+        if shared:
+            yield "delta", {"text": shared[0]}
+            yield "done", {"reply": shared[0], "metadata": shared[1]}
+            return
+        reply_future = asyncio.get_running_loop().create_future()
+        self._register_in_flight(key, reply_future)
+        try:
+            async with aclosing(self._stream_message(session_id, user_message, language)) as events:
+                async for event in events:
+                    if event[0] == "done":
+                        reply_future.set_result((event[1]["reply"], event[1]["metadata"]))
+                    yield event
+        finally:
+            # Duplicates waiting on a stream that ended without a reply answer for themselves
+            if not reply_future.done():
+                reply_future.cancel()
+
+    async def _stream_message(
+        self,
+        session_id: str,
+        user_message: str,
+        language: str
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        session = await self._start_turn(session_id, user_message, language)
+        started = time.perf_counter()
+        ttft_ms = None
+        parts: List[str] = []
+        response_source = "fallback"
+        finished = False
+        self.stream_stats["streams"] += 1
+        try:
+            cache_context = None
+            cached = None
+            if self.llm_pool:
+                context_messages = self._build_context_messages(session, user_message)
+                cache_context = self._cache_context(session, context_messages)
+                cached = self.response_cache.lookup(user_message, language, cache_context)
+            if cached:
+                response_source = "cache"
+                parts.append(cached[0])
+                yield "delta", {"text": cached[0]}
+            elif self.llm_pool:
+                try:
+                    response_source = "openai"
+                    # Closed explicitly so the pool slot is freed as soon as the client goes away
+                    async with aclosing(self.llm_pool.stream(context_messages, PRIORITY_STREAM)) as stream:
+                        async for text in stream:
+                            if ttft_ms is None:
+                                ttft_ms = round((time.perf_counter() - started) * 1000, 2)
+                                self.ttft_samples.append(ttft_ms)
+                            parts.append(text)
+                            yield "delta", {"text": text}
+                except Exception as e:
+                    overloaded = isinstance(e, LLMOverloaded)
+                    logger.error(f"Error streaming AI response: {str(e)}")
+                    self.stream_stats["errors"] += 1
+                    if parts:
+                        # The client already has part of the reply; keep what was generated
+                        response_source = "openai_partial"
+                    elif self.enable_fallback:
+                        response_source = "fallback_overloaded" if overloaded else "fallback_error"
+                    else:
+                        yield "error", {"reply": self._error_message(language), "metadata": {"error": str(e)}}
+                        return
+            if not parts:
+                text = self._get_fallback_response(user_message, language)
+                parts.append(text)
+                yield "delta", {"text": text}
+            
+            ai_response = "".join(parts).strip()
+            if response_source == "openai":
+                self.response_cache.store(user_message, language, cache_context, ai_response)
+            metadata = self._finish_turn(session, user_message, ai_response, response_source, language)
+            finished = True
+            total_ms = round((time.perf_counter() - started) * 1000, 2)
+            metadata.update({"ttft_ms": ttft_ms, "total_ms": total_ms, "streamed": True})
+            self.stream_stats["completed"] += 1
+            yield "done", {"reply": ai_response, "metadata": metadata}
+        finally:
+            if not finished and parts:
+                # Client went away mid-stream: record what was generated so far
+                self.stream_stats["interrupted"] += 1
+                self._finish_turn(session, user_message, "".join(parts).strip(), "openai_interrupted", language)
+            self.sessions.release(session_id)
+
+    def get_stream_stats(self) -> Dict[str, Any]:
+        samples = sorted(self.ttft_samples)
+        
+        def percentile(q: float) -> Optional[float]:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+        
+        return {
+            **self.stream_stats,
+            "ttft_ms": {
+                "samples": len(samples),
+                "avg": round(sum(samples) / len(samples), 2) if samples else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+            }
+        }
     
     def _update_user_context(self, session: ConversationSession, user_message: str, ai_response: str):
         """Update user context based on conversation"""
-        user_message_lower = user_message.lower()
-        
-        # Extract location mentions
-        location_keywords = ["farm", "field", "location", "area", "region", "state", "country"]
-        if any(keyword in user_message_lower for keyword in location_keywords):
-            # Simple extraction - in production, use NLP
-            words = user_message.split()
-            for i, word in enumerate(words):
-                if word.lower() in location_keywords and i + 1 < len(words):
-                    session.user_context["location"] = words[i + 1]
-                    break
+        keywords = self._scan_keywords(user_message)
+        
+        # Extract location mentions (the word after "farm", "field", ...) - in production, use NLP
+        if keywords.locations:
+            session.user_context["location"] = keywords.locations[0]
         
         # Extract crop interests
-        mentioned_crops = []
-        for crop in self.crop_knowledge.keys():
-            if crop in user_message_lower:
-                mentioned_crops.append(crop)
-        if mentioned_crops:
+        if keywords.crops:
             session.user_context["interested_crops"] = list(set(
-                session.user_context.get("interested_crops", []) + mentioned_crops
+                session.user_context.get("interested_crops", []) + keywords.crops
             ))
         
         # Extract farming type preferences
-        farming_types = ["organic", "conventional", "sustainable", "hydroponic"]
-        for farming_type in farming_types:
-            if farming_type in user_message_lower:
-                session.user_context["farming_preference"] = farming_type
-                break
+        if keywords.farming_types:
+            session.user_context["farming_preference"] = keywords.farming_types[0]
     
-    def get_conversation_history(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get conversation history for a session"""
-        session = self.conversations.get(session_id)
-        return session.to_dict() if session else None
+    async def get_conversation_history(self, session_id: str, include_archived: bool = False) -> Optional[Dict[str, Any]]:
+        """Get conversation history for a session; archived messages are only decoded on request"""
+        session = await self.sessions.aget(session_id)
+        return session.to_dict(include_archived) if session else None
     
-    def clear_conversation(self, session_id: str) -> bool:
+    async def clear_conversation(self, session_id: str) -> bool:
         """Clear conversation history for a session"""
-        if session_id in self.conversations:
-            del self.conversations[session_id]
-            return True
-        return False
+        return await self.sessions.adelete(session_id)
     
     def get_conversation_stats(self) -> Dict[str, Any]:
         """Get statistics about active conversations"""
         now = datetime.now()
         active_sessions = 0
         total_messages = 0
+        buffered = archived = dropped = archive_bytes = 0
         
-        for session in self.conversations.values():
+        # Counts cover the sessions cached in this worker; the store reports the total
+        for session in self.sessions.sessions():
             if now - session.last_activity < timedelta(hours=24):
                 active_sessions += 1
-            total_messages += len(session.messages)
+            total_messages += session.message_count
+            buffered += len(session.messages)
+            archived += session.archived_count + len(session.spilled)
+            dropped += session.dropped_count
+            archive_bytes += sum(map(len, session.archive))
         
         return {
-            "total_sessions": len(self.conversations),
+            "total_sessions": len(self.sessions),
             "active_sessions_24h": active_sessions,
             "total_messages": total_messages,
+            "message_buffer": {
+                "capacity": SESSION_MESSAGE_CAPACITY,
+                "overflow_policy": SESSION_OVERFLOW_POLICY,
+                "buffered": buffered,
+                "archived": archived,
+                "dropped": dropped,
+                "archive_bytes": archive_bytes,
+            },
+            "session_store": self.sessions.get_stats(),
+            "streaming": self.get_stream_stats(),
+            "dedup": {"in_flight": len(self.in_flight), **self.dedup_stats},
+            "response_cache": self.response_cache.get_stats(),
+            "prompt": self.prompt_builder.get_stats(),
+            "keyword_matcher": {**self.keyword_matcher.get_stats(), **self._scan_keywords.cache_info()._asdict()},
             "openai_enabled": self.use_openai,
+            "llm_pool": self.llm_pool.get_stats() if self.llm_pool else None,
             "features": {
                 "memory": self.enable_memory,
                 "context_injection": self.enable_context_injection,
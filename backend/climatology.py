@@ -0,0 +1,211 @@
+"""
+Climatology Store
+Monthly climate normals (temperature, humidity, rainfall) per grid cell, kept in a
+memory-mapped array so any coordinate and month resolves to model-ready climate
+features without network access. The normals are built from the regional profiles
+in the soil table (temperature, humidity and rainfall ranges of the nearest region)
+and serve as the fallback when live weather is unavailable or too slow
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from soil_store import SoilTable, get_soil_store
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIMATOLOGY_PATH = os.getenv("CLIMATOLOGY_PATH") or os.path.join(BASE_DIR, "data", "climatology.npy")
+CLIMATOLOGY_GRID_DEG = float(os.getenv("CLIMATOLOGY_GRID_DEG", "0.5"))
+# Cells take the nearest region's profile within half this distance, blending into the
+# latitude model up to the full distance
+CLIMATOLOGY_REGION_RADIUS_KM = float(os.getenv("CLIMATOLOGY_REGION_RADIUS_KM", "800"))
+
+# Last axis of the array, in order
+CLIMATE_VARIABLES = ["temperature", "humidity", "rainfall"]
+# Soil table columns holding a region's climate profile, in the order _profile_normals reads them
+PROFILE_COLUMNS = ["temp_min", "temp_max", "humidity_min", "humidity_max", "rainfall_min", "rainfall_max"]
+
+ArrayLike = Union[float, np.ndarray]
+
+
+def _synthetic_normals(lat: np.ndarray, month: np.ndarray) -> np.ndarray:
+    """
+    Approximate monthly normals from latitude and season alone, for cells far from
+    every region in the soil table.
+
+    Temperature follows a latitude-dependent annual mean with a hemispheric seasonal
+    cycle, rainfall follows a migrating tropical rain belt (monsoon peak in Jun-Sep in
+    the north), and humidity tracks rainfall.
+    """
+    season = np.cos(2 * np.pi * (month - 7) / 12.0)
+    hemisphere = np.sign(lat)
+    abs_lat = np.abs(lat)
+
+    temperature = 28.0 - 0.0055 * abs_lat ** 2 + 0.15 * abs_lat * season * hemisphere
+    rain_belt = 10.0 * season
+    rainfall = 25.0 + 230.0 * np.exp(-(((lat - rain_belt) / 11.0) ** 2))
+    humidity = np.clip(40.0 + 0.18 * rainfall + 0.1 * (30.0 - abs_lat), 25.0, 95.0)
+    return np.stack([temperature, humidity, rainfall], axis=-1)
+
+
+def _profile_normals(profile: np.ndarray, lat: ArrayLike, month: np.ndarray) -> np.ndarray:
+    """
+    Monthly normals from regional ranges (`profile[..., k]` in PROFILE_COLUMNS order).
+
+    Temperature swings through the region's range (less the 2 degree margin the
+    regional estimates use), warmest in June, or December south of the equator.
+    Humidity and rainfall rise from their minimum to their maximum with the monsoon,
+    which peaks in July-August, or January-February in the south.
+    """
+    south = np.asarray(lat) < 0
+    season = np.cos(2 * np.pi * (month - np.where(south, 12, 6)) / 12.0)
+    from_peak = np.abs((month - np.where(south, 1.5, 7.5) + 6) % 12 - 6)
+    wet = np.exp(-((from_peak / 1.8) ** 2))
+    t_min, t_max, h_min, h_max, r_min, r_max = np.moveaxis(profile, -1, 0)
+    temperature = (t_min + t_max) / 2 + np.maximum((t_max - t_min) / 2 - 2, 0) * season
+    humidity = h_min + (h_max - h_min) * wet
+    rainfall = r_min + (r_max - r_min) * wet
+    return np.stack([temperature, humidity, rainfall], axis=-1)
+
+
+def _write_atomic(path: str, write) -> None:
+    """Write through a temporary file in the same directory and rename it into place"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_climatology(
+    path: str = CLIMATOLOGY_PATH,
+    grid_deg: float = CLIMATOLOGY_GRID_DEG,
+    table: Optional[SoilTable] = None,
+    radius_km: float = CLIMATOLOGY_REGION_RADIUS_KM,
+) -> None:
+    """
+    Write a gridded (lat, lon, month, variable) float16 array plus its JSON metadata.
+
+    Each cell takes the profile of the nearest region in `table` (the soil store's by
+    default), fading into the latitude model from half of `radius_km` out to all of
+    it, and beyond it or when the region has no profile. Both files are renamed into
+    place, the metadata last, so a reader that finds the metadata always finds a
+    complete array.
+    """
+    table = table or get_soil_store().table
+    lats = np.arange(-90.0 + grid_deg / 2, 90.0, grid_deg)
+    lons = np.arange(-180.0 + grid_deg / 2, 180.0, grid_deg)
+    months = np.arange(1, 13)
+    profiles = np.stack([table.columns[c] for c in PROFILE_COLUMNS], axis=-1).astype(np.float64)
+    has_profile = np.isfinite(profiles).all(axis=1)
+
+    normals = np.empty((len(lats), len(lons), 12, len(CLIMATE_VARIABLES)), dtype=np.float16)
+    for i, lat in enumerate(lats):
+        cells = np.broadcast_to(_synthetic_normals(np.full(12, lat), months), normals.shape[1:])
+        if len(table.located):
+            rows, km = table.nearest(np.full(len(lons), lat), lons)
+            weight = np.clip((radius_km - km) / (radius_km / 2), 0.0, 1.0) * has_profile[rows]
+            regional = _profile_normals(np.nan_to_num(profiles[rows])[:, None, :], lat, months[None, :])
+            cells = weight[:, None, None] * regional + (1 - weight[:, None, None]) * cells
+        normals[i] = cells
+    meta = {
+        "lat0": float(lats[0]),
+        "lon0": float(lons[0]),
+        "grid_deg": grid_deg,
+        "variables": CLIMATE_VARIABLES,
+        "source": "regional soil table profiles",
+        "profile_mtime": table.mtime,
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, lambda f: np.save(f, normals))
+    _write_atomic(path + ".json", lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+
+class ClimatologyStore:
+    """
+    Read-only view over the memory-mapped normals with vectorized nearest-cell lookup.
+    The array is either gridded (lat, lon, month, variable) or zonal (lat, month,
+    variable), in which case longitude is ignored
+    """
+
+    def __init__(self, path: str = CLIMATOLOGY_PATH, table: Optional[SoilTable] = None):
+        started = time.perf_counter()
+        if not os.path.exists(path) or not os.path.exists(path + ".json"):
+            logger.info(f"No climatology at {path}, building it from the regional profiles")
+            build_climatology(path, table=table)
+        with open(path + ".json", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        built_from = self.meta.get("profile_mtime")
+        table = table or get_soil_store().table
+        if built_from is not None and built_from != table.mtime:
+            # Built from an older soil table; files from other sources are left alone
+            logger.info(f"Regional profiles changed since {path} was built, rebuilding it")
+            build_climatology(path, table=table)
+            with open(path + ".json", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        self.path = path
+        self.normals = np.load(path, mmap_mode="r")
+        self.lat0 = self.meta["lat0"]
+        self.lon0 = self.meta.get("lon0")
+        self.zonal = self.normals.ndim == 3
+        self.grid_deg = self.meta["grid_deg"]
+        self.load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Climatology mapped: shape {self.normals.shape} in {self.load_ms:.1f} ms")
+
+    def lookup(self, lat: ArrayLike, lon: ArrayLike, month: ArrayLike) -> Dict[str, np.ndarray]:
+        """
+        Climate normals for arrays of coordinates and months (1-12), broadcast together.
+
+        Returns {"temperature", "humidity", "rainfall"} as float32 arrays.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        month = np.asarray(month, dtype=np.int64)
+        n_lat = self.normals.shape[0]
+        i = np.clip(np.rint((lat - self.lat0) / self.grid_deg), 0, n_lat - 1).astype(np.int64)
+        m = np.clip(month, 1, 12) - 1
+        if self.zonal:
+            i, m = np.broadcast_arrays(i, m, lon)[:2]
+            values = np.asarray(self.normals[i, m], dtype=np.float32)
+        else:
+            j = np.mod(np.rint((lon - self.lon0) / self.grid_deg), self.normals.shape[1]).astype(np.int64)
+            values = np.asarray(self.normals[i, j, m], dtype=np.float32)
+        return {name: values[..., k] for k, name in enumerate(self.meta["variables"])}
+
+    def features(self, lat: float, lon: float, month: Optional[int] = None) -> Dict[str, float]:
+        """Model-ready climate features for a single coordinate (default: current month)"""
+        values = self.lookup(lat, lon, month or time.localtime().tm_mon)
+        return {name: round(float(v), 2) for name, v in values.items()}
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "path": self.path,
+            "shape": list(self.normals.shape),
+            "zonal": self.zonal,
+            "grid_deg": self.grid_deg,
+            "bytes": int(self.normals.nbytes),
+            "load_ms": round(self.load_ms, 2),
+            "source": self.meta.get("source"),
+        }
+
+
+# Global instance
+climatology_store = None
+
+def get_climatology_store() -> ClimatologyStore:
+    """Get the global climatology store instance"""
+    global climatology_store
+    if climatology_store is None:
+        climatology_store = ClimatologyStore()
+    return climatology_store
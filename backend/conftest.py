@@ -0,0 +1,337 @@
+"""
+Shared pytest fixtures: local stand-ins for every upstream the backend talks to
+(Open-Meteo, Nominatim, mandi sources, an OpenAI-compatible chat API and a Redis
+server) and a TestClient for the app wired to them. Settings are read at import time,
+so the environment is pointed at the stand-ins before any backend module is imported
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+# Manual scripts that call the real OpenAI API with the key from .env
+collect_ignore = ["test_openai.py", "test_async_openai.py"]
+
+MANDI_COMMODITIES = ["Paddy(Dhan)(Common)", "Wheat", "Onion", "Tomato", "Soyabean", "Ground Nut Seed"]
+MANDI_STATES = ["Maharashtra", "Punjab", "Karnataka", "Gujarat"]
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """Open-Meteo forecasts, Nominatim search/reverse and data.gov.in style mandi records"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        server.calls.append(self.path)
+        time.sleep(server.delays.pop(0) if server.delays else server.delay)
+        if server.fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if url.path.endswith("/search"):
+            found = {"lat": "18.52", "lon": "73.85", "display_name": "Pune, Maharashtra, India"}
+            return self._send([] if "nowhere" in query["q"][0] else [found])
+        if url.path.endswith("/reverse"):
+            return self._send({
+                "lat": query["lat"][0], "lon": query["lon"][0], "display_name": "Maharashtra, India",
+                "address": {"state": "Maharashtra", "country": "India"},
+            })
+        if url.path.startswith("/mandi"):
+            records = server.mandi.get(url.path, [])
+            if records is None:
+                # A source set to None is down
+                self.send_response(503)
+                self.end_headers()
+                return
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["1000"])[0])
+            return self._send({"records": records[offset:offset + limit]})
+
+        days = int(query.get("forecast_days", ["3"])[0])
+
+        def forecast(lat: str, lon: str) -> dict:
+            daily = {
+                "time": [f"2026-10-{19 + i:02d}" for i in range(days)],
+                "temperature_2m_max": [30.0] * days,
+                "temperature_2m_min": [20.0] * days,
+                "precipitation_sum": [1.0] * days,
+                "weather_code": [1] * days,
+            }
+            return {"latitude": float(lat), "longitude": float(lon), "daily": daily}
+
+        lats, lons = query["latitude"][0].split(","), query["longitude"][0].split(",")
+        self._send(forecast(lats[0], lons[0]) if len(lats) == 1 else [forecast(a, b) for a, b in zip(lats, lons)])
+
+    def _send(self, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def mandi_records(count: int, price_offset: int = 0) -> list:
+    return [
+        {
+            "state": MANDI_STATES[i % len(MANDI_STATES)],
+            "district": f"District {i % 7}",
+            "market": f"Market {i % 13}",
+            "commodity": MANDI_COMMODITIES[i % len(MANDI_COMMODITIES)],
+            "variety": "Other",
+            "arrival_date": "18/10/2026",
+            "min_price": str(1000 + price_offset + i),
+            "max_price": str(2000 + price_offset + i),
+            "modal_price": str(1500 + price_offset + i),
+        }
+        for i in range(count)
+    ]
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), UpstreamHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.reset()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.calls = []
+        self.delay = 0.0
+        # Per-request delays for the next requests, in arrival order, before `delay` applies
+        self.delays = []
+        self.fail = False
+        self.mandi = {"/mandi/a": mandi_records(1500), "/mandi/b": mandi_records(300, price_offset=50)}
+
+    def handle_error(self, request, client_address):
+        # Clients cancelling mid-response (hedges, timeouts) are expected here
+        pass
+
+
+class OpenAIStandin:
+    """/v1/chat/completions in both modes, recording call counts, concurrency and prompts"""
+
+    def __init__(self):
+        self.app = Starlette(routes=[Route("/v1/chat/completions", self.completions, methods=["POST"])])
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(self.app, log_level="error"))
+        threading.Thread(target=self.server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.prompts = []
+        self.first_delay = 0.05
+        self.chunk_delay = 0.01
+        self.words = 8
+        # Number of upcoming calls answered with HTTP `fail_status`
+        self.fail = 0
+        self.fail_status = 500
+
+    async def completions(self, request):
+        body = await request.json()
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.prompts.append(body["messages"])
+        words = [f"Answer to: {body['messages'][-1]['content']}"] + [f"w{i}" for i in range(self.words)]
+        if self.fail:
+            self.fail -= 1
+            self.active -= 1
+            kind = "server_error" if self.fail_status >= 500 else "invalid_request_error"
+            return JSONResponse({"error": {"message": "stand-in failure", "type": kind}}, status_code=self.fail_status)
+        if not body.get("stream"):
+            try:
+                await asyncio.sleep(self.first_delay + self.chunk_delay * len(words))
+            finally:
+                self.active -= 1
+            message = {"role": "assistant", "content": " ".join(words)}
+            return JSONResponse({
+                "id": "standin", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": len(words), "total_tokens": 1 + len(words)},
+            })
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            choice = {"index": 0, "delta": delta, "finish_reason": finish_reason}
+            payload = {"id": "standin", "object": "chat.completion.chunk", "created": 0, "model": body["model"], "choices": [choice]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            try:
+                await asyncio.sleep(self.first_delay)
+                for i, word in enumerate(words):
+                    yield chunk({"content": word if not i else " " + word})
+                    await asyncio.sleep(self.chunk_delay)
+                yield chunk({}, "stop")
+                yield "data: [DONE]\n\n"
+            finally:
+                self.active -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """The Redis commands the backend uses, over RESP2"""
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                size = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(size + 2)[:-2])
+            with self.server.lock:
+                self.server.commands.append(args[0].upper().decode())
+                reply = self.server.execute(args)
+            self.wfile.write(self.encode(reply))
+
+    def encode(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, Exception):
+            return b"-ERR %s\r\n" % str(value).encode()
+        if isinstance(value, str):
+            return b"+%s\r\n" % value.encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.url = f"redis://127.0.0.1:{self.server_address[1]}/0"
+        self.lock = threading.Lock()
+        self.reset()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+
+    def _alive(self, key) -> bool:
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def execute(self, args):
+        command, key = args[0].upper().decode(), args[1] if len(args) > 1 else None
+        if command == "GET":
+            return self.data[key] if self._alive(key) else None
+        if command == "SET":
+            self.data[key] = args[2]
+            self.expires.pop(key, None)
+            if len(args) == 5 and args[3].upper() == b"EX":
+                self.expires[key] = time.time() + int(args[4])
+            return "OK"
+        if command == "DEL":
+            deleted = [k for k in args[1:] if self._alive(k)]
+            for k in deleted:
+                self.data.pop(k)
+                self.expires.pop(k, None)
+            return len(deleted)
+        if command in ("INCR", "DECR"):
+            value = (int(self.data[key]) if self._alive(key) else 0) + (1 if command == "INCR" else -1)
+            self.data[key] = str(value).encode()
+            return value
+        if command == "PEXPIRE":
+            if not self._alive(key):
+                return 0
+            self.expires[key] = time.time() + int(args[2]) / 1000
+            return 1
+        return Exception(f"unknown command '{command}'")
+
+
+_upstream = UpstreamServer()
+_workdir = tempfile.mkdtemp(prefix="backend-tests-")
+
+# Explicit values win over backend/.env, which the app loads without overriding
+os.environ.update({
+    "USE_OPENAI": "0",
+    "OPEN_METEO_URL": _upstream.url + "/v1/forecast",
+    "NOMINATIM_URL": _upstream.url,
+    "MANDI_SOURCES": f"a={_upstream.url}/mandi/a,b={_upstream.url}/mandi/b",
+    "MANDI_SNAPSHOT_PATH": os.path.join(_workdir, "mandi_snapshot.json"),
+    "MARKET_TS_DIR": os.path.join(_workdir, "market_ts"),
+    "CLIMATOLOGY_PATH": os.path.join(_workdir, "climatology.npy"),
+    "SESSION_STORE": "memory",
+    "SESSION_STORE_PATH": os.path.join(_workdir, "sessions.db"),
+    "RATE_LIMIT_STORE": "memory",
+})
+
+
+@pytest.fixture
+def upstream() -> UpstreamServer:
+    _upstream.reset()
+    yield _upstream
+    _upstream.reset()
+
+
+@pytest.fixture(scope="session")
+def _openai_server() -> OpenAIStandin:
+    server = OpenAIStandin()
+    yield server
+    server.server.should_exit = True
+
+
+@pytest.fixture
+def openai_standin(_openai_server) -> OpenAIStandin:
+    _openai_server.reset()
+    return _openai_server
+
+
+@pytest.fixture(scope="session")
+def _resp_server() -> RespServer:
+    server = RespServer()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def resp_standin(_resp_server) -> RespServer:
+    _resp_server.reset()
+    return _resp_server
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient with the app's startup and shutdown hooks run once per test session"""
+    from fastapi.testclient import TestClient
+    import app as backend_app
+
+    with TestClient(backend_app.app) as test_client:
+        yield test_client
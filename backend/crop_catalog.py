@@ -0,0 +1,136 @@
+"""
+Crop Catalog
+One table for every crop the backend knows about: the model's class labels, the
+market database and the knowledge base are reconciled under dense integer ids (the
+model classes first, in label-encoder order), with per-id NumPy columns for the
+baseline yield, farm-gate price, market price and category and a precomputed alias
+index, so scoring and market code index arrays by id instead of looking up names
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mandi_service import COMMODITY_ALIASES
+
+# Yield (kg/ha) and price (per kg) used for crops without a baseline entry
+DEFAULT_BASELINE = (2000.0, 20.0)
+UNCATEGORIZED = "other"
+
+# Spellings that differ between the training dataset and the market database and do
+# not reduce to the same key by normalization alone (kidneybeans/kidney_beans do)
+CROP_ALIASES = {
+    "mungbean": "green_gram",
+    "mung bean": "green_gram",
+    "pigeonpeas": "pigeon_pea",
+    "pigeon peas": "pigeon_pea",
+    "mothbeans": "moth_beans",
+    "moth bean": "moth_beans",
+    "matki": "moth_beans",
+    "musk melon": "muskmelon",
+    "kharbuja": "muskmelon",
+    "corn": "maize",
+    "chana": "chickpea",
+    "peanut": "groundnut",
+    "eggplant": "brinjal",
+    "pomegranates": "pomegranate",
+}
+
+
+def normalize_name(name: str) -> str:
+    """Case, spacing and punctuation-insensitive key: 'Kidney Beans' -> 'kidneybeans'"""
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+class CropCatalog:
+    """Immutable crop table; ids are row numbers into every column array"""
+
+    def __init__(
+        self,
+        model_classes: Sequence[str],
+        baseline: Mapping[str, Tuple[float, float]],
+        market: Mapping[str, dict],
+        knowledge: Optional[Mapping[str, dict]] = None,
+    ):
+        self.names: List[str] = [str(c) for c in model_classes]
+        self.n_model = len(self.names)
+        # Every spelling maps to a canonical key (the market database spelling where an
+        # alias exists); names sharing a canonical key are the same crop
+        aliases = {normalize_name(a): normalize_name(t) for a, t in {**COMMODITY_ALIASES, **CROP_ALIASES}.items()}
+        canonical_id: Dict[str, int] = {}
+        for i, name in enumerate(self.names):
+            norm = normalize_name(name)
+            canonical_id.setdefault(aliases.get(norm, norm), i)
+
+        def link(key: str) -> int:
+            norm = normalize_name(key)
+            canonical = aliases.get(norm, norm)
+            if canonical not in canonical_id:
+                canonical_id[canonical] = len(self.names)
+                self.names.append(key)
+            return canonical_id[canonical]
+
+        market_ids = [link(key) for key in market]
+        knowledge = knowledge or {}
+        knowledge_ids = [link(key) for key in knowledge]
+        baseline_ids = [link(key) for key in baseline]
+
+        # Precomputed alias index: every known spelling, normalized, to its id
+        self.id_of: Dict[str, int] = dict(canonical_id)
+        for alias, canonical in aliases.items():
+            if canonical in canonical_id:
+                self.id_of[alias] = canonical_id[canonical]
+        for i, name in enumerate(self.names):
+            self.id_of[normalize_name(name)] = i
+
+        n = len(self.names)
+        self.baseline_yield = np.full(n, DEFAULT_BASELINE[0])
+        self.price = np.full(n, DEFAULT_BASELINE[1])
+        self.has_baseline = np.zeros(n, dtype=bool)
+        for crop_id, (yield_kg, price) in zip(baseline_ids, baseline.values()):
+            self.baseline_yield[crop_id] = yield_kg
+            self.price[crop_id] = price
+            self.has_baseline[crop_id] = True
+
+        self.market_ids = np.asarray(market_ids, dtype=np.int32)
+        self.market_keys: List[Optional[str]] = [None] * n
+        self.market_price = np.full(n, np.nan)
+        category_names = [UNCATEGORIZED] * n
+        for crop_id, (key, info) in zip(market_ids, market.items()):
+            self.market_keys[crop_id] = key
+            self.market_price[crop_id] = info["base_price"]
+            category_names[crop_id] = info.get("category", UNCATEGORIZED)
+        self.categories, codes = np.unique(category_names, return_inverse=True)
+        self.categories = self.categories.tolist()
+        self.category = codes.astype(np.int16)
+
+        self.knowledge: List[Optional[dict]] = [None] * n
+        for crop_id, info in zip(knowledge_ids, knowledge.values()):
+            self.knowledge[crop_id] = info
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def resolve(self, name: str) -> Optional[int]:
+        """Id for a crop name in any known spelling, or None"""
+        return self.id_of.get(normalize_name(name))
+
+    def ids(self, names: Iterable[str]) -> np.ndarray:
+        """Ids for many names at once; unknown names map to -1"""
+        return np.fromiter((self.id_of.get(normalize_name(n), -1) for n in names), dtype=np.int32)
+
+    def category_of(self, crop_id: int) -> str:
+        return self.categories[self.category[crop_id]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        model = slice(0, self.n_model)
+        return {
+            "crops": len(self.names),
+            "model_classes": self.n_model,
+            "market_crops": len(self.market_ids),
+            "aliases": len(self.id_of),
+            "categories": len(self.categories),
+            "model_classes_without_baseline": [n for n, ok in zip(self.names[model], self.has_baseline[model]) if not ok],
+            "model_classes_without_market": [n for n, key in zip(self.names[model], self.market_keys[model]) if key is None],
+        }
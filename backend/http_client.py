@@ -0,0 +1,319 @@
+"""
+Upstream HTTP Client
+Shared async HTTP client for outbound integrations with keep-alive connection pooling,
+per-host concurrency limits, timeouts, retries with jittered backoff, per-upstream
+circuit breakers, hedged GET requests and latency histograms
+"""
+
+import os
+import time
+import bisect
+import random
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.25"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_MAX_CONCURRENCY_PER_HOST = int(os.getenv("HTTP_MAX_CONCURRENCY_PER_HOST", "10"))
+HTTP_USER_AGENT = os.getenv("HTTP_USER_AGENT", "crop_recommendation_app")
+
+# Circuit breaker: open after N consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Hedging: send a second GET once the first has run longer than the upstream's p95
+HTTP_HEDGE_ENABLED = os.getenv("HTTP_HEDGE_ENABLED", "1") == "1"
+HTTP_HEDGE_MIN_SAMPLES = int(os.getenv("HTTP_HEDGE_MIN_SAMPLES", "20"))
+HTTP_HEDGE_MIN_DELAY_MS = float(os.getenv("HTTP_HEDGE_MIN_DELAY_MS", "50"))
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after all retries"""
+
+    def __init__(self, upstream: str, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.upstream = upstream
+        self.status_code = status_code
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the upstream while its circuit breaker is open"""
+
+    def __init__(self, upstream: str):
+        super().__init__(upstream, f"Circuit open for {upstream}, failing fast")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = "open"
+            self.trips += 1
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """A call ended without an outcome (cancelled): free the half-open probe slot for the next caller"""
+        self._probe_in_flight = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with error, retry and hedge counters for one upstream"""
+
+    def __init__(self, recent_window: int = 256):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.recent = deque(maxlen=recent_window)
+
+    def observe(self, latency_ms: float):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.recent.append(latency_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{b}" for b in LATENCY_BUCKETS_MS] + ["inf"]
+        return {
+            "requests": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p95_ms": round(self.percentile(0.95), 2) if self.recent else None,
+            "histogram_ms": dict(zip(labels, self.buckets)),
+        }
+
+
+class UpstreamHTTPClient:
+    """Pooled async client shared by all outbound integrations"""
+
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        max_retries: int = HTTP_MAX_RETRIES,
+        retry_backoff: float = HTTP_RETRY_BACKOFF,
+        max_concurrency_per_host: int = HTTP_MAX_CONCURRENCY_PER_HOST,
+        hedge_enabled: bool = HTTP_HEDGE_ENABLED,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.hedge_enabled = hedge_enabled
+        self.histograms: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.breakers: Dict[str, CircuitBreaker] = defaultdict(CircuitBreaker)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+                headers={"User-Agent": HTTP_USER_AGENT},
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_concurrency_per_host)
+        return self._host_limits[host]
+
+    def _hedge_delay(self, upstream: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little latency data"""
+        histogram = self.histograms[upstream]
+        if not self.hedge_enabled or len(histogram.recent) < HTTP_HEDGE_MIN_SAMPLES:
+            return None
+        return max(histogram.percentile(0.95), HTTP_HEDGE_MIN_DELAY_MS) / 1000
+
+    async def _attempt(self, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        cancelled = False
+        try:
+            async with self._host_limit(url):
+                return await self._get_client().request(method, url, **kwargs)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # A cancelled attempt (usually the losing side of a hedge) only ran as long as
+            # its rival; counting it would drag down the p95 that sets the hedge delay
+            if not cancelled:
+                self.histograms[upstream].observe((time.perf_counter() - started) * 1000)
+
+    async def _send(self, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """One logical attempt; idempotent GETs are hedged after the upstream's p95 latency"""
+        delay = self._hedge_delay(upstream) if method == "GET" else None
+        if delay is None:
+            return await self._attempt(upstream, method, url, **kwargs)
+
+        primary = asyncio.ensure_future(self._attempt(upstream, method, url, **kwargs))
+        pending = {primary}
+        fallback: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            histogram = self.histograms[upstream]
+            histogram.hedges += 1
+            hedge = asyncio.ensure_future(self._attempt(upstream, method, url, **kwargs))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif task.result().status_code < 500:
+                        if task is hedge:
+                            histogram.hedge_wins += 1
+                        return task.result()
+                    else:
+                        fallback = task.result()
+        finally:
+            # Also reached when the caller is cancelled, before or after the hedge started
+            for task in pending:
+                task.cancel()
+        if fallback is not None:
+            return fallback
+        raise error
+
+    async def request(self, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a request, retrying transport errors and 429/5xx responses with
+        exponential backoff and full jitter. Fails fast with CircuitOpenError while the
+        upstream's breaker is open; raises UpstreamError once retries are exhausted or
+        on a non-retryable error status.
+        """
+        histogram = self.histograms[upstream]
+        breaker = self.breakers[upstream]
+        error: Optional[UpstreamError] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                histogram.retries += 1
+                await asyncio.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+            if not breaker.allow():
+                if error is None:
+                    raise CircuitOpenError(upstream)
+                break
+            try:
+                response = await self._send(upstream, method, url, **kwargs)
+            except httpx.HTTPError as e:
+                breaker.record_failure()
+                error = UpstreamError(upstream, f"{type(e).__name__}: {e}")
+                continue
+            except BaseException:
+                # Cancelled mid-call: no verdict on the upstream, but a half-open probe
+                # must not hold the breaker's only slot forever
+                breaker.release_probe()
+                raise
+            if response.status_code < 400:
+                breaker.record_success()
+                return response
+            error = UpstreamError(upstream, f"HTTP {response.status_code} from {upstream}", response.status_code)
+            if response.status_code not in RETRY_STATUS_CODES:
+                # The upstream answered; a client error says nothing about its health
+                breaker.record_success()
+                break
+            breaker.record_failure()
+        histogram.errors += 1
+        raise error
+
+    async def get_json(self, upstream: str, url: str, **kwargs) -> Any:
+        response = await self.request(upstream, "GET", url, **kwargs)
+        try:
+            return response.json()
+        except ValueError as e:
+            self.histograms[upstream].errors += 1
+            raise UpstreamError(upstream, f"Invalid JSON from {upstream}: {e}", response.status_code)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            name: {**histogram.to_dict(), "breaker": self.breakers[name].to_dict()}
+            for name, histogram in self.histograms.items()
+        }
+
+
+# Global instance
+http_client = None
+
+def get_http_client() -> UpstreamHTTPClient:
+    """Get the global upstream HTTP client instance"""
+    global http_client
+    if http_client is None:
+        http_client = UpstreamHTTPClient()
+    return http_client
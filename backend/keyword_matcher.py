@@ -0,0 +1,104 @@
+"""
+Keyword Matcher
+Aho-Corasick automaton over many keywords at once: built once, then a single pass
+over a message reports every keyword occurrence, so matching cost depends on the
+message length and the number of hits, not on how many keywords are registered
+"""
+
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Hashable, List, NamedTuple, Tuple
+
+
+class KeywordHit(NamedTuple):
+    start: int
+    end: int
+    payload: Any
+
+
+def _is_word_char(ch: str) -> bool:
+    # Combining marks (Devanagari vowel signs, viramas) are part of the word
+    return ch.isalnum() or unicodedata.category(ch)[0] == "M"
+
+
+class KeywordMatcher:
+    """
+    Keywords are matched case-insensitively and must start at a word boundary, so
+    'pest' matches 'pests' but 'rice' does not match 'price'; keywords added with
+    whole_word=True must also end at one ('hi' does not match 'high')
+    """
+
+    def __init__(self):
+        # Trie: goto[state] maps a character to the next state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Keywords ending at each state: (keyword length, whole_word, payload); _out adds
+        # those inherited through failure links
+        self._own: List[List[Tuple[int, bool, Any]]] = [[]]
+        self._out: List[List[Tuple[int, bool, Any]]] = [[]]
+        self._keys: Dict[Tuple[str, bool, Hashable], None] = {}
+        self._compiled = True
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, keyword: str, payload: Hashable, whole_word: bool = False):
+        keyword = keyword.lower()
+        if not keyword or (keyword, whole_word, payload) in self._keys:
+            return
+        self._keys[(keyword, whole_word, payload)] = None
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            state = nxt
+        self._own[state].append((len(keyword), whole_word, payload))
+        self._compiled = False
+
+    def compile(self):
+        """Compute failure links breadth-first; called automatically before the first match"""
+        self._out = [list(own) for own in self._own]
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._own[nxt] + self._out[self._fail[nxt]]
+                queue.append(nxt)
+        self._compiled = True
+
+    def find(self, text: str) -> List[KeywordHit]:
+        """Every keyword occurrence in `text`, ordered by end offset (offsets index text.lower())"""
+        if not self._compiled:
+            self.compile()
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        hits: List[KeywordHit] = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, whole_word, payload in out[state]:
+                start, end = i + 1 - length, i + 1
+                if start and _is_word_char(text[start - 1]):
+                    continue
+                if whole_word and end < len(text) and _is_word_char(text[end]):
+                    continue
+                hits.append(KeywordHit(start, end, payload))
+        return hits
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"keywords": len(self._keys), "states": len(self._goto)}
@@ -0,0 +1,306 @@
+"""
+LLM Backend Pool
+Chat completions go through a pool of OpenAI-compatible endpoints: concurrency is
+capped per endpoint, callers beyond the cap wait in a priority queue for at most
+LLM_QUEUE_TIMEOUT seconds, and when the queue is full they are turned away at once so
+the chatbot can answer with a fallback instead of piling up. Each call is routed to
+the least-loaded healthy endpoint, and a call failing on the endpoint's side is
+retried on another endpoint right away instead of sleeping
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from collections import deque
+from contextlib import aclosing
+from itertools import count
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated OpenAI-compatible base URLs; defaults to OPENAI_BASE_URL (or OpenAI itself)
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+# Attempts per call, each on the least-loaded endpoint not yet tried if there is one
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+# Seconds an endpoint is passed over after a failed call
+LLM_ENDPOINT_COOLDOWN = float(os.getenv("LLM_ENDPOINT_COOLDOWN", "5"))
+
+# Lower runs first: retries have already waited once, streamed replies have a user
+# watching for the first token
+PRIORITY_RETRY = 0
+PRIORITY_STREAM = 1
+PRIORITY_DEFAULT = 2
+
+
+class LLMOverloaded(Exception):
+    """The pool cannot take the call: its queue is full or the wait exceeded the limit"""
+
+
+def endpoint_failure(error: Exception) -> bool:
+    """
+    Whether an error is the endpoint's doing (unreachable, timed out, rate limited or
+    a server error) and another endpoint may succeed. Anything else, such as a 400 for
+    a request that is too long, fails the same way everywhere.
+    """
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    # Timeouts are connection errors in the client, and OSError covers sockets
+    return isinstance(error, (APIConnectionError, OSError))
+
+
+class LLMBackend:
+    """One chat completion endpoint"""
+
+    name = "backend"
+
+    async def complete(self, messages: List[Dict[str, str]], **params) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict[str, str]], **params) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI or any server speaking its chat completions API"""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, timeout: float = LLM_REQUEST_TIMEOUT):
+        # Retries are the pool's job (on another endpoint, without sleeping)
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url or None, timeout=timeout, max_retries=0)
+        self.name = str(self.client.base_url)
+
+    async def complete(self, messages: List[Dict[str, str]], **params) -> str:
+        response = await self.client.chat.completions.create(messages=messages, **params)
+        return response.choices[0].message.content.strip()
+
+    async def stream(self, messages: List[Dict[str, str]], **params) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(messages=messages, stream=True, **params)
+        try:
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    yield text
+        finally:
+            # Abandoned streams release their HTTP connection now, not at garbage collection
+            await stream.close()
+
+
+class Endpoint:
+    """A backend with its concurrency cap, load and health"""
+
+    def __init__(self, backend: LLMBackend, capacity: int):
+        self.backend = backend
+        self.capacity = capacity
+        self.active = 0
+        self.cooldown_until = 0.0
+        self.stats = {"calls": 0, "errors": 0, "seconds": 0.0}
+
+    @property
+    def load(self) -> float:
+        return self.active / self.capacity
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls = self.stats["calls"]
+        return {
+            "name": self.backend.name,
+            "active": self.active,
+            "capacity": self.capacity,
+            "calls": calls,
+            "errors": self.stats["errors"],
+            "avg_latency_ms": round(self.stats["seconds"] / calls * 1000, 1) if calls else None,
+            "cooling_down": not self.healthy(time.monotonic()),
+        }
+
+
+class LLMPool:
+    """
+    Bounded, prioritized access to a set of endpoints. Works like a semaphore with
+    sum(capacity) permits, except that waiters are served by priority and then arrival
+    """
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        params: Optional[Dict[str, Any]] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        queue_size: int = LLM_QUEUE_SIZE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        cooldown: float = LLM_ENDPOINT_COOLDOWN,
+    ):
+        if not backends:
+            raise ValueError("LLMPool needs at least one backend")
+        self.endpoints = [Endpoint(backend, max_concurrency) for backend in backends]
+        self.params = params or {}
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.max_attempts = max_attempts
+        self.cooldown = cooldown
+        # Waiters: (priority, arrival, future resolved with the endpoint handed to them,
+        # endpoints they already failed on and would rather avoid)
+        self._queue: List[Tuple[int, int, asyncio.Future, Tuple[Endpoint, ...]]] = []
+        self._arrivals = count()
+        self.stats = {"calls": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "failovers": 0, "client_errors": 0, "max_queue_depth": 0}
+        self.wait_samples: Deque[float] = deque(maxlen=1000)
+
+    # Slots
+
+    def _pick(self, exclude: Tuple[Endpoint, ...] = ()) -> Optional[Endpoint]:
+        """Least-loaded endpoint with a free slot, preferring healthy ones not tried yet"""
+        now = time.monotonic()
+        free = [e for e in self.endpoints if e.active < e.capacity]
+        if not free:
+            return None
+        return min(free, key=lambda e: (e in exclude, not e.healthy(now), e.load))
+
+    def _queue_depth(self) -> int:
+        return sum(1 for _, _, waiter, _ in self._queue if not waiter.done())
+
+    async def _acquire(self, priority: int, exclude: Tuple[Endpoint, ...] = ()) -> Endpoint:
+        started = time.perf_counter()
+        endpoint = self._pick(exclude) if not self._queue_depth() else None
+        if endpoint is not None:
+            endpoint.active += 1
+        else:
+            depth = self._queue_depth()
+            if depth >= self.queue_size:
+                self.stats["rejected_queue_full"] += 1
+                raise LLMOverloaded(f"LLM queue full ({depth} waiting)")
+            if len(self._queue) > 2 * self.queue_size:
+                # Drop waiters that timed out or went away
+                self._queue = [entry for entry in self._queue if not entry[2].done()]
+                heapq.heapify(self._queue)
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._arrivals), waiter, exclude))
+            self.stats["queued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], depth + 1)
+            try:
+                endpoint = await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if waiter.done() and not waiter.cancelled():
+                    # Handed a slot just as the wait ran out: give it back
+                    self._release(waiter.result())
+                waiter.cancel()
+                self.stats["rejected_timeout"] += 1
+                raise LLMOverloaded(f"No LLM capacity within {self.queue_timeout:g}s")
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release(waiter.result())
+                waiter.cancel()
+                raise
+        self.wait_samples.append(time.perf_counter() - started)
+        return endpoint
+
+    def _release(self, endpoint: Endpoint):
+        endpoint.active -= 1
+        # Hand the freed capacity to the highest-priority live waiter, claimed on its
+        # behalf so that no new caller can take it before the waiter resumes
+        while self._queue:
+            _, _, waiter, exclude = heapq.heappop(self._queue)
+            if not waiter.done():
+                chosen = self._pick(exclude) or endpoint
+                chosen.active += 1
+                waiter.set_result(chosen)
+                return
+
+    def _failed(self, endpoint: Endpoint, error: Exception):
+        endpoint.stats["errors"] += 1
+        endpoint.cooldown_until = time.monotonic() + self.cooldown
+        logger.warning(f"LLM endpoint {endpoint.backend.name} failed: {error}")
+
+    # Calls
+
+    async def complete(self, messages: List[Dict[str, str]], priority: int = PRIORITY_DEFAULT) -> str:
+        """
+        Full completion text; LLMOverloaded if no capacity, the last error if every
+        attempt fails, and a client error (see endpoint_failure) at once
+        """
+        self.stats["calls"] += 1
+        tried: Tuple[Endpoint, ...] = ()
+        for attempt in range(self.max_attempts):
+            endpoint = await self._acquire(priority if not attempt else PRIORITY_RETRY, tried)
+            started = time.perf_counter()
+            try:
+                endpoint.stats["calls"] += 1
+                return await endpoint.backend.complete(messages, **self.params)
+            except Exception as e:
+                if not endpoint_failure(e):
+                    self.stats["client_errors"] += 1
+                    raise
+                self._failed(endpoint, e)
+                tried += (endpoint,)
+                if attempt == self.max_attempts - 1:
+                    raise
+                self.stats["failovers"] += 1
+            finally:
+                endpoint.stats["seconds"] += time.perf_counter() - started
+                self._release(endpoint)
+
+    async def stream(self, messages: List[Dict[str, str]], priority: int = PRIORITY_STREAM) -> AsyncIterator[str]:
+        """
+        Completion text as it is generated; the slot is held until the stream ends.
+        Only failures before the first chunk are retried on another endpoint
+        """
+        self.stats["calls"] += 1
+        tried: Tuple[Endpoint, ...] = ()
+        for attempt in range(self.max_attempts):
+            endpoint = await self._acquire(priority if not attempt else PRIORITY_RETRY, tried)
+            started = time.perf_counter()
+            produced = False
+            try:
+                endpoint.stats["calls"] += 1
+                async with aclosing(endpoint.backend.stream(messages, **self.params)) as chunks:
+                    async for text in chunks:
+                        produced = True
+                        yield text
+                return
+            except Exception as e:
+                if not endpoint_failure(e):
+                    self.stats["client_errors"] += 1
+                    raise
+                self._failed(endpoint, e)
+                tried += (endpoint,)
+                if produced or attempt == self.max_attempts - 1:
+                    raise
+                self.stats["failovers"] += 1
+            finally:
+                endpoint.stats["seconds"] += time.perf_counter() - started
+                self._release(endpoint)
+
+    def get_stats(self) -> Dict[str, Any]:
+        waits = sorted(self.wait_samples)
+
+        def percentile(q: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 2) if waits else None
+
+        return {
+            "endpoints": [e.get_stats() for e in self.endpoints],
+            "active": sum(e.active for e in self.endpoints),
+            "capacity": sum(e.capacity for e in self.endpoints),
+            "queue_depth": self._queue_depth(),
+            "queue_size": self.queue_size,
+            "queue_timeout_seconds": self.queue_timeout,
+            **self.stats,
+            "wait_ms": {
+                "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1] * 1000, 2) if waits else None,
+            },
+        }
+
+
+def create_pool(api_key: str, params: Dict[str, Any]) -> LLMPool:
+    """Pool over LLM_ENDPOINTS, or the single default endpoint"""
+    urls = [u.strip() for u in LLM_ENDPOINTS.split(",") if u.strip()] or [os.getenv("OPENAI_BASE_URL")]
+    return LLMPool([OpenAIBackend(api_key, url) for url in urls], params)
@@ -0,0 +1,452 @@
+"""
+Mandi Price Service
+Server-side aggregator for government mandi (wholesale market) prices: polls the
+configured upstream sources on a schedule through the shared HTTP client, normalizes
+commodity names onto market catalog keys, and keeps the latest records in an indexed
+in-memory snapshot that is persisted to disk and served to every client
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from http_client import UpstreamError, get_http_client
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Comma-separated name=url pairs; each source returns data.gov.in style {"records": [...]}
+# or this service's own {"data": [...]} shape
+MANDI_SOURCES = os.getenv(
+    "MANDI_SOURCES", "agmarknet=https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
+)
+DATA_GOV_API_KEY = os.getenv("DATA_GOV_API_KEY")
+MANDI_POLL_INTERVAL = float(os.getenv("MANDI_POLL_INTERVAL", "900"))
+MANDI_PAGE_SIZE = int(os.getenv("MANDI_PAGE_SIZE", "1000"))
+MANDI_MAX_RECORDS = int(os.getenv("MANDI_MAX_RECORDS", "10000"))
+MANDI_SNAPSHOT_PATH = os.getenv("MANDI_SNAPSHOT_PATH") or os.path.join(BASE_DIR, "data", "mandi_snapshot.json")
+MANDI_RESPONSE_CACHE_SIZE = int(os.getenv("MANDI_RESPONSE_CACHE_SIZE", "256"))
+
+# Upstream commodity names (lowercased, punctuation collapsed) that do not reduce to a
+# catalog key by word matching alone
+COMMODITY_ALIASES = {
+    "paddy": "rice",
+    "dhan": "rice",
+    "basmati": "rice",
+    "jowar": "sorghum",
+    "bajra": "millets",
+    "ragi": "millets",
+    "pearl millet": "millets",
+    "finger millet": "millets",
+    "jau": "barley",
+    "bengal gram": "chickpea",
+    "gram": "chickpea",
+    "kabuli chana": "chickpea",
+    "black gram": "black_gram",
+    "urd": "black_gram",
+    "urad": "black_gram",
+    "green gram": "green_gram",
+    "moong": "green_gram",
+    "arhar": "pigeon_pea",
+    "tur": "pigeon_pea",
+    "red gram": "pigeon_pea",
+    "masur": "lentil",
+    "masoor": "lentil",
+    "rajma": "kidney_beans",
+    "peas": "field_pea",
+    "bhindi": "okra",
+    "ladies finger": "okra",
+    "chilli": "chili",
+    "chillies": "chili",
+    "green chilli": "chili",
+    "dry chillies": "chili",
+    "water melon": "watermelon",
+    "kapas": "cotton",
+    "ground nut": "groundnut",
+    "soyabean": "soybean",
+    "rapeseed": "mustard",
+    "sesamum": "sesame",
+    "til": "sesame",
+    "gingelly": "sesame",
+    "kardi": "safflower",
+    "corriander": "coriander",
+    "dhaniya": "coriander",
+    "cummin": "cumin",
+    "jeera": "cumin",
+    "methi": "fenugreek",
+    "pepper": "black_pepper",
+    "cardamoms": "cardamom",
+    "pudina": "mint",
+    "tulsi": "basil",
+}
+
+_PARENS = re.compile(r"\(([^)]*)\)")
+_NON_WORD = re.compile(r"[^a-z ]+")
+
+
+def _candidates(raw: str) -> List[str]:
+    """Name variants to try, most specific first: the name outside brackets, then bracketed parts"""
+    lowered = raw.lower()
+    outer = _PARENS.sub(" ", lowered)
+    parts = [outer] + _PARENS.findall(lowered)
+    names = []
+    for part in parts:
+        for piece in re.split(r"[/,]", part):
+            cleaned = " ".join(_NON_WORD.sub(" ", piece).split())
+            if cleaned:
+                names.append(cleaned)
+    return names
+
+
+class CommodityNormalizer:
+    """Maps upstream commodity names onto catalog keys, memoizing each raw name"""
+
+    def __init__(self, catalog_keys: Iterable[str]):
+        self.keys = set(catalog_keys)
+        self.lookup: Dict[str, str] = {}
+        for key in self.keys:
+            self.lookup[key.replace("_", " ")] = key
+            if key.endswith("s"):
+                self.lookup[key.replace("_", " ")[:-1]] = key
+        for alias, key in COMMODITY_ALIASES.items():
+            if key in self.keys:
+                self.lookup[alias] = key
+        self._memo: Dict[str, Optional[str]] = {}
+
+    def normalize(self, raw: str) -> Optional[str]:
+        if raw in self._memo:
+            return self._memo[raw]
+        result = None
+        for name in _candidates(raw):
+            if name in self.lookup:
+                result = self.lookup[name]
+                break
+            words = name.split()
+            # Longest word run first, so "green gram" wins over "gram"
+            for size in range(len(words), 0, -1):
+                for i in range(len(words) - size + 1):
+                    key = self.lookup.get(" ".join(words[i:i + size]))
+                    if key is not None:
+                        result = key
+                        break
+                if result is not None:
+                    break
+            if result is not None:
+                break
+        self._memo[raw] = result
+        return result
+
+
+def _first(record: dict, *names: str) -> Any:
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_date(value: Any) -> str:
+    """ISO date from dd/mm/yyyy or yyyy-mm-dd, today when missing or unparseable"""
+    if value:
+        for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
+            try:
+                return datetime.strptime(str(value)[:10], fmt).date().isoformat()
+            except ValueError:
+                continue
+    return date.today().isoformat()
+
+
+def parse_records(payload: Any) -> List[dict]:
+    """Raw records from a data.gov.in response, this service's response or a bare list"""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        for field in ("records", "data"):
+            if isinstance(payload.get(field), list):
+                return payload[field]
+    return []
+
+
+class MandiSnapshot:
+    """Immutable set of normalized price records with lookup indexes"""
+
+    def __init__(self, records: List[dict], fetched_at: float, sources: Dict[str, int], version: int):
+        self.records = records
+        self.fetched_at = fetched_at
+        self.sources = sources
+        self.version = version
+        self.by_crop: Dict[str, List[int]] = {}
+        self.by_state: Dict[str, List[int]] = {}
+        for i, record in enumerate(records):
+            if record["crop"]:
+                self.by_crop.setdefault(record["crop"], []).append(i)
+            self.by_state.setdefault(record["state"].lower(), []).append(i)
+
+    @property
+    def last_updated(self) -> str:
+        return datetime.fromtimestamp(self.fetched_at).astimezone().isoformat()
+
+    def select(
+        self, commodity: Optional[str], market: Optional[str], state: Optional[str], crop: Optional[str]
+    ) -> List[dict]:
+        rows: Iterable[int] = range(len(self.records))
+        if crop is not None:
+            rows = self.by_crop.get(crop, [])
+        elif state and state.lower() in self.by_state:
+            rows = self.by_state[state.lower()]
+        result = []
+        for i in rows:
+            record = self.records[i]
+            if commodity and crop is None and commodity.lower() not in record["commodity"].lower():
+                continue
+            if market and market.lower() not in record["market"].lower():
+                continue
+            if state and state.lower() not in record["state"].lower():
+                continue
+            result.append(record)
+        return result
+
+
+class MandiPriceService:
+    """Polls the upstream sources and serves filtered views of the latest snapshot"""
+
+    def __init__(
+        self,
+        catalog_keys: Iterable[str],
+        sources: str = MANDI_SOURCES,
+        poll_interval: float = MANDI_POLL_INTERVAL,
+        snapshot_path: str = MANDI_SNAPSHOT_PATH,
+    ):
+        self.normalizer = CommodityNormalizer(catalog_keys)
+        self.sources = [
+            tuple(part.split("=", 1)) for part in (p.strip() for p in sources.split(",")) if "=" in part
+        ]
+        self.poll_interval = poll_interval
+        self.snapshot_path = snapshot_path
+        self.snapshot: Optional[MandiSnapshot] = None
+        self.stats = {"polls": 0, "poll_errors": 0, "served": 0, "response_cache_hits": 0, "unmatched_commodities": 0}
+        self.last_errors: Dict[str, str] = {}
+        self._responses: "OrderedDict[tuple, Tuple[bytes, str]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._load_snapshot()
+
+    # Polling
+
+    def _source_params(self, name: str, url: str, offset: int) -> Optional[dict]:
+        if "api.data.gov.in" not in url:
+            return {"limit": MANDI_PAGE_SIZE, "offset": offset}
+        if not DATA_GOV_API_KEY:
+            return None
+        return {"api-key": DATA_GOV_API_KEY, "format": "json", "limit": MANDI_PAGE_SIZE, "offset": offset}
+
+    async def _fetch_source(self, name: str, url: str) -> List[dict]:
+        """All pages of one source, up to MANDI_MAX_RECORDS"""
+        records: List[dict] = []
+        while len(records) < MANDI_MAX_RECORDS:
+            params = self._source_params(name, url, len(records))
+            if params is None:
+                raise UpstreamError(name, "DATA_GOV_API_KEY is not set")
+            page = parse_records(await get_http_client().get_json(f"mandi:{name}", url, params=params))
+            records.extend(page)
+            if len(page) < MANDI_PAGE_SIZE:
+                break
+        return records[:MANDI_MAX_RECORDS]
+
+    def _normalize(self, raw: dict, source: str, previous: Dict[tuple, float]) -> dict:
+        commodity = str(_first(raw, "commodity") or "Unknown")
+        crop = self.normalizer.normalize(commodity)
+        if crop is None:
+            self.stats["unmatched_commodities"] += 1
+        modal = _number(_first(raw, "modal_price", "modalPrice"))
+        record = {
+            "commodity": commodity,
+            "crop": crop,
+            "variety": str(_first(raw, "variety") or "Common"),
+            "market": str(_first(raw, "market") or "Unknown Mandi"),
+            "state": str(_first(raw, "state") or "Unknown State"),
+            "district": str(_first(raw, "district") or "Unknown District"),
+            "minPrice": _number(_first(raw, "min_price", "minPrice")),
+            "maxPrice": _number(_first(raw, "max_price", "maxPrice")),
+            "modalPrice": modal,
+            "unit": "₹/quintal",
+            "reportedDate": _parse_date(_first(raw, "arrival_date", "reportedDate")),
+            "arrivalQuantity": _number(_first(raw, "arrivals", "arrivalQuantity")),
+            "source": source,
+        }
+        # Change against the same commodity/variety/market in the previous snapshot
+        prev = previous.get(self._record_key(record))
+        change = round(modal - prev, 2) if prev is not None else 0.0
+        record["priceChange"] = change
+        record["trend"] = "up" if change > 0 else "down" if change < 0 else "stable"
+        return record
+
+    @staticmethod
+    def _record_key(record: dict) -> tuple:
+        return tuple(record[f].lower() for f in ("commodity", "variety", "market", "district", "state"))
+
+    async def poll(self) -> MandiSnapshot:
+        """Fetch every source once and swap in a new snapshot if any source answered"""
+        self.stats["polls"] += 1
+        results = await asyncio.gather(
+            *(self._fetch_source(name, url) for name, url in self.sources), return_exceptions=True
+        )
+        previous = {}
+        if self.snapshot is not None:
+            previous = {self._record_key(r): r["modalPrice"] for r in self.snapshot.records}
+        records: List[dict] = []
+        seen = set()
+        counts: Dict[str, int] = {}
+        for (name, _), result in zip(self.sources, results):
+            if isinstance(result, BaseException):
+                self.last_errors[name] = str(result)
+                logger.warning(f"Mandi source {name} failed: {result}")
+                continue
+            self.last_errors.pop(name, None)
+            counts[name] = 0
+            for raw in result:
+                if not isinstance(raw, dict):
+                    continue
+                record = self._normalize(raw, name, previous)
+                # Sources are listed in priority order; the first report of a row wins
+                key = self._record_key(record) + (record["reportedDate"],)
+                if key in seen:
+                    continue
+                seen.add(key)
+                records.append(record)
+                counts[name] += 1
+
+        if not counts:
+            self.stats["poll_errors"] += 1
+            raise UpstreamError("mandi", "All mandi sources failed: " + "; ".join(self.last_errors.values()))
+        version = self.snapshot.version + 1 if self.snapshot else 1
+        self.snapshot = MandiSnapshot(records, time.time(), counts, version)
+        self._responses.clear()
+        self._save_snapshot()
+        logger.info(f"Mandi prices updated: {len(records)} records from {counts}")
+        return self.snapshot
+
+    async def run(self):
+        """Poll forever; a failed poll keeps serving the previous snapshot"""
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Mandi price poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None and self.sources and self.poll_interval > 0:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # Persistence
+
+    def _save_snapshot(self):
+        snapshot = self.snapshot
+        tmp = self.snapshot_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"fetched_at": snapshot.fetched_at, "sources": snapshot.sources, "records": snapshot.records},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"Could not write mandi snapshot: {e}")
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+            records = data["records"]
+            for record in records:
+                # Catalog keys may have changed since the snapshot was written
+                record["crop"] = self.normalizer.normalize(record["commodity"])
+            self.snapshot = MandiSnapshot(records, data["fetched_at"], data.get("sources", {}), 1)
+            logger.info(f"Mandi snapshot loaded: {len(records)} records")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable mandi snapshot {self.snapshot_path}: {e}")
+
+    # Serving
+
+    def query(
+        self,
+        commodity: Optional[str] = None,
+        market: Optional[str] = None,
+        state: Optional[str] = None,
+        limit: int = 100,
+    ) -> Optional[Tuple[bytes, str]]:
+        """
+        Pre-encoded JSON body and ETag for a filtered view of the current snapshot, or
+        None before the first successful poll. Bodies are cached per snapshot version.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        key = (snapshot.version, (commodity or "").lower(), (market or "").lower(), (state or "").lower(), limit)
+        self.stats["served"] += 1
+        cached = self._responses.get(key)
+        if cached is not None:
+            self._responses.move_to_end(key)
+            self.stats["response_cache_hits"] += 1
+            return cached
+
+        crop = self.normalizer.normalize(commodity) if commodity else None
+        rows = snapshot.select(commodity, market, state, crop)[:limit]
+        payload = {
+            "success": True,
+            "data": [{"id": i + 1, **row} for i, row in enumerate(rows)],
+            "lastUpdated": snapshot.last_updated,
+            "source": ",".join(snapshot.sources) or "snapshot",
+        }
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        entry = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+        self._responses[key] = entry
+        while len(self._responses) > MANDI_RESPONSE_CACHE_SIZE:
+            self._responses.popitem(last=False)
+        return entry
+
+    def seconds_until_next_poll(self) -> int:
+        if self.snapshot is None:
+            return 0
+        return max(0, int(self.snapshot.fetched_at + self.poll_interval - time.time()))
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "sources": [name for name, _ in self.sources],
+            "poll_interval_seconds": self.poll_interval,
+            "records": len(snapshot.records) if snapshot else 0,
+            "matched_crops": len(snapshot.by_crop) if snapshot else 0,
+            "last_updated": snapshot.last_updated if snapshot else None,
+            "last_errors": dict(self.last_errors),
+            **self.stats,
+        }
+
@@ -0,0 +1,94 @@
+"""
+Market Series Engine
+Vectorized price and demand series for a whole crop catalog: every crop's series is a
+row of a 2-D array, so thousands of commodities over years of daily points are
+generated with a handful of NumPy operations instead of per-point Python loops
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Prices stay within these multiples of the crop's base price
+PRICE_FLOOR = 0.5
+PRICE_CAP = 2.0
+# Demand is a 0-100 index
+DEMAND_MIN = 30
+DEMAND_MAX = 100
+
+
+@dataclass
+class MarketSeries:
+    """Generated series, one row per crop and one column per time step"""
+    prices: np.ndarray          # float64, (n_crops, n_points), rounded to 2 decimals
+    demand: np.ndarray          # int16, (n_crops, n_points)
+    seasonal_factor: np.ndarray  # float64, (n_crops,)
+    trend: np.ndarray           # float64, (n_crops,), mean log-return per step
+
+    def row(self, i: int) -> Tuple[list, list]:
+        """(prices, demand) for crop `i` as plain lists for JSON encoding"""
+        return self.prices[i].tolist(), self.demand[i].tolist()
+
+
+def generate_market_series(
+    base_prices: Sequence[float],
+    n_points: int,
+    seed: int = 42,
+    volatility: float = 0.05,
+    trend_range: Tuple[float, float] = (-0.01, 0.015),
+    seasonal_range: Tuple[float, float] = (0.8, 1.2),
+    elasticity: float = 20.0,
+    start_prices: Optional[Sequence[float]] = None,
+) -> MarketSeries:
+    """
+    Bounded random-walk prices and price-elastic demand for every crop at once.
+
+    Each crop starts at base_price * seasonal factor and moves by normally distributed
+    log-returns (`volatility` and a per-crop drift drawn from `trend_range` are per
+    step); the cumulative walk is clipped to [PRICE_FLOOR, PRICE_CAP] x base price.
+    Demand is a per-crop base level plus `elasticity` * base_price / price plus
+    per-point noise, truncated and clipped to [DEMAND_MIN, DEMAND_MAX].
+
+    With `start_prices` (e.g. the last stored prices) the series continues from them
+    instead: the first point is already one step of the walk away.
+
+    The same seed, catalog order and parameters always produce the same arrays.
+    """
+    base = np.asarray(base_prices, dtype=np.float64)
+    n_crops = base.shape[0]
+    rng = np.random.default_rng(seed)
+
+    # Draw each quantity as a whole block so results do not depend on per-crop ordering.
+    # The per-point blocks dominate the cost, so they are drawn in float32.
+    seasonal_factor = rng.uniform(*seasonal_range, size=n_crops)
+    trend = rng.uniform(*trend_range, size=n_crops)
+    if not n_points:
+        return MarketSeries(
+            prices=np.empty((n_crops, 0)),
+            demand=np.empty((n_crops, 0), dtype=np.int16),
+            seasonal_factor=seasonal_factor,
+            trend=trend,
+        )
+    base_demand = rng.uniform(60, 95, size=n_crops)
+    shocks = rng.standard_normal((n_crops, n_points), dtype=np.float32)
+    demand_noise = rng.random((n_crops, n_points), dtype=np.float32)
+
+    # Log-price walk: a fresh series starts exactly at the seasonal starting price
+    shocks *= volatility
+    shocks += trend[:, None].astype(np.float32)
+    if start_prices is None:
+        start = base * seasonal_factor
+        shocks[:, 0] = 0.0
+    else:
+        start = np.asarray(start_prices, dtype=np.float64)
+    walk = np.cumsum(shocks, axis=1, dtype=np.float64)
+    prices = start[:, None] * np.exp(walk, out=walk)
+    np.clip(prices, (base * PRICE_FLOOR)[:, None], (base * PRICE_CAP)[:, None], out=prices)
+    np.round(prices, 2, out=prices)
+
+    # Inverse price-demand relationship plus seasonal noise
+    demand = base_demand[:, None] + elasticity * base[:, None] / prices + (demand_noise * 20 - 10)
+    demand = np.clip(np.trunc(demand), DEMAND_MIN, DEMAND_MAX).astype(np.int16)
+
+    return MarketSeries(prices=prices, demand=demand, seasonal_factor=seasonal_factor, trend=trend)
@@ -0,0 +1,143 @@
+"""
+Market Column Store
+In-memory columnar view of the market data for one day: crop metadata as column
+arrays, price/demand series as 2-D arrays, and per-category/per-season row indexes,
+so filtered and projected queries only touch and encode the rows and fields asked for
+"""
+
+import base64
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+METADATA_FIELDS = ["category", "unit", "image", "description", "season", "harvest_time"]
+SERIES_FIELDS = ["prices", "demand"]
+MARKET_FIELDS = SERIES_FIELDS + METADATA_FIELDS
+
+
+class MarketQueryError(ValueError):
+    """Raised for unknown fields, crops or cursors; maps to a 400 response"""
+
+
+class MarketColumnStore:
+    """Immutable columnar snapshot of the market catalog and its series"""
+
+    def __init__(
+        self,
+        catalog: Dict[str, dict],
+        dates: Sequence[date],
+        prices: np.ndarray,
+        demand: np.ndarray,
+        version: int = 1,
+    ):
+        self.version = version
+        self.names = list(catalog)
+        self.row_of = {name: i for i, name in enumerate(self.names)}
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.date_strings = np.datetime_as_string(self.dates, unit="D").tolist()
+        self.columns = {
+            name: np.asarray([info[name] for info in catalog.values()], dtype=object) for name in METADATA_FIELDS
+        }
+        self.prices = prices
+        self.demand = demand
+        self.by_category = self._build_index(self.columns["category"])
+        self.by_season = self._build_index(self.columns["season"])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _build_index(column: np.ndarray) -> Dict[str, np.ndarray]:
+        keys = np.asarray([str(v).lower() for v in column])
+        return {key: np.flatnonzero(keys == key).astype(np.int32) for key in dict.fromkeys(keys)}
+
+    def _select_rows(
+        self, crops: Optional[Iterable[str]], category: Optional[str], season: Optional[str]
+    ) -> np.ndarray:
+        rows = np.arange(len(self.names), dtype=np.int32)
+        if crops:
+            unknown = [c for c in crops if c not in self.row_of]
+            if unknown:
+                raise MarketQueryError(f"Unknown crops: {unknown}")
+            rows = np.unique(np.fromiter((self.row_of[c] for c in crops), dtype=np.int32))
+        if category:
+            rows = np.intersect1d(rows, self.by_category.get(category.lower(), rows[:0]), assume_unique=True)
+        if season:
+            rows = np.intersect1d(rows, self.by_season.get(season.lower(), rows[:0]), assume_unique=True)
+        return rows
+
+    def _cursor(self, offset: int) -> str:
+        return base64.urlsafe_b64encode(f"{self.version}:{offset}".encode()).decode()
+
+    def _offset(self, cursor: Optional[str], total: int) -> int:
+        """Decode a cursor into an offset within `total` selected rows"""
+        if not cursor:
+            return 0
+        try:
+            version, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+            version, offset = int(version), int(offset)
+        except ValueError:
+            raise MarketQueryError("Invalid cursor")
+        if version != self.version:
+            raise MarketQueryError("Cursor has expired, restart the query without a cursor")
+        if not 0 <= offset <= total:
+            raise MarketQueryError("Invalid cursor")
+        return offset
+
+    def query(
+        self,
+        crops: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        season: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        fields: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Filter by crop names, category and season (AND-ed), slice the series to
+        [start, end], keep only `fields`, and return one page of `limit` crops.
+
+        `next_cursor` is None on the last page; cursors are only valid for the store
+        version that issued them.
+        """
+        fields = fields or MARKET_FIELDS
+        unknown = [f for f in fields if f not in MARKET_FIELDS]
+        if unknown:
+            raise MarketQueryError(f"Unknown fields: {unknown}; expected any of {MARKET_FIELDS}")
+
+        rows = self._select_rows(crops, category, season)
+        offset = self._offset(cursor, len(rows))
+        page = rows[offset:offset + limit]
+        next_offset = offset + len(page)
+
+        lo = int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left")) if start else 0
+        hi = int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right")) if end else len(self.dates)
+        series_fields = [f for f in fields if f in SERIES_FIELDS]
+        metadata_fields = [f for f in fields if f in METADATA_FIELDS]
+
+        # Slice and convert each requested block once instead of per crop
+        blocks = {
+            "prices": self.prices[page, lo:hi].tolist() if "prices" in series_fields else None,
+            "demand": self.demand[page, lo:hi].tolist() if "demand" in series_fields else None,
+        }
+        series = {}
+        for k, row in enumerate(page.tolist()):
+            item = {f: blocks[f][k] for f in series_fields}
+            for f in metadata_fields:
+                item[f] = self.columns[f][row]
+            series[self.names[row]] = item
+
+        return {
+            "dates": self.date_strings[lo:hi] if series_fields else [],
+            "series": series,
+            "total": int(len(rows)),
+            "next_cursor": self._cursor(next_offset) if next_offset < len(rows) else None,
+        }
+
+    def to_payload(self) -> Dict[str, Any]:
+        """The full /market payload: every crop, every field, every date"""
+        result = self.query(limit=len(self.names))
+        return {"dates": result["dates"], "series": result["series"], "total_crops": result["total"]}
@@ -0,0 +1,201 @@
+"""
+Market Stream
+Server-sent events channel for live market data. Each rebuild of the market snapshot is
+diffed against the previous one and published as a compact delta into a bounded,
+shared ring; subscribers keep only a cursor into that ring, so a slow client costs no
+memory beyond the ring itself and is sent a fresh snapshot if it falls too far behind
+"""
+
+import os
+import json
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from market_store import MarketColumnStore
+
+logger = logging.getLogger(__name__)
+
+MARKET_STREAM_RING_SIZE = int(os.getenv("MARKET_STREAM_RING_SIZE", "256"))
+MARKET_STREAM_HEARTBEAT = float(os.getenv("MARKET_STREAM_HEARTBEAT", "15"))
+MARKET_STREAM_MAX_CLIENTS = int(os.getenv("MARKET_STREAM_MAX_CLIENTS", "1000"))
+
+
+@dataclass
+class MarketEvent:
+    """One published change set: crop -> [[date, price, demand], ...]"""
+    seq: int
+    window: List[str]
+    changes: Dict[str, List[list]]
+
+
+@dataclass
+class Subscription:
+    crops: Set[str]
+    cursor: int
+    sent_events: int = 0
+    sent_bytes: int = 0
+    resets: int = 0
+
+
+def diff_stores(old: Optional[MarketColumnStore], new: MarketColumnStore) -> Dict[str, List[list]]:
+    """Points of `new` that are absent from or different in `old`, per crop"""
+    new_dates = new.dates
+    changed = np.ones(new.prices.shape, dtype=bool)
+    if old is not None and len(old.dates) and old.names == new.names:
+        # Align the old columns onto the new date axis; dates only in `new` stay changed
+        old_cols = np.searchsorted(old.dates, new_dates)
+        present = (old_cols < len(old.dates)) & (old.dates[np.minimum(old_cols, len(old.dates) - 1)] == new_dates)
+        cols = np.flatnonzero(present)
+        same = (old.prices[:, old_cols[cols]] == new.prices[:, cols]) & (old.demand[:, old_cols[cols]] == new.demand[:, cols])
+        changed[:, cols] = ~same
+
+    changes: Dict[str, List[list]] = {}
+    rows, cols = np.nonzero(changed)
+    prices = new.prices[rows, cols].tolist()
+    demand = new.demand[rows, cols].tolist()
+    for row, col, price, dem in zip(rows.tolist(), cols.tolist(), prices, demand):
+        changes.setdefault(new.names[row], []).append([new.date_strings[col], price, dem])
+    return changes
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class MarketBroadcaster:
+    """Publishes market deltas into a ring and streams them to subscribers as SSE"""
+
+    def __init__(
+        self,
+        ring_size: int = MARKET_STREAM_RING_SIZE,
+        heartbeat: float = MARKET_STREAM_HEARTBEAT,
+        max_clients: int = MARKET_STREAM_MAX_CLIENTS,
+    ):
+        self.ring: "deque[MarketEvent]" = deque(maxlen=ring_size)
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.store: Optional[MarketColumnStore] = None
+        self.seq = 0
+        self.subscriptions: Set[int] = set()
+        self._changed = asyncio.Event()
+        self.stats = {"published": 0, "snapshots_sent": 0, "deltas_sent": 0, "resets": 0, "bytes_sent": 0, "rejected": 0}
+
+    def publish(self, store: MarketColumnStore):
+        """Diff a freshly built store against the last one and wake subscribers"""
+        changes = diff_stores(self.store, store)
+        self.store = store
+        if not changes:
+            return
+        self.seq += 1
+        self.ring.append(MarketEvent(seq=self.seq, window=[store.date_strings[0], store.date_strings[-1]], changes=changes))
+        self.stats["published"] += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _pending(self, sub: Subscription) -> Optional[dict]:
+        """
+        All changes after the subscriber's cursor for its crops, merged so each point
+        appears once with its latest value. None when the cursor fell off the ring.
+        """
+        if sub.cursor > self.seq:
+            # The client saw events from before a restart
+            return None
+        if sub.cursor == self.seq:
+            return {}
+        if not self.ring or self.ring[0].seq > sub.cursor + 1:
+            return None
+        merged: Dict[str, Dict[str, list]] = {}
+        window = None
+        for event in self.ring:
+            if event.seq <= sub.cursor:
+                continue
+            window = event.window
+            for crop, points in event.changes.items():
+                if crop in sub.crops:
+                    by_date = merged.setdefault(crop, {})
+                    for point in points:
+                        by_date[point[0]] = point
+        sub.cursor = self.seq
+        if not merged:
+            return {}
+        return {"seq": self.seq, "window": window, "changes": {crop: sorted(p.values()) for crop, p in merged.items()}}
+
+    def _snapshot(self, sub: Subscription) -> dict:
+        result = self.store.query(crops=sorted(sub.crops), fields=["prices", "demand"], limit=max(len(sub.crops), 1))
+        sub.cursor = self.seq
+        return {"seq": self.seq, "dates": result["dates"], "series": result["series"]}
+
+    async def stream(
+        self,
+        crops: Set[str],
+        last_event_id: Optional[int],
+        is_disconnected: Callable[[], Any],
+        refresh: Callable[[], Any],
+    ) -> AsyncIterator[str]:
+        """
+        SSE stream for one subscriber: a snapshot (or the deltas since `last_event_id`
+        when it is still in the ring), then merged deltas as they are published and a
+        heartbeat comment whenever the channel is idle. `refresh` is called on every
+        heartbeat so date rollovers get published without a /market request.
+        """
+        sub = Subscription(crops=crops, cursor=self.seq if last_event_id is None else last_event_id)
+        key = id(sub)
+        self.subscriptions.add(key)
+        try:
+            delta = None if last_event_id is None else self._pending(sub)
+            if delta is None:
+                yield self._send(sub, "snapshot", self._snapshot(sub), "snapshots_sent")
+            elif delta:
+                # Resume: replay what was missed since the client's last event id
+                yield self._send(sub, "delta", delta, "deltas_sent")
+            while True:
+                if sub.cursor == self.seq:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=self.heartbeat)
+                    except asyncio.TimeoutError:
+                        if await is_disconnected():
+                            return
+                        refresh()
+                        if sub.cursor == self.seq:
+                            yield ": ping\n\n"
+                            continue
+                delta = self._pending(sub)
+                if delta is None:
+                    # Too far behind to replay: start over from the current state
+                    sub.resets += 1
+                    self.stats["resets"] += 1
+                    yield self._send(sub, "snapshot", self._snapshot(sub), "snapshots_sent")
+                elif delta:
+                    yield self._send(sub, "delta", delta, "deltas_sent")
+        finally:
+            self.subscriptions.discard(key)
+
+    def _send(self, sub: Subscription, event: str, data: dict, counter: str) -> str:
+        message = _sse(event, data, data.get("seq"))
+        sub.sent_events += 1
+        sub.sent_bytes += len(message)
+        self.stats[counter] += 1
+        self.stats["bytes_sent"] += len(message)
+        return message
+
+    def accepting(self) -> bool:
+        if len(self.subscriptions) >= self.max_clients:
+            self.stats["rejected"] += 1
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.subscriptions),
+            "seq": self.seq,
+            "ring_events": len(self.ring),
+            "ring_size": self.ring.maxlen,
+            "heartbeat_seconds": self.heartbeat,
+            **self.stats,
+        }
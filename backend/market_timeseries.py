@@ -0,0 +1,442 @@
+"""
+Market Time-Series Store
+Append-only on-disk store for daily crop price and demand observations. Rows are
+partitioned into one segment per calendar month, each segment a set of raw column
+files that only ever grow and are memory-mapped for reads, so a range query opens
+just the months it covers. Weekly, monthly and seasonal rollups (mean, min, max,
+volatility) are kept precomputed and updated for the affected periods on append.
+Several worker processes can share the directory: writes take an exclusive file
+lock, and each process folds in rows appended by the others when it next reads.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock only covers threads of this process
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKET_TS_DIR = os.getenv("MARKET_TS_DIR") or os.path.join(BASE_DIR, "data", "market_ts")
+# Seconds between checks for rows appended by other processes
+MARKET_TS_SYNC_INTERVAL = float(os.getenv("MARKET_TS_SYNC_INTERVAL", "1"))
+
+# Column name -> on-disk dtype; `day` is days since 1970-01-01
+COLUMNS = {"day": np.dtype("<i4"), "crop": np.dtype("<i2"), "price": np.dtype("<f4"), "demand": np.dtype("<f4")}
+
+ROLLUP_LEVELS = ["weekly", "monthly", "seasonal"]
+ROLLUP_FIELDS = ["mean", "min", "max", "volatility", "demand_mean", "count"]
+
+# Indian cropping seasons within an agricultural year starting in April
+SEASONS = ["zaid", "kharif", "rabi"]
+_SEASON_OF_MONTH = np.array([2, 2, 2, 0, 0, 1, 1, 1, 1, 1, 2, 2])  # Jan..Dec
+_SEASON_START_MONTH = [4, 6, 11]
+_SEASON_END_MONTH = [5, 10, 15]  # rabi ends in March of the following year
+
+
+def to_days(values) -> np.ndarray:
+    """Dates (or anything datetime64 accepts) as int32 days since the epoch"""
+    return np.asarray(values, dtype="datetime64[D]").astype(np.int32)
+
+
+def _months(days: np.ndarray) -> np.ndarray:
+    """Months since 1970-01 for each day"""
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32)
+
+
+def period_keys(level: str, days: np.ndarray) -> np.ndarray:
+    """Integer period key per day: week-ending Sunday, month index or season index"""
+    if level == "weekly":
+        # 1970-01-01 was a Thursday; weeks end on Sunday like pandas' "W" frequency
+        return days + (6 - (days + 3) % 7)
+    months = _months(days)
+    if level == "monthly":
+        return months
+    if level == "seasonal":
+        year, month = months // 12 + 1970, months % 12 + 1
+        agri_year = np.where(month >= 4, year, year - 1)
+        return agri_year * 3 + _SEASON_OF_MONTH[month - 1]
+    raise ValueError(f"Unknown rollup level {level}; expected one of {ROLLUP_LEVELS}")
+
+
+def period_day_range(level: str, key: int) -> Tuple[int, int]:
+    """First and last day (inclusive) of a period key"""
+    if level == "weekly":
+        return key - 6, key
+    if level == "monthly":
+        first = np.datetime64("1970-01", "M") + key
+        return int(to_days(first)), int(to_days(first + 1)) - 1
+    agri_year, season = divmod(int(key), 3)
+    first = np.datetime64(f"{agri_year}-01", "M") + _SEASON_START_MONTH[season] - 1
+    last = np.datetime64(f"{agri_year}-01", "M") + _SEASON_END_MONTH[season]
+    return int(to_days(first)), int(to_days(last)) - 1
+
+
+def period_label(level: str, key: int) -> str:
+    if level == "weekly":
+        return str(np.datetime64(int(key), "D"))
+    if level == "monthly":
+        return str(np.datetime64("1970-01", "M") + int(key))
+    agri_year, season = divmod(int(key), 3)
+    return f"{agri_year}-{SEASONS[season]}"
+
+
+def compute_rollups(level: str, day: np.ndarray, crop: np.ndarray, price: np.ndarray, demand: np.ndarray) -> pd.DataFrame:
+    """
+    Rollup rows indexed by (crop, period) for deduplicated rows sorted by (crop, day).
+
+    Volatility is the standard deviation of day-over-day log price returns within the
+    period.
+    """
+    period = period_keys(level, day)
+    df = pd.DataFrame({"crop": crop, "period": period, "price": price, "demand": demand})
+    returns = np.diff(np.log(price.astype(np.float64)), prepend=np.nan)
+    # A return is only meaningful between two days of the same crop and period
+    same = np.zeros(len(day), dtype=bool)
+    same[1:] = (crop[1:] == crop[:-1]) & (period[1:] == period[:-1])
+    df["ret"] = np.where(same, returns, np.nan)
+    grouped = df.groupby(["crop", "period"], sort=True)
+    return pd.DataFrame({
+        "mean": grouped["price"].mean(),
+        "min": grouped["price"].min(),
+        "max": grouped["price"].max(),
+        "volatility": grouped["ret"].std(),
+        "demand_mean": grouped["demand"].mean(),
+        "count": grouped["price"].size(),
+    })
+
+
+class MarketTimeSeriesStore:
+    """Month-partitioned, append-only column files with precomputed rollups"""
+
+    def __init__(self, root: str = MARKET_TS_DIR, sync_interval: float = MARKET_TS_SYNC_INTERVAL):
+        started = time.perf_counter()
+        self.root = root
+        self.sync_interval = sync_interval
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_file = open(os.path.join(root, ".lock"), "a+b")
+        self._lock_depth = 0
+        self._maps: Dict[Tuple[str, str], Tuple[int, np.ndarray]] = {}
+        self._crops_path = os.path.join(root, "crops.json")
+        self._crops_mtime: Optional[int] = None
+        self.crops: List[str] = []
+        self.crop_ids: Dict[str, int] = {}
+        self._load_crops()
+        # Whole rows per segment already folded into the rollups
+        self._sizes: Dict[str, int] = {}
+        self._synced_at = time.monotonic()
+        self.version = 0
+        self.stats = {"appends": 0, "rows_appended": 0, "external_syncs": 0, "queries": 0, "segments_scanned": 0}
+        self.rollups: Dict[str, pd.DataFrame] = {}
+        self._rebuild_rollups()
+        self.load_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Market time series opened: {self.row_count()} rows in {len(self.segments())} segments")
+
+    # Segments
+
+    def segments(self) -> List[str]:
+        """Segment names (YYYY-MM) in chronological order"""
+        return sorted(
+            name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def _segment_path(self, segment: str, column: str) -> str:
+        return os.path.join(self.root, segment, f"{column}.bin")
+
+    def _column(self, segment: str, column: str) -> np.ndarray:
+        """Memory-mapped column, remapped only when the file has grown"""
+        path = self._segment_path(segment, column)
+        dtype = COLUMNS[column]
+        size = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        cached = self._maps.get((segment, column))
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        array = np.memmap(path, dtype=dtype, mode="r", shape=(size,)) if size else np.empty(0, dtype=dtype)
+        self._maps[(segment, column)] = (size, array)
+        return array
+
+    def _read_segment(self, segment: str) -> Dict[str, np.ndarray]:
+        columns = {name: self._column(segment, name) for name in COLUMNS}
+        # A torn append leaves columns of different lengths; only whole rows count
+        rows = min(len(a) for a in columns.values())
+        return {name: a[:rows] for name, a in columns.items()}
+
+    def row_count(self) -> int:
+        return sum(len(self._read_segment(s)["day"]) for s in self.segments())
+
+    def _segment_sizes(self) -> Dict[str, int]:
+        """Whole rows per segment; `day` is written last, so its length is the row count"""
+        itemsize = COLUMNS["day"].itemsize
+        sizes = {}
+        for segment in self.segments():
+            path = self._segment_path(segment, "day")
+            sizes[segment] = os.path.getsize(path) // itemsize if os.path.exists(path) else 0
+        return sizes
+
+    # Crop registry
+
+    def _load_crops(self):
+        """Re-read the crop registry if another process extended it (names are only ever added)"""
+        try:
+            mtime = os.stat(self._crops_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._crops_mtime:
+            return
+        with open(self._crops_path, encoding="utf-8") as f:
+            self.crops = json.load(f)
+        self.crop_ids = {name: i for i, name in enumerate(self.crops)}
+        self._crops_mtime = mtime
+
+    def lookup_crops(self, names: Sequence[str]) -> np.ndarray:
+        """Dense ids for crop names, -1 for names never stored; reads never register names"""
+        self.sync()
+        return np.fromiter((self.crop_ids.get(name, -1) for name in names), dtype=np.int16, count=len(names))
+
+    def _register_crops(self, names: Sequence[str]) -> np.ndarray:
+        """Dense ids for crop names, adding new ones to the registry in one write (under the write lock)"""
+        self._load_crops()
+        new = [name for name in dict.fromkeys(names) if name not in self.crop_ids]
+        if new:
+            for name in new:
+                self.crop_ids[name] = len(self.crops)
+                self.crops.append(name)
+            tmp = self._crops_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.crops, f)
+            os.replace(tmp, self._crops_path)
+            self._crops_mtime = os.stat(self._crops_path).st_mtime_ns
+        return np.fromiter((self.crop_ids[name] for name in names), dtype=np.int16, count=len(names))
+
+    # Writes
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusive write access across threads and the processes sharing the directory (reentrant)"""
+        with self._lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1 and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def sync(self, force: bool = False):
+        """
+        Fold in rows other processes appended since the last check (at most every
+        `sync_interval` seconds unless forced): reload the crop registry and refresh
+        the rollups of the periods the new rows fall in.
+        """
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        with self._lock:
+            sizes = self._segment_sizes()
+            if sizes == self._sizes:
+                return
+            self._load_crops()
+            if any(sizes.get(segment, 0) < rows for segment, rows in self._sizes.items()):
+                # Rows went away (torn rows cut back, files replaced): start over
+                self._maps.clear()
+                self._rebuild_rollups()
+            else:
+                days = [
+                    np.asarray(self._column(segment, "day")[self._sizes.get(segment, 0):rows])
+                    for segment, rows in sizes.items()
+                    if rows != self._sizes.get(segment, 0)
+                ]
+                self._update_rollups(np.concatenate(days))
+                self._sizes = sizes
+            self.version += 1
+            self.stats["external_syncs"] += 1
+
+    def _truncate_torn_rows(self, segment: str):
+        """Cut every column back to the last whole row before appending after a crash"""
+        rows = len(self._read_segment(segment)["day"])
+        for name, dtype in COLUMNS.items():
+            path = self._segment_path(segment, name)
+            if os.path.exists(path) and os.path.getsize(path) > rows * dtype.itemsize:
+                os.truncate(path, rows * dtype.itemsize)
+                self._maps.pop((segment, name), None)
+
+    def append(
+        self,
+        crops: Sequence[str],
+        days,
+        prices: Sequence[float],
+        demand: Optional[Sequence[float]] = None,
+    ) -> int:
+        """
+        Append observations (one per crop/day, prices > 0) and refresh the rollups of
+        the periods they fall in. A later observation for the same crop and day
+        supersedes earlier ones. Returns the number of rows written.
+        """
+        day = to_days(days)
+        price = np.asarray(prices, dtype=np.float32)
+        demand_values = np.full(len(day), np.nan, dtype=np.float32) if demand is None else np.asarray(demand, dtype=np.float32)
+        if not (len(crops) == len(day) == len(price) == len(demand_values)):
+            raise ValueError("crops, days, prices and demand must have the same length")
+        if not np.all(price > 0):
+            # Volatility takes log returns, which are undefined for zero and negative prices
+            raise ValueError("prices must be positive")
+        if len(day) == 0:
+            return 0
+
+        with self.locked():
+            # Rollups must include other processes' rows before this append's periods are recomputed
+            self.sync(force=True)
+            crop = self._register_crops(list(crops))
+            month = _months(day)
+            for m in np.unique(month):
+                rows = month == m
+                segment = str(np.datetime64("1970-01", "M") + int(m))
+                os.makedirs(os.path.join(self.root, segment), exist_ok=True)
+                self._truncate_torn_rows(segment)
+                # `day` goes last so a crash mid-append leaves no visible partial row
+                for name, values in (("demand", demand_values), ("price", price), ("crop", crop), ("day", day)):
+                    with open(self._segment_path(segment, name), "ab") as f:
+                        f.write(values[rows].astype(COLUMNS[name]).tobytes())
+            self._update_rollups(day)
+            self._sizes = self._segment_sizes()
+            self.version += 1
+            self.stats["appends"] += 1
+            self.stats["rows_appended"] += int(len(day))
+        return int(len(day))
+
+    # Reads
+
+    def read(self, start_day: int, end_day: int, crop_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """
+        Rows with start_day <= day <= end_day, deduplicated per (crop, day) and sorted
+        by (crop, day). Only the month segments overlapping the range are opened.
+        """
+        first, last = (str(np.datetime64(int(d), "D").astype("datetime64[M]")) for d in (start_day, end_day))
+        parts = []
+        with self._lock:
+            for segment in self.segments():
+                if segment < first or segment > last:
+                    continue
+                self.stats["segments_scanned"] += 1
+                columns = self._read_segment(segment)
+                mask = (columns["day"] >= start_day) & (columns["day"] <= end_day)
+                if crop_ids is not None:
+                    mask &= np.isin(columns["crop"], np.asarray(crop_ids, dtype=np.int16))
+                parts.append({name: np.asarray(a[mask]) for name, a in columns.items()})
+        if not parts:
+            parts.append({name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()})
+
+        merged = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+        if not len(merged["day"]):
+            return merged
+        # Stable sort keeps append order within a (crop, day), so the last write wins
+        order = np.lexsort((merged["day"], merged["crop"]))
+        merged = {name: a[order] for name, a in merged.items()}
+        keep = np.r_[(merged["crop"][1:] != merged["crop"][:-1]) | (merged["day"][1:] != merged["day"][:-1]), True]
+        return {name: a[keep] for name, a in merged.items()}
+
+    def day_range(self) -> Optional[Tuple[int, int]]:
+        segments = self.segments()
+        if not segments:
+            return None
+        first = self._read_segment(segments[0])["day"]
+        last = self._read_segment(segments[-1])["day"]
+        if not len(first) or not len(last):
+            return None
+        return int(first.min()), int(last.max())
+
+    def last_prices(self) -> Dict[str, float]:
+        """Most recent stored price per crop name"""
+        span = self.day_range()
+        if span is None:
+            return {}
+        rows = self.read(span[0], span[1])
+        last = np.r_[rows["crop"][1:] != rows["crop"][:-1], True]
+        return {self.crops[int(c)]: float(p) for c, p in zip(rows["crop"][last], rows["price"][last])}
+
+    # Rollups
+
+    def _rebuild_rollups(self):
+        self._sizes = self._segment_sizes()
+        span = self.day_range()
+        rows = self.read(*span) if span else self.read(0, -1)
+        for level in ROLLUP_LEVELS:
+            self.rollups[level] = compute_rollups(level, rows["day"], rows["crop"], rows["price"], rows["demand"])
+
+    def _update_rollups(self, days: np.ndarray):
+        """Recompute only the periods touched by newly appended days"""
+        for level in ROLLUP_LEVELS:
+            keys = np.unique(period_keys(level, days))
+            start_day = min(period_day_range(level, int(k))[0] for k in keys)
+            end_day = max(period_day_range(level, int(k))[1] for k in keys)
+            rows = self.read(start_day, end_day)
+            fresh = compute_rollups(level, rows["day"], rows["crop"], rows["price"], rows["demand"])
+            fresh = fresh[fresh.index.get_level_values("period").isin(keys)]
+            table = self.rollups[level]
+            stale = table.index.get_level_values("period").isin(keys)
+            self.rollups[level] = pd.concat([table[~stale], fresh]).sort_index()
+
+    def rollup(
+        self,
+        level: str,
+        start_day: Optional[int] = None,
+        end_day: Optional[int] = None,
+        crop_ids: Optional[Sequence[int]] = None,
+    ) -> pd.DataFrame:
+        """Precomputed rollup rows for periods overlapping [start_day, end_day]"""
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"Unknown rollup level {level}; expected one of {ROLLUP_LEVELS}")
+        self.sync()
+        self.stats["queries"] += 1
+        table = self.rollups[level]
+        periods = table.index.get_level_values("period")
+        mask = np.ones(len(table), dtype=bool)
+        if start_day is not None:
+            mask &= periods >= period_keys(level, np.array([start_day], dtype=np.int32))[0]
+        if end_day is not None:
+            mask &= periods <= period_keys(level, np.array([end_day], dtype=np.int32))[0]
+        if crop_ids is not None:
+            mask &= table.index.get_level_values("crop").isin(crop_ids)
+        return table[mask]
+
+    def get_stats(self) -> Dict[str, object]:
+        segments = self.segments()
+        span = self.day_range()
+        return {
+            "path": self.root,
+            "segments": len(segments),
+            "rows": self.row_count(),
+            "crops": len(self.crops),
+            "first_day": str(np.datetime64(span[0], "D")) if span else None,
+            "last_day": str(np.datetime64(span[1], "D")) if span else None,
+            "version": self.version,
+            "rollup_rows": {level: len(table) for level, table in self.rollups.items()},
+            "load_ms": round(self.load_ms, 2),
+            **self.stats,
+        }
+
+
+# Global instance
+market_ts_store = None
+
+def get_market_ts_store() -> MarketTimeSeriesStore:
+    """Get the global market time-series store instance"""
+    global market_ts_store
+    if market_ts_store is None:
+        market_ts_store = MarketTimeSeriesStore()
+    return market_ts_store
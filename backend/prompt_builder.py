@@ -0,0 +1,157 @@
+"""
+Prompt Builder
+Assembles chatbot prompts within a token budget: tokens are estimated locally, the
+newest turns that fit the history budget are sent as they are, and older turns are
+folded, once each, into a rolling summary cached on the session and sent in their place
+"""
+
+import os
+import re
+import math
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "300"))
+# Characters of each older message kept in its summary line
+SUMMARY_LINE_CHARS = 160
+# Chat format overhead per message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Words; Indic letters are matched by block (minus the dandas) since \w misses their vowel signs and viramas
+_PIECES = re.compile(r"[\w\u0900-\u0963\u0966-\u0dff]+|[^\w\s]")
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """
+    BPE-like token estimate without a tokenizer: about four characters per token for
+    ASCII words, two for other scripts (Devanagari splits much finer), one per symbol
+    """
+    tokens = 0
+    for piece in _PIECES.findall(text):
+        if piece.isascii():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece[0].isalnum() or piece[0] == "_":
+            tokens += math.ceil(len(piece) / 2)
+        else:
+            tokens += 1
+    return tokens
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def summary_line(role: str, content: str) -> str:
+    """First sentence of a message, clipped: 'User: how do I treat blast in rice?'"""
+    text = " ".join(content.split())
+    sentence = re.split(r"(?<=[.!?।])\s", text, maxsplit=1)[0]
+    if len(sentence) > SUMMARY_LINE_CHARS:
+        sentence = sentence[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return f"{'User' if role == 'user' else 'Assistant'}: {sentence}"
+
+
+class PromptBuilder:
+    """Fits conversation history into a token budget and keeps prompt size statistics"""
+
+    def __init__(
+        self,
+        history_budget: int = PROMPT_HISTORY_TOKENS,
+        summary_budget: int = PROMPT_SUMMARY_TOKENS,
+        max_messages: Optional[int] = None,
+    ):
+        self.history_budget = history_budget
+        self.summary_budget = summary_budget
+        self.max_messages = max_messages
+        self.stats = {"prompts": 0, "prompt_tokens": 0, "unbudgeted_tokens": 0, "summarized_messages": 0, "summary_updates": 0}
+        self.samples: Deque[int] = deque(maxlen=1000)
+
+    def _fold(self, session, older: Sequence[Tuple[int, Any]]):
+        """Add messages past the cached summary to it, dropping its oldest lines beyond the budget"""
+        new = [(index, m) for index, m in older if index >= session.summary_upto]
+        if not new:
+            return
+        session.summary.extend(summary_line(m.role, m.content) for _, m in new)
+        session.summary_upto = new[-1][0] + 1
+        while len(session.summary) > 1 and sum(estimate_tokens(line) + 1 for line in session.summary) > self.summary_budget:
+            session.summary.pop(0)
+        self.stats["summarized_messages"] += len(new)
+        self.stats["summary_updates"] += 1
+
+    def build(
+        self,
+        session,
+        system_messages: List[Dict[str, str]],
+        user_message: str,
+        use_history: bool = True,
+    ) -> List[Dict[str, str]]:
+        """
+        System messages, then the summary of older turns (if any), the newest turns
+        that fit the history budget, and the current user message
+        """
+        # Absolute index of each buffered message, so summaries survive buffer overflow
+        first_index = session.message_count - len(session.messages)
+        history = [(first_index + i, m) for i, m in enumerate(session.messages) if m.role in ("user", "assistant")]
+        # The current message is already in the session; it is sent last, once
+        if history and history[-1][1].role == "user" and history[-1][1].content == user_message:
+            history.pop()
+        if not use_history:
+            history = []
+
+        kept: List[Dict[str, str]] = []
+        used = 0
+        cut = len(history)
+        for position in range(len(history) - 1, -1, -1):
+            index, turn = history[position]
+            message = {"role": turn.role, "content": turn.content}
+            tokens = message_tokens(message)
+            # Turns already in the summary are not sent again
+            if index < session.summary_upto or used + tokens > self.history_budget:
+                break
+            if self.max_messages and len(kept) >= self.max_messages:
+                break
+            kept.append(message)
+            used += tokens
+            cut = position
+        kept.reverse()
+        if cut:
+            self._fold(session, history[:cut])
+
+        messages = list(system_messages)
+        if session.summary and history:
+            messages.append({"role": "system", "content": "Earlier in this conversation:\n" + "\n".join(session.summary)})
+        messages.extend(kept)
+        messages.append({"role": "user", "content": user_message})
+
+        prompt_tokens = sum(map(message_tokens, messages))
+        # What the same request costs with the most recent max_messages turns and no budget
+        recent = history[-self.max_messages:] if self.max_messages else history
+        unbudgeted = sum(map(message_tokens, system_messages)) + sum(
+            estimate_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for _, m in recent
+        ) + estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+        self.stats["prompts"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["unbudgeted_tokens"] += max(unbudgeted, prompt_tokens)
+        self.samples.append(prompt_tokens)
+        return messages
+
+    def get_stats(self) -> Dict[str, Any]:
+        prompts = self.stats["prompts"]
+        ordered = sorted(self.samples)
+
+        def percentile(q: float) -> Optional[int]:
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+        saved = self.stats["unbudgeted_tokens"] - self.stats["prompt_tokens"]
+        return {
+            "history_budget_tokens": self.history_budget,
+            "summary_budget_tokens": self.summary_budget,
+            **self.stats,
+            "avg_prompt_tokens": round(self.stats["prompt_tokens"] / prompts, 1) if prompts else 0.0,
+            "p50_prompt_tokens": percentile(0.5),
+            "p95_prompt_tokens": percentile(0.95),
+            "tokens_saved": saved,
+            "tokens_saved_pct": round(100 * saved / self.stats["unbudgeted_tokens"], 1) if prompts else 0.0,
+        }
@@ -0,0 +1,213 @@
+"""
+Rate Limiting
+Sliding-window counters per (route, client): each check is O(1) (the current and
+previous window counts, weighted by how far into the current window we are), idle
+keys are evicted, and limits are configured per route. Counters live in process
+memory or on a Redis-protocol server so that limits hold across workers
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from resp_client import RespClient
+
+logger = logging.getLogger(__name__)
+
+ENABLE_RATE_LIMITING = os.getenv("ENABLE_RATE_LIMITING", "1") == "1"
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "redis://localhost:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Comma-separated route=requests/seconds overrides, e.g. "predict=60/60,weather=120/60"
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+
+DEFAULT_RATE_LIMITS = {
+    "chatbot": (int(os.getenv("MAX_REQUESTS_PER_MINUTE", "30")), 60.0),
+    "predict": (60, 60.0),
+    "weather": (120, 60.0),
+}
+
+
+@dataclass
+class RateLimit:
+    limit: int
+    window: float
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float = 0.0
+
+
+def parse_rate_limits(spec: str) -> Dict[str, RateLimit]:
+    limits = {route: RateLimit(limit, window) for route, (limit, window) in DEFAULT_RATE_LIMITS.items()}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            route, rule = item.split("=", 1)
+            count, seconds = rule.split("/", 1)
+            limits[route.strip()] = RateLimit(int(count), float(seconds))
+        except ValueError:
+            logger.warning(f"Ignoring malformed RATE_LIMITS entry {item!r}")
+    return limits
+
+
+def _decide(current: int, previous: int, now: float, limit: RateLimit) -> Decision:
+    """Sliding-window estimate from the two fixed-window counts (`current` excludes this request)"""
+    elapsed = now / limit.window % 1.0
+    estimate = current + previous * (1.0 - elapsed)
+    if estimate < limit.limit:
+        return Decision(True, limit.limit, max(0, int(limit.limit - estimate - 1)))
+    # When the estimate next drops below the limit: later in this window if the
+    # previous window's share is what exceeds it, otherwise some way into the next one
+    if current < limit.limit and previous:
+        wait = (1.0 - (limit.limit - current) / previous) - elapsed
+    else:
+        wait = (1.0 - elapsed) + max(0.0, 1.0 - limit.limit / max(current, 1))
+    # The estimate only drops below the limit just after that instant
+    return Decision(False, limit.limit, 0, round(max(wait, 0.0) * limit.window + 0.001, 3))
+
+
+class MemoryCounterStore:
+    """
+    Window counters in a touch-ordered dict; keys idle for two windows are evicted.
+    Counters are per process: each worker enforces every limit on its own.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [window index, current count, previous count, expires at]
+        self.counters: "OrderedDict[str, list]" = OrderedDict()
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, limit: RateLimit, now: float) -> Decision:
+        index = int(now // limit.window)
+        with self._lock:
+            entry = self.counters.pop(key, None)
+            if entry is None or entry[0] < index - 1:
+                entry = [index, 0, 0, 0.0]
+            elif entry[0] == index - 1:
+                entry = [index, 0, entry[1], 0.0]
+            decision = _decide(entry[1], entry[2], now, limit)
+            if decision.allowed:
+                entry[1] += 1
+            entry[3] = (index + 2) * limit.window
+            self.counters[key] = entry
+            self._evict(now)
+        return decision
+
+    def _evict(self, now: float):
+        # Least recently touched keys are at the front: stop at the first live one
+        while self.counters:
+            key, entry = next(iter(self.counters.items()))
+            if entry[3] > now and len(self.counters) <= self.max_keys:
+                break
+            del self.counters[key]
+            self.evicted += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"shared": False, "keys": len(self.counters), "max_keys": self.max_keys, "evicted": self.evicted}
+
+
+class RedisCounterStore:
+    """One counter key per window on a Redis-protocol server, shared by every worker"""
+
+    name = "redis"
+    prefix = "cropgpt:ratelimit:"
+
+    def __init__(self, url: str = RATE_LIMIT_URL):
+        self.client = RespClient(url)
+
+    def acquire(self, key: str, limit: RateLimit, now: float) -> Decision:
+        index = int(now // limit.window)
+        current_key = f"{self.prefix}{key}:{index}"
+        count, _, previous = self.client.pipeline([
+            ("INCR", current_key),
+            # Keys expire on their own once they can no longer be a previous window
+            ("PEXPIRE", current_key, int(limit.window * 2000)),
+            ("GET", f"{self.prefix}{key}:{index - 1}"),
+        ])
+        if isinstance(count, Exception):
+            raise count
+        decision = _decide(count - 1, int(previous or 0), now, limit)
+        if not decision.allowed:
+            # Rejected requests do not use up the window
+            self.client.pipeline([("DECR", current_key)])
+        return decision
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"shared": True, "server": f"{self.client.host}:{self.client.port}"}
+
+
+class RateLimiter:
+    """Per-route limits over a counter store; fails open if a shared store is unreachable"""
+
+    def __init__(self, limits: Dict[str, RateLimit], store, enabled: bool = ENABLE_RATE_LIMITING):
+        self.limits = limits
+        self.store = store
+        self.enabled = enabled
+        self.stats: Dict[str, Dict[str, int]] = {route: {"allowed": 0, "rejected": 0} for route in limits}
+        self.store_errors = 0
+
+    def check(self, route: str, identifier: str) -> Decision:
+        limit = self.limits.get(route)
+        if not self.enabled or limit is None:
+            return Decision(True, 0, 0)
+        try:
+            decision = self.store.acquire(f"{route}:{identifier}", limit, time.time())
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning(f"Rate limit store unavailable, allowing request: {e}")
+            return Decision(True, limit.limit, limit.limit)
+        self.stats[route]["allowed" if decision.allowed else "rejected"] += 1
+        return decision
+
+    async def acquire(self, route: str, identifier: str) -> Decision:
+        """`check` for async callers; network-backed stores run off the event loop"""
+        if isinstance(self.store, MemoryCounterStore):
+            return self.check(route, identifier)
+        return await asyncio.to_thread(self.check, route, identifier)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "store": self.store.name,
+            "limits": {route: f"{l.limit}/{l.window:g}s" for route, l in self.limits.items()},
+            "routes": self.stats,
+            "store_errors": self.store_errors,
+            **self.store.get_stats(),
+        }
+
+
+def retry_after_header(decision: Decision) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(decision.retry_after)))}
+
+
+# Global instance
+rate_limiter = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the global rate limiter instance"""
+    global rate_limiter
+    if rate_limiter is None:
+        if RATE_LIMIT_STORE == "redis":
+            store = RedisCounterStore()
+        else:
+            store = MemoryCounterStore()
+            logger.info(
+                "Rate limit counters are kept in this process: with several workers each one "
+                "allows the full limit; set RATE_LIMIT_STORE=redis to share them"
+            )
+        rate_limiter = RateLimiter(parse_rate_limits(RATE_LIMITS), store)
+    return rate_limiter
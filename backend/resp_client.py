@@ -0,0 +1,111 @@
+"""
+RESP Client
+Minimal blocking client for the Redis serialization protocol: one persistent socket,
+pipelined commands and lazy reconnects. Enough for the session store and the shared
+rate-limit counters without pulling in a Redis library
+"""
+
+import socket
+import threading
+from typing import Any, List, Optional, Sequence
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from the server (e.g. WRONGTYPE) or a protocol violation"""
+
+
+class RespClient:
+    """Thread-safe connection to a Redis-protocol server given as redis://host:port/db"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock, self._reader = sock, sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._roundtrip(setup)
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._reader.close()
+                self._sock.close()
+                self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args: Sequence[Any]) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            return RespError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = self._reader.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [self._read_reply() for _ in range(size)]
+        raise RespError(f"Unexpected reply type {kind!r}")
+
+    def _roundtrip(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        self._sock.sendall(b"".join(self._encode(c) for c in commands))
+        return [self._read_reply() for _ in commands]
+
+    def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Send every command in one write and read all replies; error replies are
+        returned in place as RespError instances. Reconnects once on a dropped socket.
+        """
+        if not commands:
+            return []
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(commands)
+                except (ConnectionError, OSError):
+                    if self._sock is not None:
+                        self._reader.close()
+                        self._sock.close()
+                        self._sock = self._reader = None
+                    if attempt:
+                        raise
+
+    def execute(self, *args: Any) -> Any:
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
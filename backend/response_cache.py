@@ -0,0 +1,261 @@
+"""
+Chatbot Response Cache
+Answers to frequent questions, matched by similarity instead of exact text: questions
+are normalized and turned into hashed word and word-pair TF-IDF vectors locally, and a
+new question is served a stored answer when its cosine similarity to a cached question
+in the same scope (language, and a digest of the rest of the prompt) clears a threshold.
+Prompts carrying anything of one session are never cached. An inverted index over the
+rarest terms keeps lookups well under a millisecond
+"""
+
+import os
+import math
+import time
+import zlib
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Dict, Optional, Set, Tuple
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.9"))
+# Candidates come from the postings of this many of the question's rarest terms
+CANDIDATE_TERMS = 3
+MAX_CANDIDATES = 64
+
+Scope = Tuple[str, str]
+
+
+# Filler words that change phrasing but not the question (en, hi, mr)
+STOPWORDS = frozenset("""
+a an the is are am was were be i me my we our you your it this that these those please pls
+can could would should will do does did to of in on at for with about tell what which
+का की के है हैं में से को और क्या मैं मुझे हम कृपया बताइए बताओ ये यह वह
+आहे आहेत चा ची चे ला मी मला आम्ही कृपया काय आणि सांगा हा ही हे
+""".split())
+
+
+def normalize_question(text: str) -> str:
+    """
+    NFKC, lowercase, punctuation, symbols and filler words removed, simple English
+    plurals folded: 'What is the best crop for black soil?' -> 'best crop black soil'
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    # Drop punctuation/symbols but keep combining marks, which Devanagari words need
+    kept = "".join(" " if unicodedata.category(ch)[0] in "PSZC" else ch for ch in text)
+    words = []
+    for word in kept.split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss") and word.isascii():
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def question_terms(normalized: str) -> Dict[int, int]:
+    """Term frequencies of hashed words and adjacent word pairs"""
+    words = normalized.split()
+    terms: Dict[int, int] = defaultdict(int)
+    for word in words:
+        terms[zlib.crc32(word.encode())] += 1
+    for first, second in zip(words, words[1:]):
+        terms[zlib.crc32(f"{first} {second}".encode())] += 1
+    return dict(terms)
+
+
+@dataclass
+class CachedAnswer:
+    entry_id: int
+    scope: Scope
+    question: str
+    terms: Dict[int, int]
+    answer: str
+    metadata: Dict[str, Any]
+    created: float
+    hits: int = 0
+    # TF-IDF norm and the cache generation it was computed for
+    norm: float = 0.0
+    norm_generation: int = -1
+
+
+class ResponseCache:
+    """Bounded, TTL'd similarity cache of chatbot answers"""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        threshold: float = RESPONSE_CACHE_THRESHOLD,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.enabled = enabled
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self.exact: Dict[Tuple[Scope, str], int] = {}
+        self.postings: Dict[Tuple[Scope, int], Set[int]] = defaultdict(set)
+        # Document frequency of each term over the cached questions, for IDF weights
+        self.doc_freq: Dict[int, int] = defaultdict(int)
+        self._next_id = 0
+        # IDF weights and entry norms are memoized until the cached set changes
+        self._generation = 0
+        self._idf_memo: Dict[int, float] = {}
+        self.stats = {
+            "lookups": 0, "hits": 0, "exact_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0,
+            "uncacheable": 0,
+        }
+        self._lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _changed(self):
+        self._generation += 1
+        self._idf_memo.clear()
+
+    def _idf(self, term: int) -> float:
+        weight = self._idf_memo.get(term)
+        if weight is None:
+            weight = math.log((1 + len(self.entries)) / (1 + self.doc_freq.get(term, 0))) + 1.0
+            self._idf_memo[term] = weight
+        return weight
+
+    def _norm(self, terms: Dict[int, int]) -> float:
+        return math.sqrt(sum((tf * self._idf(t)) ** 2 for t, tf in terms.items()))
+
+    def _entry_norm(self, entry: CachedAnswer) -> float:
+        if entry.norm_generation != self._generation:
+            entry.norm, entry.norm_generation = self._norm(entry.terms), self._generation
+        return entry.norm
+
+    def _remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id)
+        self._changed()
+        self.exact.pop((entry.scope, entry.question), None)
+        for term in entry.terms:
+            key = (entry.scope, term)
+            postings = self.postings[key]
+            postings.discard(entry_id)
+            if not postings:
+                del self.postings[key]
+            self.doc_freq[term] -= 1
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+
+    def _live(self, entry: CachedAnswer, now: float) -> bool:
+        if now - entry.created <= self.ttl:
+            return True
+        self._remove(entry.entry_id)
+        self.stats["expired"] += 1
+        return False
+
+    def _hit(self, entry: CachedAnswer, similarity: float, exact: bool) -> Tuple[str, Dict[str, Any]]:
+        entry.hits += 1
+        self.entries.move_to_end(entry.entry_id)
+        self.stats["hits"] += 1
+        if exact:
+            self.stats["exact_hits"] += 1
+        return entry.answer, {**entry.metadata, "cache_similarity": round(similarity, 4)}
+
+    def lookup(self, question: str, language: str, context: Optional[str]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        (answer, metadata) of the most similar live cached question in scope, or None.
+        `context` is a digest of the prompt besides the question; None marks a prompt with
+        per-session context, which is never answered from the cache
+        """
+        if not self.enabled:
+            return None
+        if context is None:
+            self.stats["uncacheable"] += 1
+            return None
+        started = time.perf_counter()
+        self.stats["lookups"] += 1
+        try:
+            scope = (language, context)
+            now = time.time()
+            normalized = normalize_question(question)
+            exact_id = self.exact.get((scope, normalized))
+            if exact_id is not None and self._live(self.entries[exact_id], now):
+                return self._hit(self.entries[exact_id], 1.0, True)
+
+            terms = question_terms(normalized)
+            if not terms:
+                self.stats["misses"] += 1
+                return None
+            # A match above the threshold shares nearly all of the question's weight,
+            # so it must contain at least one of its rarest terms that are cached at all
+            candidates: Set[int] = set()
+            looked_up = 0
+            for term in sorted(terms, key=self._idf, reverse=True):
+                postings = self.postings.get((scope, term))
+                if not postings:
+                    continue
+                candidates.update(islice(postings, MAX_CANDIDATES - len(candidates)))
+                looked_up += 1
+                if looked_up == CANDIDATE_TERMS or len(candidates) >= MAX_CANDIDATES:
+                    break
+
+            query_norm = self._norm(terms)
+            best, best_score = None, 0.0
+            for entry_id in candidates:
+                entry = self.entries[entry_id]
+                dot = sum(tf * entry.terms[t] * self._idf(t) ** 2 for t, tf in terms.items() if t in entry.terms)
+                score = dot / (query_norm * self._entry_norm(entry) or 1.0)
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is not None and best_score >= self.threshold and self._live(best, now):
+                return self._hit(best, best_score, False)
+            self.stats["misses"] += 1
+            return None
+        finally:
+            self._lookup_seconds += time.perf_counter() - started
+
+    def store(self, question: str, language: str, context: Optional[str], answer: str, metadata: Optional[Dict[str, Any]] = None):
+        """Cache an answer; an identical (normalized) question in the same scope is replaced"""
+        if not self.enabled or context is None:
+            return
+        scope = (language, context)
+        normalized = normalize_question(question)
+        terms = question_terms(normalized)
+        if not terms:
+            return
+        previous = self.exact.get((scope, normalized))
+        if previous is not None:
+            self._remove(previous)
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = CachedAnswer(entry_id, scope, normalized, terms, answer, metadata or {}, time.time())
+        self.exact[(scope, normalized)] = entry_id
+        self._changed()
+        for term in terms:
+            self.postings[(scope, term)].add(entry_id)
+            self.doc_freq[term] += 1
+        self.stats["stores"] += 1
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._changed()
+        self.entries.clear()
+        self.exact.clear()
+        self.postings.clear()
+        self.doc_freq.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "threshold": self.threshold,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "avg_lookup_us": round(self._lookup_seconds / lookups * 1e6, 1) if lookups else 0.0,
+            **self.stats,
+        }
@@ -0,0 +1,485 @@
+"""
+Chatbot Session Store
+Bounded in-memory LRU of conversation sessions in front of an optional durable
+backend (SQLite in WAL mode, or any Redis-protocol server). Sessions are loaded lazily
+on first access and written through in batches, so memory stays flat no matter how
+many sessions exist and a restart or another worker sees the same conversations
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from resp_client import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH") or os.path.join(BASE_DIR, "data", "sessions.db")
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "redis://localhost:6379/0")
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_MAX_SESSIONS", "10000"))
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Seconds a cached session is trusted before it is re-read from a shared backend
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(7 * 24 * 3600)))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "256"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+
+class SessionBackend:
+    """Durable storage for serialized sessions, keyed by session id"""
+
+    name = "none"
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def save_many(self, items: Dict[str, Tuple[bytes, float]]):
+        """Upsert {session_id: (data, last_activity_epoch)} in one batch"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def count(self) -> Optional[int]:
+        return None
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """One row per session in a WAL-mode SQLite file; safe to share between workers"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = SESSION_STORE_PATH, idle_ttl: float = SESSION_IDLE_TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, last_activity REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions (last_activity)")
+        # Rows in the file, counted once here and kept up to date by this worker's writes;
+        # the idle purge recounts, picking up sessions written by other workers
+        self.stored = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND last_activity >= ?",
+                (session_id, time.time() - self.idle_ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, items: Dict[str, Tuple[bytes, float]]):
+        rows = [(sid, data, ts) for sid, (data, ts) in items.items()]
+        ids = list(items)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                existing = 0
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    existing += self._conn.execute(
+                        f"SELECT COUNT(*) FROM sessions WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT INTO sessions (id, data, last_activity) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, last_activity = excluded.last_activity",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stored += len(ids) - existing
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount
+            self.stored -= deleted
+        return deleted > 0
+
+    def purge_idle(self) -> int:
+        """Delete sessions idle beyond the TTL; returns how many were removed"""
+        with self._lock:
+            purged = self._conn.execute(
+                "DELETE FROM sessions WHERE last_activity < ?", (time.time() - self.idle_ttl,)
+            ).rowcount
+            self.stored = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return purged
+
+    def count(self) -> Optional[int]:
+        return self.stored
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionBackend(SessionBackend):
+    """Sessions as string keys with the idle TTL as their expiry, on a Redis-protocol server"""
+
+    name = "redis"
+    prefix = "cropgpt:session:"
+
+    def __init__(self, url: str = SESSION_STORE_URL, idle_ttl: float = SESSION_IDLE_TTL):
+        self.client = RespClient(url)
+        self.idle_ttl = idle_ttl
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        return self.client.execute("GET", self.prefix + session_id)
+
+    def save_many(self, items: Dict[str, Tuple[bytes, float]]):
+        now = time.time()
+        commands = [
+            ("SET", self.prefix + sid, data, "EX", max(1, int(self.idle_ttl - (now - ts))))
+            for sid, (data, ts) in items.items()
+        ]
+        errors = [r for r in self.client.pipeline(commands) if isinstance(r, RespError)]
+        if errors:
+            raise errors[0]
+
+    def delete(self, session_id: str) -> bool:
+        return self.client.execute("DEL", self.prefix + session_id) > 0
+
+    def close(self):
+        self.client.close()
+
+
+def create_backend(kind: str = SESSION_STORE) -> Optional[SessionBackend]:
+    """Backend named by SESSION_STORE: memory (none), sqlite or redis"""
+    if kind == "sqlite":
+        return SQLiteSessionBackend()
+    if kind == "redis":
+        return RedisSessionBackend()
+    if kind != "memory":
+        logger.warning(f"Unknown SESSION_STORE {kind!r}, keeping sessions in memory only")
+    return None
+
+
+# Markers for SessionStore._cached: the session has gone idle / is not cached
+_EXPIRED = object()
+_MISS = object()
+
+
+class _Entry:
+    __slots__ = ("session", "size", "loaded_at", "touched_at")
+
+    def __init__(self, session: Any, size: int, loaded_at: float):
+        self.session = session
+        self.size = size
+        self.loaded_at = loaded_at
+        self.touched_at = loaded_at
+
+
+class SessionStore:
+    """
+    LRU of live session objects bounded by count and serialized bytes, with idle
+    expiry. With a backend, changed sessions are queued and written in batches (every
+    `flush_interval` seconds or once `flush_batch` are pending), and evicted cache
+    entries, or ones older than `cache_ttl`, are reloaded on their next access; without
+    one, evicted sessions are gone. Sessions held by a request (`hold`/`release`) are
+    never swapped for a reloaded copy, so concurrent turns append to the same object.
+    A background sweep drops cache entries untouched for the idle TTL and purges idle
+    sessions from the backend.
+
+    Sessions are any object with `session_id` and `last_activity` (datetime);
+    `encode` turns one into a JSON-serializable dict and `decode` rebuilds it.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[Any], Dict[str, Any]],
+        decode: Callable[[Dict[str, Any]], Any],
+        backend: Optional[SessionBackend] = None,
+        max_sessions: int = SESSION_CACHE_MAX_SESSIONS,
+        max_bytes: int = SESSION_CACHE_MAX_BYTES,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        cache_ttl: float = SESSION_CACHE_TTL,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        flush_batch: int = SESSION_FLUSH_BATCH,
+        sweep_interval: float = SESSION_SWEEP_INTERVAL,
+    ):
+        self.encode = encode
+        self.decode = decode
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.sweep_interval = sweep_interval
+        self.cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.cache_bytes = 0
+        # Serialized sessions waiting to be written, and the batch currently being written
+        self.pending: Dict[str, Tuple[bytes, float]] = {}
+        self.flushing: Dict[str, Tuple[bytes, float]] = {}
+        # Sessions requests are working on: session_id -> (session, number of holders)
+        self.held: Dict[str, Tuple[Any, int]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "hits": 0, "misses": 0, "loads": 0, "evictions": 0, "expired": 0,
+            "writes": 0, "flushes": 0, "flush_errors": 0, "swept": 0, "purged": 0, "sweeps": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def _encode(self, session: Any) -> bytes:
+        return json.dumps(self.encode(session), ensure_ascii=False, separators=(",", ":")).encode()
+
+    def _insert(self, session_id: str, session: Any, size: int):
+        old = self.cache.pop(session_id, None)
+        if old is not None:
+            self.cache_bytes -= old.size
+        self.cache[session_id] = _Entry(session, size, time.monotonic())
+        self.cache_bytes += size
+        while len(self.cache) > 1 and (len(self.cache) > self.max_sessions or self.cache_bytes > self.max_bytes):
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.size
+            self.stats["evictions"] += 1
+
+    def _drop(self, session_id: str):
+        entry = self.cache.pop(session_id, None)
+        if entry is not None:
+            self.cache_bytes -= entry.size
+
+    def _idle(self, session: Any) -> bool:
+        return time.time() - session.last_activity.timestamp() > self.idle_ttl
+
+    def _load(self, session_id: str) -> Optional[Tuple[Any, int]]:
+        with self._lock:
+            queued = self.pending.get(session_id) or self.flushing.get(session_id)
+        data = queued[0] if queued else (self.backend.load(session_id) if self.backend else None)
+        if data is None:
+            return None
+        self.stats["loads"] += 1
+        return self.decode(json.loads(data)), len(data)
+
+    def _cached(self, session_id: str) -> Any:
+        """
+        The cached session, None if there is none, _EXPIRED if it has gone idle or _MISS
+        when it has to be loaded from the backend first
+        """
+        held = self.held.get(session_id)
+        if held is not None:
+            # In use: never swapped for a reloaded copy, even if expired or evicted
+            self.stats["hits"] += 1
+            return held[0]
+        entry = self.cache.get(session_id)
+        if entry is not None:
+            if self.backend is None or time.monotonic() - entry.loaded_at <= self.cache_ttl:
+                if self._idle(entry.session):
+                    self.stats["expired"] += 1
+                    return _EXPIRED
+                self.cache.move_to_end(session_id)
+                entry.touched_at = time.monotonic()
+                self.stats["hits"] += 1
+                return entry.session
+            self._drop(session_id)
+        self.stats["misses"] += 1
+        return _MISS if self.backend is not None else None
+
+    def _loaded(self, session_id: str, loaded: Optional[Tuple[Any, int]]) -> Any:
+        """Cache a freshly loaded session; None if there was none, _EXPIRED if it has gone idle"""
+        if session_id in self.held:
+            # Taken by a request while this load was in flight
+            return self.held[session_id][0]
+        if loaded is None:
+            return None
+        session, size = loaded
+        if self._idle(session):
+            self.stats["expired"] += 1
+            return _EXPIRED
+        self._insert(session_id, session, size)
+        return session
+
+    def get(self, session_id: str) -> Optional[Any]:
+        """The live session, loading it from the backend on a cache miss"""
+        session = self._cached(session_id)
+        if session is _MISS:
+            session = self._loaded(session_id, self._load(session_id))
+        if session is _EXPIRED:
+            self.delete(session_id)
+            return None
+        return session
+
+    async def aget(self, session_id: str) -> Optional[Any]:
+        """`get` for the event loop: cache hits answer at once, backend reads run in a thread"""
+        session = self._cached(session_id)
+        if session is _MISS:
+            session = self._loaded(session_id, await asyncio.to_thread(self._load, session_id))
+        if session is _EXPIRED:
+            await self.adelete(session_id)
+            return None
+        return session
+
+    def hold(self, session: Any) -> Any:
+        """
+        Mark `session` as in use by a request until the matching `release`: until then
+        every lookup returns this object, never a copy reloaded from the backend whose
+        later save would drop this request's messages. Returns the held object, which is
+        the one already held if another request got there first.
+        """
+        held, holders = self.held.get(session.session_id, (session, 0))
+        self.held[session.session_id] = (held, holders + 1)
+        return held
+
+    def release(self, session_id: str):
+        held, holders = self.held.pop(session_id)
+        if holders > 1:
+            self.held[session_id] = (held, holders - 1)
+
+    def put(self, session: Any):
+        """Record a new or changed session; it is written to the backend with the next batch"""
+        data = self._encode(session)
+        self._insert(session.session_id, session, len(data))
+        self.stats["writes"] += 1
+        if self.backend is None:
+            return
+        with self._lock:
+            self.pending[session.session_id] = (data, session.last_activity.timestamp())
+            full = len(self.pending) >= self.flush_batch
+        if full:
+            try:
+                # Off the event loop when there is one; the batch is written in a thread
+                asyncio.get_running_loop().run_in_executor(None, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def _forget(self, session_id: str) -> bool:
+        """Drop the cached and queued copies; True if there were any"""
+        existed = session_id in self.cache
+        self._drop(session_id)
+        if self.backend is not None:
+            with self._lock:
+                existed = self.pending.pop(session_id, None) is not None or existed
+                self.flushing.pop(session_id, None)
+        return existed
+
+    def delete(self, session_id: str) -> bool:
+        existed = self._forget(session_id)
+        if self.backend is not None:
+            existed = self.backend.delete(session_id) or existed
+        return existed
+
+    async def adelete(self, session_id: str) -> bool:
+        """`delete` for the event loop, with the backend delete run in a thread"""
+        existed = self._forget(session_id)
+        if self.backend is not None:
+            existed = await asyncio.to_thread(self.backend.delete, session_id) or existed
+        return existed
+
+    def flush(self) -> int:
+        """Write all pending sessions in one batch; returns how many were written"""
+        with self._lock:
+            if not self.pending or self.flushing:
+                return 0
+            self.flushing, self.pending = self.pending, {}
+            batch = self.flushing
+        try:
+            self.backend.save_many(batch)
+            self.stats["flushes"] += 1
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Session flush of {len(batch)} sessions failed: {e}")
+            self.stats["flush_errors"] += 1
+            with self._lock:
+                # Keep anything written since for the next attempt
+                for sid, item in batch.items():
+                    self.pending.setdefault(sid, item)
+            return 0
+        finally:
+            with self._lock:
+                self.flushing = {}
+
+    def sweep(self) -> int:
+        """
+        Drop cache entries untouched for the idle TTL. The cache is in access order, so
+        this stops at the first recently used entry instead of scanning everything.
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        swept = 0
+        while self.cache:
+            session_id, entry = next(iter(self.cache.items()))
+            if entry.touched_at > cutoff:
+                break
+            self._drop(session_id)
+            swept += 1
+        self.stats["swept"] += swept
+        self.stats["sweeps"] += 1
+        return swept
+
+    def purge(self) -> int:
+        """Delete idle sessions from backends that do not expire them on their own"""
+        purge_idle = getattr(self.backend, "purge_idle", None)
+        if purge_idle is None:
+            return 0
+        purged = purge_idle()
+        self.stats["purged"] += purged
+        return purged
+
+    def sessions(self) -> Iterable[Any]:
+        """Sessions currently cached in this process"""
+        return (entry.session for entry in list(self.cache.values()))
+
+    async def run(self):
+        interval = min(self.flush_interval, self.sweep_interval) if self.backend else self.sweep_interval
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            await asyncio.sleep(interval)
+            if self.pending:
+                await asyncio.to_thread(self.flush)
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                self.sweep()
+                if self.backend is not None:
+                    await asyncio.to_thread(self.purge)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None:
+            await asyncio.to_thread(self.flush)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name if self.backend else "memory",
+            "cached_sessions": len(self.cache),
+            "cached_bytes": self.cache_bytes,
+            "bytes_per_session_avg": round(self.cache_bytes / len(self.cache), 1) if self.cache else 0,
+            "bytes_per_session_max": max((e.size for e in list(self.cache.values())), default=0),
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl,
+            "sweep_interval_seconds": self.sweep_interval,
+            "pending_writes": len(self.pending),
+            "stored_sessions": self.backend.count() if self.backend else len(self.cache),
+            **self.stats,
+        }
@@ -0,0 +1,284 @@
+"""
+Regional Soil Store
+Loads the regional soil table from the data directory into compact column arrays
+with a name index and region centroids, and hot-reloads it when the file changes on disk
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Relative paths are taken from the backend directory, not the working directory
+SOIL_DB_PATH = os.path.join(BASE_DIR, os.getenv("SOIL_DB_PATH") or os.path.join("data", "regional_soil.csv"))
+SOIL_DB_RELOAD_INTERVAL = float(os.getenv("SOIL_DB_RELOAD_INTERVAL", "5"))
+# Location names are client input: the per-snapshot match memo keeps only the most recent ones
+SOIL_MATCH_CACHE_SIZE = int(os.getenv("SOIL_MATCH_CACHE_SIZE", "4096"))
+# Coordinates farther than this from every region centroid fall back to name matching
+SOIL_MATCH_RADIUS_KM = float(os.getenv("SOIL_MATCH_RADIUS_KM", "300"))
+
+EARTH_RADIUS_KM = 6371.0
+
+SOIL_COLUMNS = ["N", "P", "K", "ph", "temp_min", "temp_max"]
+# Optional regional humidity (%) and rainfall (mm) profile; NaN where the file has none
+PROFILE_COLUMNS = ["humidity_min", "humidity_max", "rainfall_min", "rainfall_max"]
+
+
+@dataclass(eq=False)
+class SoilTable:
+    """Immutable snapshot of the soil table; a reload swaps in a new instance"""
+    names: List[str]
+    index: Dict[str, int]
+    columns: Dict[str, np.ndarray]
+    word_index: Dict[str, np.ndarray]
+    word_counts: np.ndarray
+    # Rows with a centroid and its (lat, lon) in radians; the lat/lon columns are optional
+    located: np.ndarray
+    centroids: np.ndarray
+    mtime: float
+    version: int
+    load_ms: float
+    memory_bytes: int
+    match_cache: "OrderedDict[str, Optional[Tuple[int, float, bool]]]" = field(default_factory=OrderedDict)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def row(self, i: int) -> Dict[str, object]:
+        """Soil profile for row `i` in the shape used by the generation code"""
+        cols = self.columns
+        row = {
+            "N": round(float(cols["N"][i]), 4),
+            "P": round(float(cols["P"][i]), 4),
+            "K": round(float(cols["K"][i]), 4),
+            "ph": round(float(cols["ph"][i]), 4),
+            "temp_range": (round(float(cols["temp_min"][i]), 4), round(float(cols["temp_max"][i]), 4)),
+        }
+        for name in ("humidity", "rainfall"):
+            low, high = cols[f"{name}_min"][i], cols[f"{name}_max"][i]
+            if np.isfinite(low) and np.isfinite(high):
+                row[f"{name}_range"] = (round(float(low), 4), round(float(high), 4))
+        return row
+
+    def match(self, location_lower: str) -> Optional[Tuple[int, float, bool]]:
+        """
+        Find the row for a location name, returning (row, score, direct) or None.
+
+        Exact names and substring matches in either direction are direct matches; otherwise
+        the row sharing the largest fraction of words wins. Results are memoized per snapshot,
+        least recently used first out beyond SOIL_MATCH_CACHE_SIZE.
+        """
+        if location_lower in self.match_cache:
+            self.match_cache.move_to_end(location_lower)
+            return self.match_cache[location_lower]
+
+        result = None
+        exact = self.index.get(location_lower)
+        if exact is not None:
+            result = (exact, 1.0, True)
+        else:
+            for i, name in enumerate(self.names):
+                if name in location_lower or location_lower in name:
+                    result = (i, 1.0, True)
+                    break
+
+        if result is None:
+            # Partial word matches via the inverted word index
+            location_words = set(location_lower.split())
+            common: Dict[int, int] = defaultdict(int)
+            for word in location_words:
+                for i in self.word_index.get(word, ()):
+                    common[int(i)] += 1
+            best_score = 0.0
+            for i in sorted(common):
+                score = common[i] / max(len(location_words), int(self.word_counts[i]))
+                if score > best_score:
+                    best_score = score
+                    result = (i, score, False)
+
+        self.match_cache[location_lower] = result
+        while len(self.match_cache) > SOIL_MATCH_CACHE_SIZE:
+            self.match_cache.popitem(last=False)
+        return result
+
+    def nearest(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest region centroid (row, km) for each coordinate, as one haversine matrix"""
+        lat = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        lon = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        c_lat, c_lon = self.centroids[:, 0][None, :], self.centroids[:, 1][None, :]
+        h = np.sin((c_lat - lat) / 2) ** 2 + np.cos(lat) * np.cos(c_lat) * np.sin((c_lon - lon) / 2) ** 2
+        km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+        best = km.argmin(axis=1)
+        return self.located[best], km[np.arange(len(best)), best]
+
+    def match_many(
+        self,
+        locations_lower: List[str],
+        lats: Optional[List[Optional[float]]] = None,
+        lons: Optional[List[Optional[float]]] = None,
+    ) -> List[Optional[Tuple[int, float, bool]]]:
+        """
+        Match many locations at once, returning (row, score, direct) or None for each.
+
+        Direct name matches win. Otherwise a location with coordinates within
+        SOIL_MATCH_RADIUS_KM of a region centroid takes that region, scored from 1.0 at
+        the centroid down to 0.7 at the radius, unless a partial name match scores higher.
+        Distances for all located inputs are computed in a single vectorized pass.
+        """
+        results = [self.match(name) for name in locations_lower]
+        if lats is None or lons is None or not len(self.located):
+            return results
+        lat = np.array([np.nan if v is None else v for v in lats], dtype=np.float64)
+        lon = np.array([np.nan if v is None else v for v in lons], dtype=np.float64)
+        pending = np.flatnonzero(
+            np.isfinite(lat) & np.isfinite(lon) & np.array([r is None or not r[2] for r in results], dtype=bool)
+        )
+        if not len(pending):
+            return results
+        rows, km = self.nearest(lat[pending], lon[pending])
+        scores = 1.0 - 0.3 * km / SOIL_MATCH_RADIUS_KM
+        for i, row, distance, score in zip(pending, rows, km, scores):
+            if distance <= SOIL_MATCH_RADIUS_KM and (results[i] is None or score > results[i][1]):
+                results[i] = (int(row), float(score), False)
+        return results
+
+
+def load_soil_table(path: str, version: int = 1) -> SoilTable:
+    """Read the soil CSV into float32 column arrays plus name and word indexes"""
+    started = time.perf_counter()
+    mtime = os.stat(path).st_mtime
+    df = pd.read_csv(path)
+    missing = [c for c in ["name"] + SOIL_COLUMNS if c not in df.columns]
+    if missing:
+        raise RuntimeError(f"Soil table {path} missing columns: {missing}")
+
+    df["name"] = df["name"].astype(str).str.strip().str.lower()
+    df = df.drop_duplicates(subset="name", keep="first").reset_index(drop=True)
+    names = df["name"].tolist()
+    columns = {c: df[c].to_numpy(dtype=np.float32) for c in SOIL_COLUMNS}
+    for c in PROFILE_COLUMNS:
+        columns[c] = (
+            pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float32)
+            if c in df.columns else np.full(len(names), np.nan, dtype=np.float32)
+        )
+
+    words: Dict[str, List[int]] = defaultdict(list)
+    word_counts = np.empty(len(names), dtype=np.int16)
+    for i, name in enumerate(names):
+        name_words = set(name.split())
+        word_counts[i] = len(name_words)
+        for word in name_words:
+            words[word].append(i)
+    word_index = {w: np.asarray(rows, dtype=np.int32) for w, rows in words.items()}
+
+    if "lat" in df.columns and "lon" in df.columns:
+        coords = df[["lat", "lon"]].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    else:
+        coords = np.full((len(names), 2), np.nan)
+    located = np.flatnonzero(np.isfinite(coords).all(axis=1)).astype(np.int32)
+    centroids = np.radians(coords[located])
+
+    memory_bytes = (
+        sum(a.nbytes for a in columns.values())
+        + sum(a.nbytes for a in word_index.values())
+        + word_counts.nbytes
+        + located.nbytes
+        + centroids.nbytes
+        + sum(len(n) for n in names)
+    )
+    return SoilTable(
+        names=names,
+        index={name: i for i, name in enumerate(names)},
+        columns=columns,
+        word_index=word_index,
+        word_counts=word_counts,
+        located=located,
+        centroids=centroids,
+        mtime=mtime,
+        version=version,
+        load_ms=(time.perf_counter() - started) * 1000,
+        memory_bytes=memory_bytes,
+    )
+
+
+class RegionalSoilStore:
+    """Soil table that checks the backing file at most every `reload_interval` seconds"""
+
+    def __init__(self, path: str = SOIL_DB_PATH, reload_interval: float = SOIL_DB_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.reload_errors = 0
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._table = load_soil_table(path)
+        logger.info(
+            f"Soil table loaded: {len(self._table)} regions in {self._table.load_ms:.1f} ms, "
+            f"{self._table.memory_bytes / 1024:.1f} KiB"
+        )
+
+    @property
+    def table(self) -> SoilTable:
+        """Current snapshot, reloading first if the file changed"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._table
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._table.mtime:
+            return
+        with self._lock:
+            if mtime == self._table.mtime:
+                return
+            try:
+                table = load_soil_table(self.path, version=self._table.version + 1)
+            except Exception as e:
+                # Keep serving the previous rows until the file is fixed; the copy carries
+                # the new mtime so the broken file is not re-read on every check
+                self.reload_errors += 1
+                self._table = replace(self._table, mtime=mtime, match_cache=OrderedDict())
+                logger.error(f"Soil table reload failed, keeping version {self._table.version}: {e}")
+                return
+            self._table = table
+            self.reloads += 1
+            logger.info(f"Soil table reloaded: version {table.version}, {len(table)} regions in {table.load_ms:.1f} ms")
+
+    def get_stats(self) -> Dict[str, object]:
+        table = self._table
+        return {
+            "path": self.path,
+            "regions": len(table),
+            "regions_located": len(table.located),
+            "version": table.version,
+            "load_ms": round(table.load_ms, 2),
+            "memory_bytes": table.memory_bytes,
+            "match_cache": len(table.match_cache),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+
+# Global instance
+soil_store = None
+
+def get_soil_store() -> RegionalSoilStore:
+    """Get the global soil store instance"""
+    global soil_store
+    if soil_store is None:
+        soil_store = RegionalSoilStore()
+    return soil_store
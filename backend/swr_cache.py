@@ -0,0 +1,284 @@
+"""
+Stale-While-Revalidate Cache
+Bounded async cache for upstream responses: serves fresh entries directly, serves
+stale entries while a background task refreshes them, coalesces concurrent misses
+for the same key into a single upstream call, and can fall back to expired entries
+when the upstream fails
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Cached value with the monotonic time it was fetched"""
+    value: Any
+    fetched_at: float
+
+
+class StaleWhileRevalidateCache:
+    """LRU-bounded cache with TTL, stale serving and request coalescing"""
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float, max_entries: int, latency_window: int = 512):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._background: set = set()
+        self._latencies = deque(maxlen=latency_window)
+        self.stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "upstream_errors": 0,
+            "evictions": 0,
+            "degraded": 0,
+        }
+
+    async def get(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        serve_expired_on_error: bool = False,
+    ) -> Tuple[Any, str]:
+        """
+        Return (value, status) where status is HIT, STALE, MISS or DEGRADED.
+
+        Fresh entries are returned as-is. Entries older than `ttl` but within
+        `ttl + stale_ttl` are returned immediately while `loader` refreshes them in
+        the background. Anything else waits for `loader`, sharing one call per key.
+        With `serve_expired_on_error`, a failed load falls back to any cached value
+        for the key, however old, and reports it as DEGRADED.
+        """
+        try:
+            return await self._get(key, loader)
+        except Exception:
+            if serve_expired_on_error and key in self._entries:
+                self.stats["degraded"] += 1
+                return self._entries[key].value, "DEGRADED"
+            raise
+
+    async def _get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            age = now - entry.fetched_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry.value, "HIT"
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stats["stale_hits"] += 1
+                if key not in self._inflight:
+                    self.stats["refreshes"] += 1
+                    task = self._start_load(key, loader)
+                    self._background.add(task)
+                    task.add_done_callback(self._refresh_done)
+                return entry.value, "STALE"
+
+        if key in self._inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key]), "MISS"
+        self.stats["misses"] += 1
+        # Shielded like the coalesced callers: cancelling the caller that started the
+        # load must not cancel it for everyone else
+        return await asyncio.shield(self._start_load(key, loader)), "MISS"
+
+    async def get_many(
+        self,
+        keys: List[Hashable],
+        batch_loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        serve_expired_on_error: bool = False,
+    ) -> Dict[Hashable, Tuple[Any, str]]:
+        """
+        Batch version of `get`: returns {key: (value, status)} for the unique keys.
+
+        All missing keys are passed to one `batch_loader` call, which returns
+        {key: value}; a key mapped to an exception (or left out) is reported with that
+        exception as its value instead of failing the whole batch, unless
+        `serve_expired_on_error` finds an older cached value for it. Stale keys are
+        refreshed together in one background call.
+        """
+        results = await self._get_many(keys, batch_loader)
+        if serve_expired_on_error:
+            for key, (value, _) in results.items():
+                if isinstance(value, BaseException) and key in self._entries:
+                    self.stats["degraded"] += 1
+                    results[key] = (self._entries[key].value, "DEGRADED")
+        return results
+
+    async def _get_many(
+        self,
+        keys: List[Hashable],
+        batch_loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Tuple[Any, str]]:
+        results: Dict[Hashable, Tuple[Any, str]] = {}
+        to_load: List[Hashable] = []
+        to_refresh: List[Hashable] = []
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        now = time.monotonic()
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    results[key] = (entry.value, "HIT")
+                    continue
+                if age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["stale_hits"] += 1
+                    results[key] = (entry.value, "STALE")
+                    if key not in self._inflight:
+                        to_refresh.append(key)
+                    continue
+            if key in self._inflight:
+                self.stats["coalesced"] += 1
+                waiting[key] = self._inflight[key]
+            else:
+                self.stats["misses"] += 1
+                to_load.append(key)
+
+        if to_refresh:
+            self.stats["refreshes"] += len(to_refresh)
+            task = self._start_load_many(to_refresh, batch_loader)
+            self._background.add(task)
+            task.add_done_callback(self._refresh_done)
+        if to_load:
+            loaded = await asyncio.shield(self._start_load_many(to_load, batch_loader))
+            for key in to_load:
+                results[key] = (loaded[key], "MISS")
+        for key, future in waiting.items():
+            try:
+                results[key] = (await asyncio.shield(future), "MISS")
+            except Exception as e:
+                results[key] = (e, "MISS")
+        return results
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Run `loader` in its own task, registered as the in-flight load for `key`"""
+        task = asyncio.ensure_future(self._load(key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(partial(self._load_done, key))
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        try:
+            value = await loader()
+        except Exception:
+            self.stats["upstream_errors"] += 1
+            raise
+        self._latencies.append((time.perf_counter() - started) * 1000)
+        self._store(key, value)
+        return value
+
+    def _load_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when nobody else was waiting on it
+            task.exception()
+
+    def _start_load_many(
+        self,
+        keys: List[Hashable],
+        batch_loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> asyncio.Task:
+        """Run one `batch_loader` call in its own task, with a future per key for coalesced callers"""
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        self._inflight.update(futures)
+        return asyncio.ensure_future(self._load_many(futures, batch_loader))
+
+    async def _load_many(
+        self,
+        futures: Dict[Hashable, asyncio.Future],
+        batch_loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Any]:
+        keys = list(futures)
+        started = time.perf_counter()
+        try:
+            try:
+                loaded = await batch_loader(keys)
+            except Exception as e:
+                loaded = {key: e for key in keys}
+            else:
+                self._latencies.append((time.perf_counter() - started) * 1000)
+            results = {}
+            for key in keys:
+                value = loaded.get(key, KeyError(key))
+                if isinstance(value, BaseException):
+                    self.stats["upstream_errors"] += 1
+                    futures[key].set_exception(value)
+                    futures[key].exception()
+                else:
+                    self._store(key, value)
+                    futures[key].set_result(value)
+                results[key] = value
+            return results
+        finally:
+            for key, future in futures.items():
+                if not future.done():
+                    future.cancel()
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = CacheEntry(value=value, fetched_at=time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _refresh_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["refresh_errors"] += 1
+            logger.warning(f"{self.name} cache refresh failed: {task.exception()}")
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate, entry counts and upstream latency percentiles"""
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"] + self.stats["coalesced"]
+        # Coalesced lookups still waited on the upstream: they are not hits
+        served = self.stats["hits"] + self.stats["stale_hits"]
+        latencies = sorted(self._latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2)
+
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "stale_ttl_seconds": self.stale_ttl,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+            "coalesced_rate": round(self.stats["coalesced"] / lookups, 4) if lookups else 0.0,
+            **self.stats,
+            "upstream_latency_ms": {
+                "samples": len(latencies),
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(latencies[-1], 2) if latencies else None,
+            },
+        }
@@ -0,0 +1,96 @@
+"""
+Chatbot service against the OpenAI-compatible stand-in: which replies the response
+cache may share between sessions, and how identical requests in flight are folded
+"""
+
+import uuid
+import asyncio
+
+import pytest
+
+from llm_pool import LLMPool, OpenAIBackend
+from rate_limit import MemoryCounterStore, RateLimit, RateLimiter
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def service(openai_standin, monkeypatch):
+    import app
+
+    service = app.get_chatbot_service()
+    monkeypatch.setattr(service, "llm_pool", LLMPool([OpenAIBackend("test", openai_standin.url)], params={"model": "standin"}))
+    monkeypatch.setattr(service, "response_cache", ResponseCache(enabled=True))
+    return service
+
+
+def ask(service, session_id: str, message: str, user_ip: str):
+    return service.process_message(session_id, message, "en", user_ip)
+
+
+def test_replies_with_session_context_are_not_shared(service, openai_standin):
+    first, second, third = (str(uuid.uuid4()) for _ in range(3))
+
+    async def main():
+        reply, metadata = await ask(service, first, "What fertilizer does rice need?", "10.0.46.1")
+        assert metadata["source"] == "openai"
+        # A fresh session asking the same thing gets the cached answer
+        shared, metadata = await ask(service, second, "What fertilizer does rice need?", "10.0.46.2")
+        assert metadata["source"] == "cache" and shared == reply
+
+        # Follow-ups carry each session's history and user context: never cached or shared
+        personal, metadata = await ask(service, first, "When should I sow wheat?", "10.0.46.1")
+        assert metadata["source"] == "openai"
+        other, metadata = await ask(service, second, "When should I sow wheat?", "10.0.46.2")
+        assert metadata["source"] == "openai"
+        fresh, metadata = await ask(service, third, "When should I sow wheat?", "10.0.46.3")
+        assert metadata["source"] == "openai"
+
+    asyncio.run(main())
+    assert openai_standin.calls == 4
+    assert service.response_cache.stats["uncacheable"] == 2
+    assert service.response_cache.stats["stores"] == 2
+
+
+def test_cache_scope_includes_the_prompt_context():
+    cache = ResponseCache(enabled=True)
+    cache.store("best crop for black soil", "en", "knowledge-a", "Cotton")
+    assert cache.lookup("best crop for black soil", "en", "knowledge-a")[0] == "Cotton"
+    assert cache.lookup("best crop for black soil", "en", "knowledge-b") is None
+    assert cache.lookup("best crop for black soil", "hi", "knowledge-a") is None
+    assert cache.lookup("best crop for black soil", "en", None) is None
+    cache.store("best crop for black soil", "en", None, "Soybean")
+    assert len(cache) == 1
+
+
+def test_duplicates_are_rate_limited_before_sharing_a_reply(service, openai_standin, monkeypatch):
+    monkeypatch.setattr(service, "rate_limiter", RateLimiter({"chatbot": RateLimit(2, 60)}, MemoryCounterStore(), enabled=True))
+    session_id = str(uuid.uuid4())
+
+    async def main():
+        return await asyncio.gather(*(ask(service, session_id, "Is it time to harvest?", "10.0.49.1") for _ in range(4)))
+
+    results = asyncio.run(main())
+    assert [metadata.get("error") for _, metadata in results] == [None, None, "rate_limit_exceeded", "rate_limit_exceeded"]
+    assert results[1][1]["deduplicated"] and results[1][0] == results[0][0]
+    assert openai_standin.calls == 1
+
+
+def test_failed_leader_hands_over_to_one_waiter(service, openai_standin):
+    openai_standin.words = 100
+    session_id = str(uuid.uuid4())
+    message = "How much water does sugarcane need?"
+
+    async def main():
+        leader = service.stream_message(session_id, message, "en", "10.0.49.2")
+        assert (await leader.__anext__())[0] == "delta"
+        waiters = [asyncio.ensure_future(ask(service, session_id, message, "10.0.49.2")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        # The streaming leader's client goes away before the reply is complete
+        await leader.aclose()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(main())
+    assert openai_standin.calls == 2
+    assert sum(bool(metadata.get("deduplicated")) for _, metadata in results) == 2
+    assert len({reply for reply, _ in results}) == 1
+    assert service.dedup_stats["leader_failures"] >= 3
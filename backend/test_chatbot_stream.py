@@ -0,0 +1,77 @@
+"""
+/chatbot/stream against a local OpenAI-compatible stand-in: incremental deltas, the
+final reply recorded in the session, and prompt release of the LLM slot when the
+client goes away mid-stream
+"""
+
+import json
+import uuid
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm_pool import LLMPool, OpenAIBackend
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.fixture
+def service(openai_standin, monkeypatch):
+    import app
+
+    service = app.get_chatbot_service()
+    pool = LLMPool([OpenAIBackend("test", openai_standin.url)], params={"model": "standin"})
+    monkeypatch.setattr(service, "llm_pool", pool)
+    return service
+
+
+def test_stream_delivers_deltas_and_records_the_reply(client, service, openai_standin):
+    session_id = str(uuid.uuid4())
+    message = f"When should I sow wheat {session_id}?"
+    response = client.post("/chatbot/stream", json={"message": message, "session_id": session_id})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert events[0] == ("session", {"session_id": session_id})
+    deltas = [data["text"] for event, data in events if event == "delta"]
+    assert len(deltas) == openai_standin.words + 1
+    kind, done = events[-1]
+    assert kind == "done"
+    assert done["reply"] == "".join(deltas).strip()
+    assert done["reply"].startswith(f"Answer to: {message}")
+    assert done["metadata"]["source"] == "openai" and done["metadata"]["ttft_ms"] is not None
+
+    history = client.get(f"/chatbot/history/{session_id}").json()["history"]
+    assert [m["content"] for m in history["messages"]] == [message, done["reply"]]
+
+
+def test_client_disconnect_closes_the_upstream_stream(service, openai_standin):
+    import app
+
+    openai_standin.words = 200
+    session_id = str(uuid.uuid4())
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.45"))
+
+    async def main():
+        response = await app.chatbot_stream(app.ChatRequest(message="Long answer please", session_id=session_id), request)
+        body = response.body_iterator
+        chunks = [await body.__anext__() for _ in range(3)]
+        assert chunks[0].startswith("event: session") and chunks[2].startswith("event: delta")
+        assert service.llm_pool.endpoints[0].active == 1
+
+        # What the server does when the client goes away: the slot is free once this returns
+        await body.aclose()
+        assert service.llm_pool.endpoints[0].active == 0
+        assert service.stream_stats["interrupted"] >= 1
+        history = await service.get_conversation_history(session_id)
+        assert history["messages"][-1]["metadata"]["source"] == "openai_interrupted"
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Climatology store: atomic gridded build keyed on the regional profiles, rebuilds when
+the profiles change, and lookups in both array layouts
+"""
+
+import os
+import json
+
+import numpy as np
+
+from climatology import CLIMATE_VARIABLES, ClimatologyStore, _synthetic_normals, build_climatology
+from soil_store import BASE_DIR, RegionalSoilStore
+
+JAISALMER, GUWAHATI = (26.9, 70.9), (26.14, 91.74)
+
+
+def soil_table():
+    return RegionalSoilStore(os.path.join(BASE_DIR, "data", "regional_soil.csv")).table
+
+
+def test_build_is_gridded_and_leaves_no_temporary_files(tmp_path):
+    path = str(tmp_path / "climatology.npy")
+    table = soil_table()
+    build_climatology(path, grid_deg=1.0, table=table)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["climatology.npy", "climatology.npy.json"]
+
+    store = ClimatologyStore(path, table=table)
+    assert not store.zonal and store.normals.shape == (180, 360, 12, len(CLIMATE_VARIABLES))
+    values = store.lookup(18.5, np.array([-120.0, 0.0, 73.8]), np.array([1, 7, 7]))
+    assert values["temperature"].shape == (3,)
+    # Far from every region the latitude model applies
+    assert values["rainfall"][0] == np.float16(_synthetic_normals(np.array(18.5), np.array(1))[2])
+
+
+def test_same_latitude_regions_get_their_own_normals(tmp_path):
+    path = str(tmp_path / "climatology.npy")
+    store = ClimatologyStore(path, table=soil_table())
+    desert, valley = store.features(*JAISALMER, month=7), store.features(*GUWAHATI, month=7)
+    assert desert["rainfall"] < 100 < 250 < valley["rainfall"]
+    assert desert["humidity"] < 60 < 85 < valley["humidity"]
+
+    punjab = (30.9, 75.85)
+    assert store.features(*punjab, month=1)["temperature"] < store.features(*punjab, month=6)["temperature"]
+    assert store.features(*punjab, month=1)["rainfall"] < store.features(*punjab, month=8)["rainfall"]
+
+
+def test_changed_profiles_trigger_a_rebuild(tmp_path):
+    path = str(tmp_path / "climatology.npy")
+    table = soil_table()
+    build_climatology(path, grid_deg=2.0, table=table)
+    with open(path + ".json", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["profile_mtime"] -= 1
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    store = ClimatologyStore(path, table=table)
+    assert store.meta["profile_mtime"] == table.mtime
+    assert store.grid_deg == 0.5
+
+
+def test_gridded_layout_matches_zonal(tmp_path):
+    lats = np.arange(-89.5, 90.0, 1.0)
+    lat_grid, month_grid = np.meshgrid(lats, np.arange(1, 13), indexing="ij")
+    normals = _synthetic_normals(lat_grid, month_grid).astype(np.float16)
+    meta = {"lat0": -89.5, "lon0": -179.5, "grid_deg": 1.0, "variables": CLIMATE_VARIABLES}
+
+    zonal_path = str(tmp_path / "zonal.npy")
+    np.save(zonal_path, normals)
+    gridded_path = str(tmp_path / "gridded.npy")
+    np.save(gridded_path, np.broadcast_to(normals[:, None], (len(lats), 360, 12, len(CLIMATE_VARIABLES))))
+    for path in (zonal_path, gridded_path):
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    gridded, zonal = ClimatologyStore(gridded_path), ClimatologyStore(zonal_path)
+    assert zonal.zonal and not gridded.zonal
+    for lat, lon, month in [(18.5, 73.8, 7), (-33.9, 151.2, 1), (51.5, -0.1, 12)]:
+        assert gridded.features(lat, lon, month) == zonal.features(lat, lon, month)
@@ -0,0 +1,53 @@
+"""
+Crop catalog: model classes keep their label-encoder ids, other sources link to them
+through aliases, and the app's catalog agrees with the trained model
+"""
+
+import numpy as np
+
+from crop_catalog import DEFAULT_BASELINE, UNCATEGORIZED, CropCatalog
+
+MODEL_CLASSES = ["kidneybeans", "mungbean", "rice"]
+BASELINE = {"Kidney Beans": (900.0, 90.0), "rice": (4000.0, 25.0), "saffron": (5.0, 3000.0)}
+MARKET = {
+    "rice": {"base_price": 2500, "category": "cereal"},
+    "green_gram": {"base_price": 7000, "category": "pulse"},
+    "tomato": {"base_price": 1500, "category": "vegetable"},
+}
+KNOWLEDGE = {"Rice": {"season": "kharif"}, "maize": {"season": "kharif"}}
+
+
+def make_catalog() -> CropCatalog:
+    return CropCatalog(MODEL_CLASSES, BASELINE, MARKET, KNOWLEDGE)
+
+
+def test_model_classes_come_first_and_sources_link_by_alias():
+    catalog = make_catalog()
+    assert catalog.names[:3] == MODEL_CLASSES and catalog.n_model == 3
+    # Market, knowledge and baseline entries for model classes reuse their ids
+    assert catalog.resolve("green gram") == catalog.resolve("Mung Bean") == 1
+    assert catalog.resolve("Rice") == 2 and catalog.knowledge[2] == {"season": "kharif"}
+    assert catalog.resolve("kidney_beans") == 0 and catalog.baseline_yield[0] == 900.0
+    # Crops only found elsewhere are appended once, in source order
+    assert catalog.names[3:] == ["tomato", "maize", "saffron"]
+    assert catalog.ids(["tomato", "nonsense", "corn"]).tolist() == [3, -1, 4]
+
+
+def test_columns_are_indexed_by_id():
+    catalog = make_catalog()
+    tomato, maize = catalog.resolve("tomato"), catalog.resolve("maize")
+    assert catalog.market_keys[1] == "green_gram" and catalog.market_price[1] == 7000
+    assert np.isnan(catalog.market_price[maize])
+    assert catalog.category_of(tomato) == "vegetable" and catalog.category_of(maize) == UNCATEGORIZED
+    assert (catalog.baseline_yield[tomato], catalog.price[tomato]) == DEFAULT_BASELINE
+    stats = catalog.get_stats()
+    assert stats["model_classes_without_baseline"] == ["mungbean"]
+    assert stats["model_classes_without_market"] == ["kidneybeans"]
+
+
+def test_app_catalog_matches_the_label_encoder(client):
+    import app
+
+    classes = app._label_encoder.classes_.tolist()
+    assert app._crop_catalog.names[:len(classes)] == classes
+    assert app._crop_catalog.ids(classes).tolist() == list(range(len(classes)))
@@ -0,0 +1,64 @@
+"""
+Reproducible environmental data: the same region, grid cell and date bucket always
+produce the same values, whether generated directly, through /soil-data or in bulk
+"""
+
+from datetime import date
+
+
+def test_seed_depends_on_region_cell_and_bucket():
+    import app
+
+    seed = app._environment_seed("punjab", 30.91, 75.81, 100)
+    assert seed == app._environment_seed("punjab", 30.91, 75.81, 100)
+    # Same ENV_GRID_DEG cell
+    assert seed == app._environment_seed("punjab", 30.93, 75.83, 100)
+    assert seed != app._environment_seed("haryana", 30.91, 75.81, 100)
+    assert seed != app._environment_seed("punjab", 31.5, 75.81, 100)
+    assert seed != app._environment_seed("punjab", 30.91, 75.81, 101)
+    assert app._environment_seed("punjab", None, None, 100) == app._environment_seed("punjab", None, 75.81, 100)
+
+
+def test_generated_values_repeat_within_a_date_bucket():
+    import app
+
+    day = date(2026, 7, 15)
+    for lat, lon in [(None, None), (30.9, 75.85)]:
+        first = app._generate_environmental_data("punjab", lat, lon, day=day)
+        assert first == app._generate_environmental_data("punjab", lat, lon, day=day)
+        assert first["location_name"] == "Punjab"
+
+    # Without coordinates the weather values are drawn per bucket
+    other_days = [app._generate_environmental_data("punjab", day=date(2026, 7, d)) for d in range(1, 8)]
+    assert len({(v["temperature"], v["humidity"], v["rainfall"]) for v in other_days}) > 1
+
+
+def test_soil_data_endpoint_is_memoized_with_etag(client, upstream):
+    body = {"place_name": "Ludhiana Punjab"}
+    first = client.post("/soil-data", json=body)
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+    geocodes = [c for c in upstream.calls if c.startswith("/search")]
+    assert len(geocodes) == 1
+
+    second = client.post("/soil-data", json={"place_name": "  ludhiana   PUNJAB "})
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert second.headers["ETag"] == etag
+    assert [c for c in upstream.calls if c.startswith("/search")] == geocodes
+
+    not_modified = client.post("/soil-data", json=body, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+
+
+def test_bulk_and_single_lookups_agree(client, upstream):
+    locations = [{"place_name": "Nashik Maharashtra"}, {"latitude": 12.97, "longitude": 77.59}]
+    bulk = client.post("/soil-data/bulk", json={"locations": locations})
+    assert bulk.status_code == 200
+    items = bulk.json()["results"]
+    for location, item in zip(locations, items):
+        assert item["error"] is None
+        assert client.post("/soil-data", json=location).json() == item["data"]
@@ -0,0 +1,99 @@
+"""
+Upstream HTTP client against the stand-in upstream: circuit breaker probes and hedge
+latency accounting when calls are cancelled
+"""
+
+import asyncio
+
+import pytest
+
+from http_client import CircuitOpenError, UpstreamHTTPClient
+
+
+def test_cancelled_half_open_probe_frees_the_breaker(upstream):
+    url = upstream.url + "/v1/forecast"
+    params = {"latitude": 18.5, "longitude": 73.8}
+
+    async def main():
+        client = UpstreamHTTPClient(max_retries=0, hedge_enabled=False)
+        breaker = client.breakers["open-meteo"]
+        breaker.failure_threshold, breaker.reset_timeout = 1, 0.05
+        upstream.fail = True
+        with pytest.raises(Exception):
+            await client.get_json("open-meteo", url, params=params)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await client.get_json("open-meteo", url, params=params)
+
+        await asyncio.sleep(0.1)
+        upstream.fail, upstream.delay = False, 0.3
+        probe = asyncio.ensure_future(client.get_json("open-meteo", url, params=params))
+        await asyncio.sleep(0.05)
+        assert breaker.state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # The next caller gets to probe, and its success closes the breaker
+        upstream.delay = 0.0
+        assert (await client.get_json("open-meteo", url, params=params))["latitude"] == 18.5
+        assert breaker.state == "closed"
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_cancelled_hedge_attempts_are_not_timed(upstream, monkeypatch):
+    import http_client
+
+    monkeypatch.setattr(http_client, "HTTP_HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(http_client, "HTTP_HEDGE_MIN_DELAY_MS", 100)
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        client = UpstreamHTTPClient(max_retries=0)
+        histogram = client.histograms["open-meteo"]
+        histogram.observe(100.0)
+        upstream.delays = [0.5, 0.0]
+        await client.get_json("open-meteo", url, params={"latitude": 18.5, "longitude": 73.8})
+        # The hedge wins; the slow primary it beat was cancelled and is not timed
+        assert histogram.hedges == 1 and histogram.hedge_wins == 1
+        assert histogram.count == 2
+        assert histogram.recent[-1] < 500
+
+        upstream.delay = 0.1
+
+        request = asyncio.ensure_future(client.get_json("open-meteo", url, params={"latitude": 19.5, "longitude": 73.8}))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        assert histogram.count == 2
+        await client.aclose()
+
+    asyncio.run(main())
+
+
+def test_cancelling_before_the_hedge_cancels_the_primary(upstream, monkeypatch):
+    import http_client
+
+    monkeypatch.setattr(http_client, "HTTP_HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(http_client, "HTTP_HEDGE_MIN_DELAY_MS", 500)
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        client = UpstreamHTTPClient(max_retries=0)
+        client.histograms["open-meteo"].observe(20.0)
+        upstream.delay = 1.0
+        request = asyncio.ensure_future(client.get_json("open-meteo", url, params={"latitude": 20.5, "longitude": 73.8}))
+        await asyncio.sleep(0.1)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        await asyncio.sleep(0.05)
+        # Still waiting for the hedge delay: the primary attempt went with the caller
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        assert client.histograms["open-meteo"].hedges == 0
+        await client.aclose()
+
+    asyncio.run(main())
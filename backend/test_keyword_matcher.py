@@ -0,0 +1,65 @@
+"""
+Keyword automaton: the same hits as scanning for every keyword separately, word
+boundary rules, and the chatbot's single scan per message
+"""
+
+import random
+
+from keyword_matcher import KeywordMatcher, _is_word_char
+
+
+def naive_find(keywords, text):
+    """The per-keyword scan the automaton replaces, with the same boundary rules"""
+    text = text.lower()
+    hits = []
+    for keyword, payload, whole_word in keywords:
+        keyword = keyword.lower()
+        start = text.find(keyword)
+        while start != -1:
+            end = start + len(keyword)
+            if not (start and _is_word_char(text[start - 1])) and not (
+                whole_word and end < len(text) and _is_word_char(text[end])
+            ):
+                hits.append((start, end, payload))
+            start = text.find(keyword, start + 1)
+    return sorted(hits)
+
+
+def test_matches_the_per_keyword_scan():
+    rng = random.Random(47)
+    alphabet = "abcdeह ि्"
+    for _ in range(50):
+        keywords = {}
+        for _ in range(rng.randint(1, 30)):
+            word = "".join(rng.choice(alphabet.strip()) for _ in range(rng.randint(1, 4)))
+            keywords[(word, rng.random() < 0.3)] = None
+        keywords = [(word, (word, whole_word), whole_word) for word, whole_word in keywords]
+        matcher = KeywordMatcher()
+        for word, payload, whole_word in keywords:
+            matcher.add(word.upper() if rng.random() < 0.5 else word, payload, whole_word)
+        for _ in range(5):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+            assert sorted(matcher.find(text)) == naive_find(keywords, text)
+
+
+def test_word_boundaries():
+    matcher = KeywordMatcher()
+    matcher.add("rice", "rice")
+    matcher.add("pest", "pest")
+    matcher.add("hi", "greeting", whole_word=True)
+    matcher.add("गेहूं", "wheat")
+    assert [h.payload for h in matcher.find("Rice price for pests? hi")] == ["rice", "pest", "greeting"]
+    assert matcher.find("which high") == []
+    assert [h.payload for h in matcher.find("मेरा गेहूं")] == ["wheat"]
+    assert len(matcher) == 4
+
+
+def test_chatbot_scans_each_message_once():
+    import app
+
+    service = app.get_chatbot_service()
+    found = service._scan_keywords("What price for wheat and rice on my farm in Nashik?")
+    assert found.crops == ["wheat", "rice"]
+    assert service._scan_keywords("What price for wheat and rice on my farm in Nashik?") is found
+    # 'price' holds no 'rice', aliases resolve to the crop
+    assert service._scan_keywords("Price of corn?").crops == ["maize"]
@@ -0,0 +1,170 @@
+"""
+LLM pool against the OpenAI-compatible stand-in: queue limits and timeouts, priority
+order of waiters, failover to another endpoint and hand-offs that honour it
+"""
+
+import time
+import socket
+import asyncio
+from contextlib import aclosing
+
+import openai
+import pytest
+
+from llm_pool import PRIORITY_DEFAULT, PRIORITY_RETRY, PRIORITY_STREAM, LLMOverloaded, LLMPool, OpenAIBackend
+
+
+def make_pool(*urls: str, **kwargs) -> LLMPool:
+    return LLMPool([OpenAIBackend("test", url) for url in urls], params={"model": "standin"}, **kwargs)
+
+
+def ask(pool: LLMPool, text: str, priority: int = PRIORITY_DEFAULT):
+    return pool.complete([{"role": "user", "content": text}], priority)
+
+
+def dead_url() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def test_full_queue_turns_callers_away_at_once(openai_standin):
+    openai_standin.first_delay = 0.3
+    pool = make_pool(openai_standin.url, max_concurrency=1, queue_size=1)
+
+    async def main():
+        running = [asyncio.ensure_future(ask(pool, f"q{i}")) for i in range(2)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(LLMOverloaded):
+            await ask(pool, "q2")
+        assert time.monotonic() - started < 0.1
+        return await asyncio.gather(*running)
+
+    replies = asyncio.run(main())
+    assert [r.split()[2] for r in replies] == ["q0", "q1"]
+    assert pool.stats["rejected_queue_full"] == 1 and pool.stats["queued"] == 1
+    assert openai_standin.max_active == 1
+
+
+def test_waiters_give_up_after_the_queue_timeout(openai_standin):
+    openai_standin.first_delay = 0.4
+    pool = make_pool(openai_standin.url, max_concurrency=1, queue_timeout=0.1)
+
+    async def main():
+        running = asyncio.ensure_future(ask(pool, "slow"))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with pytest.raises(LLMOverloaded):
+            await ask(pool, "impatient")
+        assert 0.09 < time.monotonic() - started < 0.3
+        await running
+        # The timed-out waiter holds nothing: the next caller gets a slot at once
+        openai_standin.first_delay = 0.0
+        assert (await ask(pool, "next")).startswith("Answer to: next")
+
+    asyncio.run(main())
+    assert pool.stats["rejected_timeout"] == 1
+    assert pool.get_stats()["active"] == 0 and pool.get_stats()["queue_depth"] == 0
+
+
+def test_waiters_are_served_by_priority_then_arrival(openai_standin):
+    openai_standin.first_delay = 0.2
+    pool = make_pool(openai_standin.url, max_concurrency=1)
+    order = [("default-1", PRIORITY_DEFAULT), ("stream", PRIORITY_STREAM), ("default-2", PRIORITY_DEFAULT), ("retry", PRIORITY_RETRY)]
+
+    async def main():
+        first = asyncio.ensure_future(ask(pool, "first"))
+        await asyncio.sleep(0.05)
+        waiters = []
+        for text, priority in order:
+            waiters.append(asyncio.ensure_future(ask(pool, text, priority)))
+            await asyncio.sleep(0.01)
+        openai_standin.first_delay = 0.0
+        await asyncio.gather(first, *waiters)
+
+    asyncio.run(main())
+    served = [prompt[-1]["content"] for prompt in openai_standin.prompts]
+    assert served == ["first", "retry", "stream", "default-1", "default-2"]
+
+
+def test_failed_calls_fail_over_to_another_endpoint(openai_standin):
+    pool = make_pool(dead_url(), openai_standin.url, cooldown=30)
+    dead, live = pool.endpoints
+
+    async def main():
+        assert (await ask(pool, "hello")).startswith("Answer to: hello")
+        # The failed endpoint is passed over while it cools down
+        assert (await ask(pool, "again")).startswith("Answer to: again")
+
+    asyncio.run(main())
+    assert pool.stats["failovers"] == 1
+    assert dead.stats["errors"] == 1 and dead.get_stats()["cooling_down"]
+    assert live.stats["calls"] == 2 and openai_standin.calls == 2
+
+
+def test_server_errors_fail_over_and_the_last_error_is_raised(openai_standin):
+    pool = make_pool(openai_standin.url, openai_standin.url, max_attempts=2)
+    openai_standin.fail = 1
+
+    async def main():
+        assert (await ask(pool, "retried")).startswith("Answer to: retried")
+        openai_standin.fail = 2
+        with pytest.raises(Exception):
+            await ask(pool, "doomed")
+
+    asyncio.run(main())
+    assert pool.stats["failovers"] == 2
+    assert pool.get_stats()["active"] == 0
+
+
+@pytest.mark.parametrize("status", [400, 422])
+def test_client_errors_are_raised_without_failover(openai_standin, status):
+    pool = make_pool(openai_standin.url, openai_standin.url, cooldown=30)
+    openai_standin.fail, openai_standin.fail_status = 1, status
+
+    async def main():
+        with pytest.raises(openai.APIStatusError) as raised:
+            await ask(pool, "malformed")
+        assert raised.value.status_code == status
+        with pytest.raises(openai.APIStatusError):
+            openai_standin.fail = 1
+            async with aclosing(pool.stream([{"role": "user", "content": "malformed"}])) as chunks:
+                async for _ in chunks:
+                    pass
+
+    asyncio.run(main())
+    assert openai_standin.calls == 2
+    assert pool.stats["failovers"] == 0 and pool.stats["client_errors"] == 2
+    assert not any(e.stats["errors"] or e.get_stats()["cooling_down"] for e in pool.endpoints)
+
+
+def test_rate_limited_endpoints_cool_down(openai_standin):
+    pool = make_pool(openai_standin.url, openai_standin.url, cooldown=30)
+    openai_standin.fail, openai_standin.fail_status = 1, 429
+
+    async def main():
+        assert (await ask(pool, "busy")).startswith("Answer to: busy")
+
+    asyncio.run(main())
+    assert pool.stats["failovers"] == 1
+    assert sum(e.get_stats()["cooling_down"] for e in pool.endpoints) == 1
+
+
+def test_freed_slots_avoid_endpoints_a_waiter_already_failed_on(openai_standin):
+    pool = make_pool(openai_standin.url, openai_standin.url, max_concurrency=1)
+    failed, other = pool.endpoints
+
+    async def main():
+        failed.active = other.active = 1
+        retry = asyncio.ensure_future(pool._acquire(PRIORITY_RETRY, (failed,)))
+        await asyncio.sleep(0)
+        # Both endpoints have a free slot by the time the waiter is handed one
+        other.active = 0
+        pool._release(failed)
+        assert await retry is other
+
+    asyncio.run(main())
+    assert (failed.active, other.active) == (0, 1)
@@ -0,0 +1,107 @@
+"""
+Mandi price aggregator against stand-in sources: pagination, normalization,
+cross-source deduplication, partial failures, persistence and the cached endpoint
+"""
+
+import time
+import asyncio
+import json
+
+import pytest
+
+import mandi_service
+from http_client import UpstreamError, UpstreamHTTPClient
+from conftest import mandi_records
+from mandi_service import CommodityNormalizer, MandiPriceService
+
+CATALOG = ["rice", "wheat", "chickpea", "green_gram", "onion", "tomato", "chili", "soybean", "groundnut"]
+
+
+@pytest.fixture
+def service(upstream, tmp_path, monkeypatch):
+    http = UpstreamHTTPClient(max_retries=0, hedge_enabled=False)
+    monkeypatch.setattr(mandi_service, "get_http_client", lambda: http)
+    return MandiPriceService(
+        CATALOG,
+        sources=f"a={upstream.url}/mandi/a, b={upstream.url}/mandi/b",
+        poll_interval=0,
+        snapshot_path=str(tmp_path / "mandi_snapshot.json"),
+    )
+
+
+def test_commodity_names_normalize_to_catalog_keys():
+    normalizer = CommodityNormalizer(CATALOG)
+    assert normalizer.normalize("Paddy(Dhan)(Common)") == "rice"
+    assert normalizer.normalize("Bengal Gram(Gram)(Whole)") == "chickpea"
+    assert normalizer.normalize("Green Gram (Moong)(Whole)") == "green_gram"
+    assert normalizer.normalize("Dry Chillies") == "chili"
+    assert normalizer.normalize("Ground Nut Seed") == "groundnut"
+    assert normalizer.normalize("Arecanut(Betelnut/Supari)") is None
+
+
+def test_poll_pages_and_deduplicates_sources(service, upstream):
+    snapshot = asyncio.run(service.poll())
+    pages = [call for call in upstream.calls if call.startswith("/mandi/a")]
+    assert len(pages) == 2
+    # Stand-in rows repeat their (commodity, market, district, state) key every 1092 rows,
+    # and source b only repeats rows of source a: the first report wins
+    assert snapshot.sources == {"a": 1092, "b": 0}
+    assert len(snapshot.records) == 1092
+    assert {r["source"] for r in snapshot.records} == {"a"}
+    assert set(snapshot.by_crop) == {"rice", "wheat", "onion", "tomato", "soybean", "groundnut"}
+    assert all(r["reportedDate"] == "2026-10-18" and r["unit"] == "₹/quintal" for r in snapshot.records)
+
+
+def test_price_changes_between_polls(service, upstream):
+    asyncio.run(service.poll())
+    upstream.mandi["/mandi/a"] = mandi_records(1500, price_offset=25)
+    snapshot = asyncio.run(service.poll())
+    assert snapshot.version == 2
+    assert {r["trend"] for r in snapshot.records} == {"up"}
+    assert {r["priceChange"] for r in snapshot.records} == {25.0}
+
+
+def test_failed_sources_keep_the_rest_and_the_previous_snapshot(service, upstream):
+    upstream.mandi["/mandi/a"] = None
+    snapshot = asyncio.run(service.poll())
+    assert snapshot.sources == {"b": 300}
+    assert "a" in service.last_errors
+
+    upstream.mandi["/mandi/b"] = None
+    with pytest.raises(UpstreamError):
+        asyncio.run(service.poll())
+    assert service.snapshot is snapshot
+    assert service.stats["poll_errors"] == 1
+
+
+def test_snapshot_survives_a_restart(service, upstream):
+    asyncio.run(service.poll())
+    restarted = MandiPriceService(CATALOG, sources="", poll_interval=0, snapshot_path=service.snapshot_path)
+    assert len(restarted.snapshot.records) == len(service.snapshot.records)
+    assert restarted.snapshot.by_crop.keys() == service.snapshot.by_crop.keys()
+
+
+def test_queries_are_filtered_and_cached(service):
+    assert service.query() is None
+    asyncio.run(service.poll())
+    body, etag = service.query(commodity="paddy", state="Maharashtra", limit=5)
+    rows = json.loads(body)["data"]
+    assert len(rows) == 5
+    assert all(r["crop"] == "rice" and r["state"] == "Maharashtra" for r in rows)
+    assert service.query(commodity="PADDY", state="maharashtra", limit=5) == (body, etag)
+    assert service.stats["response_cache_hits"] == 1
+
+
+def test_endpoint_serves_the_app_snapshot(client):
+    import app
+
+    # The app polls the stand-in sources in the background from startup
+    deadline = time.monotonic() + 10
+    while app._mandi_service.snapshot is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    response = client.get("/api/mandi-prices", params={"commodity": "wheat", "limit": 3})
+    assert response.status_code == 200
+    assert [row["crop"] for row in response.json()["data"]] == ["wheat"] * 3
+    again = client.get("/api/mandi-prices", params={"commodity": "wheat", "limit": 3}, headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
@@ -0,0 +1,89 @@
+"""
+/market snapshot lifecycle: out-of-date snapshots are rebuilt in the background while
+the previous one keeps being served, ingested observations are visible at once, and
+/market/query cursors page through every crop once and reject tampered or expired
+values
+"""
+
+import time
+import base64
+from dataclasses import replace
+from datetime import date, timedelta
+
+
+def wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_stale_snapshot_is_served_while_rebuilding(client, monkeypatch):
+    import app
+
+    current = client.get("/market")
+    assert current.status_code == 200
+    builds = app._market_stats["builds"]
+
+    build = app._build_market_snapshot
+
+    def slow_build(today, version):
+        time.sleep(0.5)
+        return build(today, version)
+
+    monkeypatch.setattr(app, "_build_market_snapshot", slow_build)
+    # As if the snapshot was built yesterday
+    app._market_snapshot = replace(app._market_snapshot, day=date.today() - timedelta(days=1), etag='"yesterday"')
+
+    started = time.monotonic()
+    stale = client.get("/market")
+    assert time.monotonic() - started < 0.4
+    assert stale.headers["ETag"] == '"yesterday"'
+    # A second request joins the rebuild in flight instead of starting another
+    assert client.get("/market/query", params={"crops": "rice", "fields": "prices"}).status_code == 200
+
+    wait_for(lambda: app._market_snapshot.day == date.today())
+    assert app._market_stats["builds"] == builds + 1
+    fresh = client.get("/market")
+    assert fresh.headers["ETag"] == current.headers["ETag"]
+    assert fresh.content == current.content
+
+
+def test_ingested_observations_rebuild_the_snapshot(client):
+    import app
+
+    today = date.today()
+    response = client.post("/market/observations", json={
+        "observations": [{"crop": "rice", "date": str(today - timedelta(days=today.weekday() + 1)), "price": 4321.0, "demand": 55}],
+    })
+    assert response.status_code == 200
+    assert app._market_snapshot.version == app._market_data_version
+    assert client.get("/market").headers["ETag"] == app._market_snapshot.etag
+
+
+def test_query_cursor_round_trip(client):
+    import app
+
+    params = {"fields": "prices,category", "limit": 7}
+    first = client.get("/market/query", params=params).json()
+    seen, page = list(first["series"]), first
+    while page["next_cursor"]:
+        page = client.get("/market/query", params={**params, "cursor": page["next_cursor"]}).json()
+        assert len(page["series"]) <= 7
+        seen += list(page["series"])
+    assert len(seen) == len(set(seen)) == first["total"] == len(app._market_snapshot.store)
+    assert set(first["series"]["rice"]) == {"prices", "category"}
+
+
+def test_query_rejects_tampered_or_expired_cursors(client):
+    import app
+
+    store = app._market_snapshot.store
+    for offset in (-1, len(store) + 1):
+        response = client.get("/market/query", params={"cursor": store._cursor(offset)})
+        assert response.status_code == 400 and response.json()["detail"] == "Invalid cursor"
+    assert client.get("/market/query", params={"cursor": "not a cursor"}).status_code == 400
+
+    expired = base64.urlsafe_b64encode(f"{store.version - 1}:7".encode()).decode()
+    response = client.get("/market/query", params={"cursor": expired})
+    assert response.status_code == 400 and "expired" in response.json()["detail"]
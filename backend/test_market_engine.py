@@ -0,0 +1,30 @@
+"""
+Synthetic market series: reproducibility and edge cases
+"""
+
+import numpy as np
+
+from market_engine import generate_market_series
+
+
+def test_series_are_reproducible_per_seed():
+    first = generate_market_series([2000.0, 45.0, 120.0], 30, seed=7)
+    again = generate_market_series([2000.0, 45.0, 120.0], 30, seed=7)
+    assert np.array_equal(first.prices, again.prices)
+    assert np.array_equal(first.demand, again.demand)
+    assert first.prices.shape == first.demand.shape == (3, 30)
+    assert not np.array_equal(first.prices, generate_market_series([2000.0, 45.0, 120.0], 30, seed=8).prices)
+
+
+def test_fresh_series_start_at_the_seasonal_price():
+    series = generate_market_series([2000.0, 45.0], 5, seed=3)
+    assert np.allclose(series.prices[:, 0], np.round(np.array([2000.0, 45.0]) * series.seasonal_factor, 2))
+
+
+def test_zero_points_return_empty_series():
+    series = generate_market_series([2000.0, 45.0], 0, seed=7)
+    assert series.prices.shape == series.demand.shape == (2, 0)
+    assert series.demand.dtype == np.int16
+    # The per-crop parameters match a longer series with the same seed
+    assert np.array_equal(series.trend, generate_market_series([2000.0, 45.0], 10, seed=7).trend)
+    assert generate_market_series([2000.0], 0, start_prices=[1900.0]).prices.shape == (1, 0)
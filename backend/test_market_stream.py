@@ -0,0 +1,101 @@
+"""
+Live market channel: deltas carry only the changed points of subscribed crops,
+reconnects resume from Last-Event-ID, and subscribers that fell off the ring get a
+fresh snapshot
+"""
+
+import json
+import asyncio
+from datetime import date, timedelta
+
+import numpy as np
+
+from market_store import METADATA_FIELDS, MarketColumnStore
+from market_stream import MarketBroadcaster, diff_stores
+
+CROPS = {"rice": "cereal", "wheat": "cereal", "tomato": "vegetable"}
+DATES = [date(2026, 3, 1) + timedelta(days=i) for i in range(4)]
+
+
+def make_store(prices: np.ndarray, version: int = 1) -> MarketColumnStore:
+    catalog = {name: {**{f: "" for f in METADATA_FIELDS}, "category": category} for name, category in CROPS.items()}
+    return MarketColumnStore(catalog, DATES, prices.copy(), np.full(prices.shape, 50.0), version)
+
+
+def base_prices() -> np.ndarray:
+    return np.arange(12, dtype=np.float64).reshape(3, 4) + 100
+
+
+def parse(message: str):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return fields["event"], int(fields["id"]), json.loads(fields["data"])
+
+
+async def never_disconnected():
+    return False
+
+
+def test_diff_reports_only_changed_points():
+    old = make_store(base_prices())
+    prices = base_prices()
+    prices[1, 2] = 999.0
+    assert diff_stores(old, make_store(prices)) == {"wheat": [["2026-03-03", 999.0, 50.0]]}
+    assert diff_stores(old, make_store(base_prices())) == {}
+    assert sum(len(points) for points in diff_stores(None, old).values()) == 12
+
+
+def test_subscribers_get_a_snapshot_then_their_deltas():
+    broadcaster = MarketBroadcaster(heartbeat=5)
+    broadcaster.publish(make_store(base_prices()))
+
+    async def main():
+        stream = broadcaster.stream({"rice", "tomato"}, None, never_disconnected, lambda: None)
+        event, seq, data = parse(await stream.__anext__())
+        assert (event, seq) == ("snapshot", 1) and set(data["series"]) == {"rice", "tomato"}
+        assert data["dates"] == [str(d) for d in DATES]
+
+        # A change to an unsubscribed crop is not sent; the next one is, merged with nothing else
+        prices = base_prices()
+        prices[1, 0] = 1.0
+        broadcaster.publish(make_store(prices))
+        prices[2, 3] = 2.0
+        broadcaster.publish(make_store(prices))
+        event, seq, data = parse(await asyncio.wait_for(stream.__anext__(), 1))
+        assert (event, seq) == ("delta", 3)
+        assert data["changes"] == {"tomato": [["2026-03-04", 2.0, 50.0]]}
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert broadcaster.subscriptions == set()
+    assert broadcaster.stats["snapshots_sent"] == 1 and broadcaster.stats["deltas_sent"] == 1
+
+
+def test_reconnect_resumes_or_falls_back_to_a_snapshot():
+    broadcaster = MarketBroadcaster(ring_size=2, heartbeat=5)
+    broadcaster.publish(make_store(base_prices()))
+    prices = base_prices()
+    for step in range(3):
+        prices[0, step] = 500.0 + step
+        broadcaster.publish(make_store(prices))
+
+    async def first(last_event_id):
+        stream = broadcaster.stream({"rice"}, last_event_id, never_disconnected, lambda: None)
+        try:
+            return parse(await stream.__anext__())
+        finally:
+            await stream.aclose()
+
+    # Events 3 and 4 are still in the ring: replayed as one merged delta
+    event, seq, data = asyncio.run(first(2))
+    assert (event, seq) == ("delta", 4)
+    assert data["changes"] == {"rice": [["2026-03-02", 501.0, 50.0], ["2026-03-03", 502.0, 50.0]]}
+    # Event 2 has left the ring, and ids from before a restart are unknown
+    for stale in (1, 99):
+        event, seq, data = asyncio.run(first(stale))
+        assert (event, seq) == ("snapshot", 4)
+        assert data["series"]["rice"]["prices"] == [500.0, 501.0, 502.0, 103.0]
+
+
+def test_stream_endpoint_validates_the_subscription(client):
+    assert client.get("/market/stream", params={"crops": "rice,nonsense"}).status_code == 400
+    assert client.get("/market/stream", params={"categories": "nonsense"}).status_code == 400
@@ -0,0 +1,101 @@
+"""
+Market time-series store shared by several processes: locked appends, crop registry
+consistency and rollups that pick up rows written elsewhere
+"""
+
+import os
+import time
+import multiprocessing
+from datetime import date
+
+import numpy as np
+import pytest
+
+from market_timeseries import MarketTimeSeriesStore, period_keys, to_days
+
+
+def test_reads_do_not_register_crops(tmp_path):
+    store = MarketTimeSeriesStore(str(tmp_path))
+    assert store.lookup_crops(["rice", "wheat"]).tolist() == [-1, -1]
+    assert not os.path.exists(tmp_path / "crops.json")
+    assert store.rollup("weekly", crop_ids=[]).empty
+
+
+def test_rollups_follow_appends_from_another_instance(tmp_path):
+    writer = MarketTimeSeriesStore(str(tmp_path), sync_interval=0)
+    reader = MarketTimeSeriesStore(str(tmp_path), sync_interval=0)
+    writer.append(["rice"] * 3, ["2026-03-02", "2026-03-03", "2026-03-04"], [100.0, 110.0, 120.0])
+
+    rice = reader.lookup_crops(["rice"])
+    assert rice.tolist() == [0]
+    weekly = reader.rollup("weekly", crop_ids=rice.tolist())
+    assert weekly["count"].tolist() == [3] and weekly["mean"].tolist() == [110.0]
+    version = reader.version
+
+    writer.append(["wheat", "rice"], ["2026-03-04", "2026-03-05"], [50.0, 130.0])
+    monthly = reader.rollup("monthly")
+    assert reader.version == version + 1
+    march = int(period_keys("monthly", to_days(["2026-03-01"]))[0])
+    assert monthly.loc[(0, march), "count"] == 4
+    assert reader.lookup_crops(["wheat"]).tolist() == [1]
+    assert reader.stats["external_syncs"] >= 2
+
+
+def test_non_positive_prices_are_rejected(tmp_path):
+    store = MarketTimeSeriesStore(str(tmp_path))
+    for price in (0.0, -5.0, float("nan")):
+        with pytest.raises(ValueError):
+            store.append(["rice", "rice"], ["2026-03-02", "2026-03-03"], [100.0, price])
+    assert store.day_range() is None and store.stats["appends"] == 0
+
+
+def _append_batches(root: str, worker: int, batches: int):
+    store = MarketTimeSeriesStore(root, sync_interval=0)
+    for batch in range(batches):
+        day = np.datetime64("2026-01-01") + batch
+        names = [f"crop{worker}_{batch}", "rice"]
+        store.append(names, [day, day], [float(worker * 1000 + batch + 1), 1.0])
+
+
+def test_concurrent_processes_keep_one_registry(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_batches, args=(str(tmp_path), w, 25)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    store = MarketTimeSeriesStore(str(tmp_path))
+    assert sorted(store.crops) == sorted(["rice"] + [f"crop{w}_{b}" for w in range(3) for b in range(25)])
+    assert store.row_count() == 3 * 25 * 2
+    rows = store.read(int(to_days("2026-01-01")), int(to_days("2026-12-31")))
+    names = [store.crops[c] for c in rows["crop"]]
+    for name, price in zip(names, rows["price"].tolist()):
+        if name != "rice":
+            worker, batch = map(int, name[4:].split("_"))
+            assert price == worker * 1000 + batch + 1
+
+
+def test_history_without_crops_returns_every_crop(client):
+    import app
+
+    response = client.get("/market/history", params={"crops": "", "level": "monthly"})
+    assert response.status_code == 200
+    assert set(response.json()["series"]) == set(app._COMPREHENSIVE_CROP_DATABASE)
+    assert client.get("/market/history", params={"crops": "rice,nonsense"}).status_code == 400
+
+
+def test_snapshot_follows_observations_from_another_worker(client):
+    import app
+
+    before = app._market_snapshot
+    # Another worker process appending to the same directory
+    other = MarketTimeSeriesStore(app.get_market_ts_store().root)
+    other.append(["rice"], [date.today()], [4567.0])
+
+    deadline = time.monotonic() + 10
+    while app._market_snapshot.ts_version == before.ts_version:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+    assert app.get_market_ts_store().stats["external_syncs"] >= 1
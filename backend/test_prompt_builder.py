@@ -0,0 +1,69 @@
+"""
+Prompt builder: token estimates, the newest turns kept within the history budget,
+older turns folded once into a bounded rolling summary
+"""
+
+from datetime import datetime
+
+from chatbot_service import ConversationMessage, ConversationSession
+from prompt_builder import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, estimate_tokens, message_tokens
+
+SYSTEM = [{"role": "system", "content": "You are a farming assistant."}]
+
+
+def make_session(turns: int) -> ConversationSession:
+    now = datetime.now()
+    session = ConversationSession(session_id="s1", messages=[], created_at=now, last_activity=now, user_context={})
+    for i in range(turns):
+        add(session, "user", f"Question {i}: how much water does the crop need this week? Details follow here.")
+        add(session, "assistant", f"Answer {i}: about twenty five millimetres, split in two irrigations. More below.")
+    return session
+
+
+def add(session: ConversationSession, role: str, content: str):
+    session.add_message(ConversationMessage(id=f"{role}_{session.message_count}", role=role, content=content, timestamp=datetime.now()))
+
+
+def test_token_estimates():
+    assert estimate_tokens("hello world") == 4
+    assert estimate_tokens("irrigation?") == 4
+    # Devanagari splits finer than ASCII
+    assert estimate_tokens("गेहूं") == 3
+    assert message_tokens({"role": "user", "content": ""}) == MESSAGE_OVERHEAD_TOKENS
+
+
+def test_history_is_cut_to_the_budget_and_older_turns_summarized():
+    builder = PromptBuilder(history_budget=100, summary_budget=1000)
+    session = make_session(10)
+    add(session, "user", "And next week?")
+    messages = builder.build(session, SYSTEM, "And next week?")
+
+    assert messages[0] == SYSTEM[0] and messages[-1] == {"role": "user", "content": "And next week?"}
+    assert sum(m["content"] == "And next week?" for m in messages) == 1
+    kept = messages[2:-1]
+    assert kept and sum(map(message_tokens, kept)) <= 100
+    assert kept[-1]["content"].startswith("Answer 9:")
+    # Everything older than the kept turns is in the summary, one line each
+    summary = messages[1]["content"].splitlines()
+    assert summary[0] == "Earlier in this conversation:"
+    assert len(summary) - 1 + len(kept) == 20
+    assert summary[1] == "User: Question 0: how much water does the crop need this week?"
+    assert session.summary_upto == 20 - len(kept)
+    assert builder.get_stats()["tokens_saved"] > 0
+
+
+def test_summary_is_extended_not_rebuilt_and_stays_within_budget():
+    builder = PromptBuilder(history_budget=60, summary_budget=40)
+    session = make_session(6)
+    builder.build(session, SYSTEM, "Next?")
+    folded = builder.stats["summarized_messages"]
+    assert builder.build(session, SYSTEM, "Next?") and builder.stats["summarized_messages"] == folded
+
+    add(session, "user", "Next?")
+    add(session, "assistant", "Short answer.")
+    add(session, "user", "Next?")
+    builder.build(session, SYSTEM, "Next?")
+    assert builder.stats["summary_updates"] == 2
+    # Only the newest summary lines are kept once they exceed the summary budget
+    assert sum(estimate_tokens(line) + 1 for line in session.summary) <= 40
+    assert session.summary[-1].startswith("Assistant: Answer") or session.summary[-1].startswith("User:")
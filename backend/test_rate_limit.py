@@ -0,0 +1,92 @@
+"""
+Rate limiter: sliding-window decisions around window boundaries, counters shared
+through the RESP stand-in, failing open without a store, and the 429 responses
+"""
+
+import time
+import socket
+
+import pytest
+
+import rate_limit
+from rate_limit import MemoryCounterStore, RateLimit, RateLimiter, RedisCounterStore, _decide
+
+LIMIT = RateLimit(10, 60.0)
+
+
+def test_decisions_at_the_window_boundary():
+    # Last instant of a window with one request to spare
+    assert _decide(9, 0, 659.999, LIMIT).allowed and _decide(9, 0, 659.999, LIMIT).remaining == 0
+    # A full window carries over in full at the start of the next one
+    rejected = _decide(0, 10, 660.0, LIMIT)
+    assert not rejected.allowed and rejected.retry_after == 0.001
+    assert _decide(0, 10, 660.0 + rejected.retry_after, LIMIT).allowed
+    # Full halfway through: blocked until just after the boundary
+    rejected = _decide(10, 0, 630.0, LIMIT)
+    assert rejected.retry_after == pytest.approx(30.001)
+    assert not _decide(0, 10, 660.0, LIMIT).allowed
+
+
+@pytest.mark.parametrize("current", [0, 3, 9, 10, 25])
+@pytest.mark.parametrize("previous", [0, 4, 10, 30])
+@pytest.mark.parametrize("elapsed", [0.0, 0.25, 0.999])
+def test_retry_after_is_when_the_next_request_is_allowed(current, previous, elapsed):
+    now = 600.0 + elapsed * LIMIT.window
+    decision = _decide(current, previous, now, LIMIT)
+    if decision.allowed:
+        return
+
+    def counts_at(t: float):
+        # Rejected requests are not counted, so nothing else changes the windows
+        windows_later = int(t // LIMIT.window) - 10
+        return [(current, previous), (0, current), (0, 0)][min(windows_later, 2)]
+
+    retry_at = now + decision.retry_after
+    assert _decide(*counts_at(retry_at), retry_at, LIMIT).allowed
+    if decision.retry_after > 0.01:
+        early = retry_at - 0.01
+        assert not _decide(*counts_at(early), early, LIMIT).allowed
+
+
+def test_redis_counters_are_shared_and_rejections_do_not_count(resp_standin):
+    limit = RateLimit(3, 60.0)
+    first, second = RedisCounterStore(resp_standin.url), RedisCounterStore(resp_standin.url)
+    now = 600.5
+    decisions = [store.acquire("chatbot:10.0.44.1", limit, now) for store in (first, second, first, second)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+
+    key = b"cropgpt:ratelimit:chatbot:10.0.44.1:10"
+    assert resp_standin.data[key] == b"3"
+    assert resp_standin.commands.count("DECR") == 1
+    # Kept for two windows, until it can no longer be anyone's previous window
+    assert 119 < resp_standin.expires[key] - time.time() <= 120
+
+    # The next window sees this one as its previous window
+    assert not first.acquire("chatbot:10.0.44.1", limit, 660.0).allowed
+    assert first.acquire("chatbot:10.0.44.1", limit, 700.0).allowed
+    assert first.acquire("chatbot:10.0.44.2", limit, 660.5).allowed
+
+
+def test_unreachable_store_fails_open():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    limiter = RateLimiter({"chatbot": RateLimit(1, 60)}, RedisCounterStore(f"redis://127.0.0.1:{port}/0"), enabled=True)
+    assert all(limiter.check("chatbot", "10.0.44.3").allowed for _ in range(3))
+    assert limiter.store_errors == 3 and limiter.stats["chatbot"] == {"allowed": 0, "rejected": 0}
+
+
+def test_limited_routes_answer_429_with_retry_after(client, upstream, monkeypatch):
+    limiter = RateLimiter({"weather": RateLimit(2, 60)}, MemoryCounterStore(), enabled=True)
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    params = {"lat": 18.52, "lon": 73.85, "days": 3}
+    allowed = [client.get("/weather", params=params) for _ in range(2)]
+    assert [r.status_code for r in allowed] == [200, 200]
+    assert [r.headers["X-RateLimit-Remaining"] for r in allowed] == ["1", "0"]
+
+    rejected = client.get("/weather", params=params)
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers["Retry-After"]) <= 60
+    assert limiter.stats["weather"] == {"allowed": 2, "rejected": 1}
@@ -0,0 +1,49 @@
+"""
+/recommend: one request from a location to scored crops, with soil and weather fetched
+concurrently and a slow forecast falling back instead of holding up the answer
+"""
+
+
+def test_place_name_is_geocoded_once_and_scored(client, upstream):
+    response = client.post("/recommend", json={"place_name": "Nagpur Maharashtra", "days": 3})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["prediction"]["recommendations"]
+    assert body["weather"]["forecast_days"] == 3 and len(body["weather"]["dates"]) == 3
+    assert body["features"]["temperature"] == 25.0
+    assert set(body["features"]) == {"N", "P", "K", "temperature", "humidity", "ph", "rainfall"}
+    meta = body["meta"]
+    assert meta["temperature_source"] == "forecast"
+    assert set(meta["timings_ms"]) == {"geocode", "soil", "weather", "predict", "total"}
+    assert (meta["latitude"], meta["longitude"]) == (18.52, 73.85)
+    assert len([c for c in upstream.calls if c.startswith("/search")]) == 1
+
+
+def test_soil_and_weather_are_fetched_concurrently(client, upstream):
+    # Coordinates need a reverse geocode for the soil region and a forecast, both slow here
+    upstream.delay = 0.3
+    response = client.post("/recommend", json={"latitude": 21.17, "longitude": 79.11})
+    assert response.status_code == 200
+    timings = response.json()["meta"]["timings_ms"]
+    assert timings["soil"] >= 300 and timings["weather"] >= 300
+    assert timings["total"] < timings["soil"] + timings["weather"]
+    assert "geocode" not in timings
+
+
+def test_slow_forecast_falls_back(client, upstream, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "WEATHER_LIVE_TIMEOUT", 0.1)
+    upstream.delay = 0.4
+    response = client.post("/recommend", json={"latitude": 22.31, "longitude": 73.19})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["weather"] is None
+    assert body["meta"]["weather_error"] == "Weather fetch exceeded 0.1s"
+    assert body["meta"]["temperature_source"] == "climatology"
+    assert body["features"]["temperature"] == app.get_climatology_store().features(22.31, 73.19)["temperature"]
+    assert body["prediction"]["recommendations"]
+
+
+def test_location_is_required(client):
+    assert client.post("/recommend", json={}).status_code == 400
@@ -0,0 +1,63 @@
+"""
+Similarity response cache: normalized exact matches, the similarity threshold,
+expiry, scope isolation and LRU eviction with its index kept consistent
+"""
+
+import time
+
+from response_cache import ResponseCache, normalize_question
+
+CONTEXT = "prompt-digest"
+
+
+def test_questions_are_normalized():
+    assert normalize_question("What is the BEST crop for black soils?!") == "best crop black soil"
+    assert normalize_question("कृपया गेहूं की खेती बताइए") == "गेहूं खेती"
+
+
+def test_rephrasings_above_the_threshold_share_an_answer():
+    cache = ResponseCache(threshold=0.6, enabled=True)
+    cache.store("What fertilizer does rice need in the kharif season?", "en", CONTEXT, "Urea and DAP")
+    cache.store("When should I sow wheat?", "en", CONTEXT, "November")
+
+    exact = cache.lookup("what FERTILIZER does rice need in kharif season", "en", CONTEXT)
+    assert exact[0] == "Urea and DAP" and exact[1]["cache_similarity"] == 1.0
+    similar = cache.lookup("Which fertilizer does rice need during kharif season", "en", CONTEXT)
+    assert similar[0] == "Urea and DAP" and 0.6 <= similar[1]["cache_similarity"] < 1.0
+    # Shares words, but is a different question
+    assert cache.lookup("What fertilizer does cotton need?", "en", CONTEXT) is None
+    assert cache.stats["exact_hits"] == 1 and cache.stats["hits"] == 2 and cache.stats["misses"] == 1
+
+    strict = ResponseCache(threshold=0.99, enabled=True)
+    strict.store("What fertilizer does rice need in the kharif season?", "en", CONTEXT, "Urea and DAP")
+    assert strict.lookup("Which fertilizer does rice need during kharif season", "en", CONTEXT) is None
+
+
+def test_answers_expire_after_the_ttl():
+    cache = ResponseCache(ttl=0.05, enabled=True)
+    cache.store("When should I sow wheat?", "en", CONTEXT, "November")
+    assert cache.lookup("When should I sow wheat?", "en", CONTEXT) is not None
+    time.sleep(0.1)
+    assert cache.lookup("When should I sow wheat?", "en", CONTEXT) is None
+    assert len(cache) == 0 and not cache.postings and not cache.doc_freq
+    assert cache.stats["expired"] == 1
+
+
+def test_scopes_are_isolated():
+    cache = ResponseCache(threshold=0.6, enabled=True)
+    cache.store("When should I sow wheat?", "en", "digest-a", "November")
+    cache.store("When should I sow wheat?", "hi", "digest-a", "नवंबर")
+    assert cache.lookup("When should I sow wheat?", "en", "digest-b") is None
+    assert cache.lookup("When should I sow wheat", "hi", "digest-a")[0] == "नवंबर"
+    assert cache.lookup("When should I sow my wheat crop?", "en", "digest-a")[0] == "November"
+    assert cache.lookup("When should I sow my wheat crop?", "mr", "digest-a") is None
+
+
+def test_oldest_answers_are_evicted_from_the_index():
+    cache = ResponseCache(max_entries=2, enabled=True)
+    for crop in ("rice", "wheat", "maize"):
+        cache.store(f"When should I sow {crop}?", "en", CONTEXT, crop)
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.lookup("When should I sow rice?", "en", CONTEXT) is None
+    assert all(entry_ids <= set(cache.entries) for entry_ids in cache.postings.values())
+    assert cache.lookup("When should I sow maize?", "en", CONTEXT)[0] == "maize"
@@ -0,0 +1,77 @@
+"""
+Per-session message buffers: a fixed-size live window with older messages archived
+in compressed chunks (bounded in bytes) or dropped, and the idle-session sweep
+"""
+
+import time
+from datetime import datetime
+
+import chatbot_service
+from chatbot_service import ConversationMessage, ConversationSession
+from session_store import SessionStore
+
+
+def make_session(session_id: str = "s1") -> ConversationSession:
+    now = datetime.now()
+    return ConversationSession(session_id=session_id, messages=[], created_at=now, last_activity=now, user_context={})
+
+
+def add(session: ConversationSession, count: int, start: int = 0):
+    for i in range(start, start + count):
+        session.add_message(ConversationMessage(id=f"m{i}", role="user", content=f"message {i}", timestamp=datetime.now()))
+
+
+def test_overflow_is_archived_in_chunks(monkeypatch):
+    monkeypatch.setattr(chatbot_service, "SESSION_MESSAGE_CAPACITY", 5)
+    monkeypatch.setattr(chatbot_service, "ARCHIVE_CHUNK_MESSAGES", 3)
+    session = make_session()
+    add(session, 12)
+    assert [m.id for m in session.messages] == [f"m{i}" for i in range(7, 12)]
+    assert (session.archived_count, len(session.spilled), len(session.archive)) == (6, 1, 2)
+    assert session.message_count == 12
+    assert [m["id"] for m in session.archived_messages()] == [f"m{i}" for i in range(7)]
+
+    history = session.to_dict()
+    assert len(history["messages"]) == 5 and history["archived_messages"] == 7
+    assert [m["id"] for m in session.to_dict(include_archived=True)["messages"]] == [f"m{i}" for i in range(12)]
+
+    restored = ConversationSession.from_record(session.to_record())
+    assert restored.to_dict(include_archived=True)["messages"] == session.to_dict(include_archived=True)["messages"]
+    add(restored, 1, start=12)
+    assert restored.message_count == 13 and restored.archived_messages()[-1]["id"] == "m7"
+
+
+def test_archive_is_bounded_in_bytes(monkeypatch):
+    monkeypatch.setattr(chatbot_service, "SESSION_MESSAGE_CAPACITY", 2)
+    monkeypatch.setattr(chatbot_service, "ARCHIVE_CHUNK_MESSAGES", 4)
+    monkeypatch.setattr(chatbot_service, "SESSION_ARCHIVE_MAX_BYTES", 1)
+    session = make_session()
+    add(session, 2 + 4 * 3)
+    # The newest chunk is always kept; older ones are dropped whole
+    assert len(session.archive) == 1
+    assert (session.dropped_count, session.archived_count) == (8, 4)
+    assert session.message_count == 14
+    assert [m["id"] for m in session.archived_messages()] == [f"m{i}" for i in range(8, 12)]
+
+
+def test_drop_policy_keeps_only_the_buffer(monkeypatch):
+    monkeypatch.setattr(chatbot_service, "SESSION_MESSAGE_CAPACITY", 3)
+    monkeypatch.setattr(chatbot_service, "SESSION_OVERFLOW_POLICY", "drop")
+    session = make_session()
+    add(session, 10)
+    assert len(session.messages) == 3 and session.dropped_count == 7
+    assert not session.archive and not session.spilled and session.message_count == 10
+
+
+def test_sweep_drops_idle_entries_oldest_first():
+    store = SessionStore(lambda s: s.to_record(), ConversationSession.from_record, idle_ttl=60)
+    for session_id in ("a", "b", "c"):
+        store.put(make_session(session_id))
+    # "a" and "c" went quiet a while ago; "b" is recent and stops the walk
+    for session_id, idle in (("a", 120), ("b", 0), ("c", 120)):
+        store.cache[session_id].touched_at = time.monotonic() - idle
+    assert store.sweep() == 1
+    assert list(store.cache) == ["b", "c"]
+    store.cache["b"].touched_at -= 120
+    assert store.sweep() == 2 and len(store) == 0
+    assert store.stats["swept"] == 3 and store.cache_bytes == 0
@@ -0,0 +1,145 @@
+"""
+Session store against the RESP stand-in and SQLite: write-behind batches, lazy loads
+that stay off the event loop, deletes and the stored-session counter
+"""
+
+import time
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from session_store import RedisSessionBackend, SessionStore, SQLiteSessionBackend
+
+
+@dataclass
+class Session:
+    session_id: str
+    last_activity: datetime
+    text: str = ""
+
+
+def encode(session: Session) -> dict:
+    return {"id": session.session_id, "at": session.last_activity.timestamp(), "text": session.text}
+
+
+def decode(record: dict) -> Session:
+    return Session(record["id"], datetime.fromtimestamp(record["at"]), record["text"])
+
+
+def make_store(backend, **kwargs) -> SessionStore:
+    return SessionStore(encode, decode, backend, cache_ttl=60, **kwargs)
+
+
+def test_redis_backend_round_trip(resp_standin):
+    writer = make_store(RedisSessionBackend(resp_standin.url))
+    writer.put(Session("s1", datetime.now(), "hello"))
+    assert not resp_standin.data
+    assert writer.flush() == 1
+    assert resp_standin.expires[b"cropgpt:session:s1"] > time.time()
+
+    async def main():
+        reader = make_store(RedisSessionBackend(resp_standin.url))
+        session = await reader.aget("s1")
+        assert session.text == "hello" and reader.stats["loads"] == 1
+        assert await reader.aget("s1") is session
+        assert reader.stats["hits"] == 1
+        assert await reader.aget("missing") is None
+        assert "DEL" not in resp_standin.commands
+
+        assert await reader.adelete("s1")
+        assert not resp_standin.data
+        assert await reader.aget("s1") is None
+
+    asyncio.run(main())
+
+
+def test_idle_sessions_are_deleted_from_the_backend(resp_standin):
+    store = make_store(RedisSessionBackend(resp_standin.url), idle_ttl=3600)
+    store.put(Session("old", datetime.now() - timedelta(hours=2)))
+    store.flush()
+    store.cache.clear()
+    store.idle_ttl = 60
+    assert asyncio.run(store.aget("old")) is None
+    assert store.stats["expired"] == 1
+    assert not resp_standin.data
+
+
+def test_backend_reads_do_not_block_the_event_loop(resp_standin):
+    backend = RedisSessionBackend(resp_standin.url)
+    store = make_store(backend)
+    store.put(Session("s1", datetime.now(), "hello"))
+    store.flush()
+    store.cache.clear()
+    load = backend.load
+
+    def slow_load(session_id):
+        time.sleep(0.3)
+        return load(session_id)
+
+    backend.load = slow_load
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        running = asyncio.ensure_future(ticker())
+        session = await store.aget("s1")
+        running.cancel()
+        return session, ticks
+
+    session, ticks = asyncio.run(main())
+    assert session.text == "hello"
+    assert ticks >= 10
+
+
+def test_sqlite_counts_stored_sessions_without_scanning(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), idle_ttl=3600)
+    store = make_store(backend)
+    for i in range(3):
+        store.put(Session(f"s{i}", datetime.now()))
+    store.flush()
+    store.put(Session("s0", datetime.now(), "edited"))
+    store.flush()
+    assert store.get_stats()["stored_sessions"] == 3
+
+    assert asyncio.run(store.adelete("s1"))
+    assert store.get_stats()["stored_sessions"] == 2
+
+    # Another worker's writes are picked up by the next purge
+    other = SQLiteSessionBackend(backend.path, idle_ttl=3600)
+    other.save_many({"s9": (b"{}", time.time()), "stale": (b"{}", time.time() - 7200)})
+    assert store.purge() == 1
+    assert store.get_stats()["stored_sessions"] == 3
+    assert SQLiteSessionBackend(backend.path).count() == 3
+
+
+def test_held_sessions_are_not_swapped_for_a_reloaded_copy(tmp_path):
+    store = SessionStore(encode, decode, SQLiteSessionBackend(str(tmp_path / "sessions.db")), cache_ttl=0, max_sessions=1)
+    store.put(Session("s1", datetime.now(), "first"))
+    store.flush()
+
+    async def main():
+        # Two turns on the same session, the second arriving after the cache TTL
+        first = store.hold(await store.aget("s1"))
+        loads = store.stats["loads"]
+        # Evicted as well as past its TTL
+        store.put(Session("s2", datetime.now()))
+        second = store.hold(await store.aget("s1"))
+        assert second is first and store.stats["loads"] == loads
+        first.text += " second"
+        store.put(first)
+        store.release("s1")
+        store.release("s1")
+        store.flush()
+
+        # Released: the next access reloads what the last turn saved
+        reloaded = await store.aget("s1")
+        assert reloaded is not first and reloaded.text == "first second"
+
+    asyncio.run(main())
+    assert store.held == {}
@@ -0,0 +1,67 @@
+"""
+Regional soil table: hot reload on file change, broken files keeping the previous
+snapshot, and /soil-data memoization following the table version
+"""
+
+import os
+import shutil
+
+import pytest
+
+import soil_store
+from soil_store import BASE_DIR, RegionalSoilStore
+
+
+def rewrite(path, old: str, new: str):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace(old, new))
+    # Coarse filesystem clocks could otherwise leave the mtime unchanged
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def soil_csv(tmp_path):
+    path = tmp_path / "regional_soil.csv"
+    shutil.copy(os.path.join(BASE_DIR, "data", "regional_soil.csv"), path)
+    return path
+
+
+def test_changed_file_is_reloaded_as_a_new_version(soil_csv):
+    store = RegionalSoilStore(str(soil_csv), reload_interval=0)
+    table = store.table
+    punjab = table.index["punjab"]
+    assert table.version == 1 and table.row(punjab)["N"] == 85
+    assert store.table is table
+
+    rewrite(soil_csv, "punjab,85,", "punjab,95,")
+    reloaded = store.table
+    assert reloaded.version == 2 and reloaded.row(punjab)["N"] == 95
+    # Snapshots handed out earlier are not modified
+    assert table.row(punjab)["N"] == 85
+    assert store.get_stats()["reloads"] == 1
+
+
+def test_broken_file_keeps_the_previous_snapshot(soil_csv):
+    store = RegionalSoilStore(str(soil_csv), reload_interval=0)
+    rewrite(soil_csv, "name,N,P,K", "name,X,P,K")
+    table = store.table
+    assert table.version == 1 and len(table) == 43
+    assert store.reload_errors == 1
+    # The broken file is not re-read until it changes again
+    assert store.table is table and store.reload_errors == 1
+
+
+def test_reload_invalidates_memoized_soil_data(client, soil_csv, monkeypatch):
+    monkeypatch.setattr(soil_store, "soil_store", RegionalSoilStore(str(soil_csv), reload_interval=0))
+    body = {"place_name": "Ludhiana Punjab"}
+    first = client.post("/soil-data", json=body)
+    assert client.post("/soil-data", json=body).headers["X-Cache"] == "HIT"
+
+    rewrite(soil_csv, "punjab,85,45,50,7.2", "punjab,120,45,50,7.2")
+    reloaded = client.post("/soil-data", json=body)
+    assert reloaded.headers["X-Cache"] == "MISS"
+    assert reloaded.headers["ETag"] != first.headers["ETag"]
+    assert reloaded.json()["N"] - first.json()["N"] == pytest.approx(35, abs=0.01)
@@ -0,0 +1,133 @@
+"""
+StaleWhileRevalidateCache against a local stand-in HTTP upstream: coalescing,
+cancellation of the caller that started a load, stale serving and degraded fallback
+"""
+
+import asyncio
+
+import httpx
+
+from swr_cache import StaleWhileRevalidateCache
+
+
+def make_cache(**kwargs) -> StaleWhileRevalidateCache:
+    options = {"ttl": 60.0, "stale_ttl": 60.0, "max_entries": 100}
+    options.update(kwargs)
+    return StaleWhileRevalidateCache("test", **options)
+
+
+def fetcher(client: httpx.AsyncClient, url: str, lat: float):
+    async def load():
+        response = await client.get(url, params={"latitude": lat, "longitude": 73.8})
+        response.raise_for_status()
+        return response.json()["latitude"]
+    return load
+
+
+def forecast_calls(upstream) -> int:
+    return sum(1 for call in upstream.calls if call.startswith("/v1/forecast"))
+
+
+def test_concurrent_misses_share_one_upstream_call(upstream):
+    upstream.delay = 0.1
+    cache = make_cache()
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            results = await asyncio.gather(*(cache.get("pune", fetcher(client, url, 18.5)) for _ in range(10)))
+            assert results == [(18.5, "MISS")] * 10
+            assert await cache.get("pune", fetcher(client, url, 18.5)) == (18.5, "HIT")
+
+    asyncio.run(main())
+    assert forecast_calls(upstream) == 1
+    assert cache.stats["misses"] == 1 and cache.stats["coalesced"] == 9
+    # Only the final lookup was answered from the cache
+    stats = cache.get_stats()
+    assert stats["hit_rate"] == round(1 / 11, 4) and stats["coalesced_rate"] == round(9 / 11, 4)
+
+
+def test_cancelling_the_first_caller_does_not_cancel_the_load(upstream):
+    upstream.delay = 0.2
+    cache = make_cache()
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            first = asyncio.ensure_future(cache.get("pune", fetcher(client, url, 18.5)))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(cache.get("pune", fetcher(client, url, 18.5)))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            assert await second == (18.5, "MISS")
+            assert first.cancelled()
+            assert await cache.get("pune", fetcher(client, url, 18.5)) == (18.5, "HIT")
+
+    asyncio.run(main())
+    assert forecast_calls(upstream) == 1
+
+
+def test_cancelling_the_first_batch_caller_does_not_cancel_the_batch(upstream):
+    upstream.delay = 0.2
+    cache = make_cache()
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            async def batch_loader(keys):
+                response = await client.get(url, params={
+                    "latitude": ",".join(str(k) for k in keys),
+                    "longitude": ",".join("73.8" for _ in keys),
+                })
+                return {key: item["latitude"] for key, item in zip(keys, response.json())}
+
+            first = asyncio.ensure_future(cache.get_many([18.5, 19.5], batch_loader))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(cache.get_many([19.5], batch_loader))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            assert await second == {19.5: (19.5, "MISS")}
+            assert await cache.get_many([18.5, 19.5], batch_loader) == {18.5: (18.5, "HIT"), 19.5: (19.5, "HIT")}
+
+    asyncio.run(main())
+    assert forecast_calls(upstream) == 1
+
+
+def test_stale_entries_are_served_while_refreshing(upstream):
+    cache = make_cache(ttl=0.05, stale_ttl=60.0)
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            assert await cache.get("pune", fetcher(client, url, 18.5)) == (18.5, "MISS")
+            await asyncio.sleep(0.1)
+            assert await cache.get("pune", fetcher(client, url, 18.6)) == (18.5, "STALE")
+            while cache._background:
+                await asyncio.sleep(0.01)
+            assert await cache.get("pune", fetcher(client, url, 18.7)) == (18.6, "HIT")
+
+    asyncio.run(main())
+    assert forecast_calls(upstream) == 2
+    assert cache.stats["refreshes"] == 1
+
+
+def test_expired_entries_are_served_when_the_upstream_fails(upstream):
+    cache = make_cache(ttl=0.01, stale_ttl=0.01)
+    url = upstream.url + "/v1/forecast"
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            assert await cache.get("pune", fetcher(client, url, 18.5)) == (18.5, "MISS")
+            await asyncio.sleep(0.05)
+            upstream.fail = True
+            assert await cache.get("pune", fetcher(client, url, 18.5), serve_expired_on_error=True) == (18.5, "DEGRADED")
+            try:
+                await cache.get("mumbai", fetcher(client, url, 19.0), serve_expired_on_error=True)
+            except httpx.HTTPStatusError as e:
+                assert e.response.status_code == 503
+            else:
+                raise AssertionError("uncached key should raise the upstream error")
+            assert not cache._inflight
+
+    asyncio.run(main())
+    assert cache.stats["upstream_errors"] == 2
@@ -0,0 +1,78 @@
+"""
+Bulk weather batching against the stand-in Open-Meteo upstream: grid-cell
+deduplication, WEATHER_BATCH_SIZE chunking, cache reuse and per-cell failures
+"""
+
+import pytest
+
+
+@pytest.fixture
+def weather_cache():
+    import app
+    from http_client import get_http_client
+
+    app._weather_cache.clear()
+    yield app._weather_cache
+    app._weather_cache.clear()
+    get_http_client().breakers.pop("open-meteo", None)
+
+
+def forecast_calls(upstream) -> list:
+    return [call for call in upstream.calls if call.startswith("/v1/forecast")]
+
+
+def test_bulk_weather_batches_unique_cells(client, upstream, weather_cache):
+    import app
+
+    # 250 distinct cells, each requested twice with coordinates in the same cell
+    locations = []
+    for i in range(250):
+        lat, lon = 10 + (i // 50) * 0.5, 70 + (i % 50) * 0.5
+        locations += [{"latitude": lat, "longitude": lon}, {"latitude": lat + 0.02, "longitude": lon - 0.02}]
+    response = client.post("/weather/bulk", json={"locations": locations, "days": 5})
+    assert response.status_code == 200
+    body = response.json()
+
+    batches = -(-250 // app.WEATHER_BATCH_SIZE)
+    assert len(forecast_calls(upstream)) == batches
+    assert body["meta"] == {**body["meta"], "requested": 500, "unique_cells": 250, "upstream_batches": batches, "failed": 0}
+    for index, (location, item) in enumerate(zip(locations, body["locations"])):
+        assert item["index"] == index
+        assert item["latitude"] == location["latitude"]
+        assert (item["grid_latitude"], item["grid_longitude"]) == app._weather_grid_cell(location["latitude"], location["longitude"])
+        assert item["weather"]["forecast_days"] == 5
+        assert len(item["weather"]["dates"]) == 5
+    assert body["locations"][0]["weather"] == body["locations"][1]["weather"]
+
+
+def test_bulk_weather_reuses_cached_cells(client, upstream, weather_cache):
+    single = client.get("/weather", params={"lat": 18.52, "lon": 73.85, "days": 3})
+    assert single.headers["X-Cache"] == "MISS"
+
+    locations = [{"latitude": 18.52, "longitude": 73.85}, {"latitude": 19.07, "longitude": 72.87}]
+    first = client.post("/weather/bulk", json={"locations": locations, "days": 3}).json()
+    assert [item["cache"] for item in first["locations"]] == ["HIT", "MISS"]
+    assert first["locations"][0]["weather"] == single.json()
+    assert first["meta"]["upstream_batches"] == 1
+
+    again = client.post("/weather/bulk", json={"locations": locations, "days": 3}).json()
+    assert [item["cache"] for item in again["locations"]] == ["HIT", "HIT"]
+    assert again["meta"]["upstream_batches"] == 0
+    assert len(forecast_calls(upstream)) == 2
+
+
+def test_bulk_weather_reports_failures_per_location(client, upstream, weather_cache):
+    locations = [{"latitude": 18.52, "longitude": 73.85}, {"latitude": 28.61, "longitude": 77.21}]
+    client.post("/weather/bulk", json={"locations": locations[:1], "days": 4})
+    # Expire the cached cell so it has to be fetched again
+    for entry in weather_cache._entries.values():
+        entry.fetched_at -= weather_cache.ttl + weather_cache.stale_ttl
+
+    upstream.fail = True
+    response = client.post("/weather/bulk", json={"locations": locations, "days": 4})
+    assert response.status_code == 200
+    degraded, failed = response.json()["locations"]
+    assert degraded["cache"] == "DEGRADED" and degraded["weather"] is not None
+    assert failed["weather"] is None and failed["error"].startswith("Weather fetch failed")
+    assert response.json()["meta"]["failed"] == 1
+    assert response.json()["meta"]["degraded"] == 1
@@ -7,8 +7,8 @@ const MANDI_API_ENDPOINTS = {
   AGMARKNET: 'https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070',
   // Alternative backup API
   KRISHI_DATA: 'https://api.krishi.gov.in/mandi-prices',
-  // Mock API for development (when real APIs are not available)
-  MOCK_API: 'http://localhost:8000/api/mandi-prices'
+  // Backend aggregator: polls the government APIs once and serves every client
+  BACKEND: `${import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'}/api/mandi-prices`
 }
 
 export interface MandiPriceData {
@@ -83,9 +83,26 @@ class MandiPriceService {
   }
 
   /**
-   * Fetch from primary government API
+   * Fetch from the backend aggregator, falling back to the government API directly
    */
   private async fetchFromPrimaryAPI(params?: any): Promise<CropPriceResponse> {
+    try {
+      const response = await axios.get<CropPriceResponse>(MANDI_API_ENDPOINTS.BACKEND, {
+        params: {
+          ...(params?.commodity && { commodity: params.commodity }),
+          ...(params?.market && { market: params.market }),
+          ...(params?.state && { state: params.state }),
+          limit: params?.limit || 100
+        },
+        timeout: this.timeout
+      })
+      if (response.data?.success && response.data.data.length > 0) {
+        return response.data
+      }
+    } catch (error) {
+      console.warn('Backend mandi prices unavailable, calling AGMARKNET directly:', error)
+    }
+
     const queryParams = new URLSearchParams({
       'api-key': process.env.REACT_APP_AGMARKNET_API_KEY || 'demo-key',
       format: 'json',
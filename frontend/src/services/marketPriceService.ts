@@ -42,6 +42,16 @@ class MarketPriceService {
 
   // Get current market prices for multiple commodities
   async getCurrentPrices(commodities?: string[]): Promise<MarketPrice[]> {
+    try {
+      // The backend aggregator shares one upstream poll between all clients
+      const backendPrices = await this.fetchBackendPrices(commodities)
+      if (backendPrices.length > 0) {
+        return this.deduplicateAndSort(backendPrices)
+      }
+    } catch (error) {
+      console.warn('Backend mandi prices unavailable:', error)
+    }
+
     try {
       // Try multiple API sources for better reliability
       const prices = await Promise.allSettled([
@@ -72,6 +82,39 @@ class MarketPriceService {
     }
   }
 
+  // Fetch prices from the backend mandi price aggregator
+  private async fetchBackendPrices(commodities?: string[]): Promise<MarketPrice[]> {
+    const baseUrl = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'
+    const queries = commodities && commodities.length > 0 ? commodities : [undefined]
+    const responses = await Promise.all(queries.map(async commodity => {
+      const params = new URLSearchParams({ limit: '100', ...(commodity && { commodity }) })
+      const response = await fetch(`${baseUrl}/api/mandi-prices?${params.toString()}`, {
+        headers: { 'Accept': 'application/json' }
+      })
+      if (!response.ok) {
+        throw new Error(`Backend mandi API error: ${response.status}`)
+      }
+      return response.json()
+    }))
+
+    return responses.flatMap((body: any) => (body.data || []).map((record: any) => ({
+      commodity: record.commodity,
+      variety: record.variety,
+      market: record.market,
+      state: record.state,
+      district: record.district,
+      price: record.modalPrice,
+      unit: record.unit,
+      date: record.reportedDate,
+      trend: record.trend,
+      changePercent: record.modalPrice && record.priceChange
+        ? Math.round((record.priceChange / (record.modalPrice - record.priceChange)) * 10000) / 100
+        : 0,
+      minPrice: record.minPrice,
+      maxPrice: record.maxPrice
+    })))
+  }
+
   // Fetch prices from Data.gov.in API
   private async fetchDataGovPrices(commodities?: string[]): Promise<MarketPrice[]> {
     try {